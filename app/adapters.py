@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+adapters.py - Registry that binds scanning, advertising and connections to HCI controllers
+"""
+
+import collections
+import glob
+import os
+
+from bluetoothctl import create_controller
+
+SYSFS_BLUETOOTH = "/sys/class/bluetooth"
+
+ROLES = ("scan", "advertise", "connect")
+
+Adapter = collections.namedtuple("Adapter", ["name", "address"])
+
+def list_adapters(sysfs_root=SYSFS_BLUETOOTH) -> list:
+    """Returns the HCI controllers the kernel knows about, sorted by index"""
+    adapters = []
+    for path in glob.glob(os.path.join(sysfs_root, "hci*")):
+        name = os.path.basename(path)
+        if not name[3:].isdigit():
+            continue
+        address = None
+        try:
+            with open(os.path.join(path, "address")) as f:
+                address = f.read().strip().upper() or None
+        except OSError:
+            pass
+        adapters.append(Adapter(name, address))
+    return sorted(adapters, key=lambda a: int(a.name[3:]))
+
+def _parse_assignments(spec: str) -> dict:
+    """Parses "scan=hci1,advertise=hci0" style overrides"""
+    assignments = {}
+    for part in spec.split(","):
+        role, _, name = part.partition("=")
+        if role.strip() in ROLES and name.strip():
+            assignments[role.strip()] = name.strip()
+    return assignments
+
+# ----------------------------------------------------------------------
+# Adapter Registry
+# ----------------------------------------------------------------------
+class AdapterRegistry:
+    """
+    Picks a controller per role. With two or more radios advertising keeps the
+    built-in adapter and scanning/connections move to the last one (usually a
+    USB dongle), so beacons and scans no longer interrupt each other. With a
+    single radio every role shares it, as before. BT_ADAPTERS overrides the
+    choice, e.g. BT_ADAPTERS="scan=hci1,advertise=hci0,connect=hci1".
+    """
+
+    def __init__(self, adapters=None, assignments=None, backend=None):
+        self.adapters = adapters if adapters is not None else list_adapters()
+        self.backend = backend
+        self._controllers = {}
+
+        by_name = {a.name: a for a in self.adapters}
+        if len(self.adapters) >= 2:
+            self.roles = {
+                "advertise": self.adapters[0],
+                "scan": self.adapters[-1],
+                "connect": self.adapters[-1],
+            }
+        else:
+            self.roles = dict.fromkeys(ROLES, self.adapters[0] if self.adapters else None)
+
+        if assignments is None:
+            assignments = _parse_assignments(os.environ.get("BT_ADAPTERS", ""))
+        for role, name in assignments.items():
+            if name in by_name:
+                self.roles[role] = by_name[name]
+            else:
+                print(f"[BT] Adapter {name} for {role} not present, keeping {self.adapter_name(role)}")
+
+        summary = ", ".join(f"{r}={self.adapter_name(r) or 'default'}" for r in ROLES)
+        print(f"[BT] Adapter roles: {summary}")
+
+    def adapter(self, role: str):
+        return self.roles.get(role)
+
+    def adapter_name(self, role: str):
+        """HCI name for a role (what bleak's adapter= expects), None for the default"""
+        adapter = self.roles.get(role)
+        return adapter.name if adapter else None
+
+    def shared(self, *roles) -> bool:
+        """True if the given roles all run on the same radio"""
+        return len({self.adapter_name(r) for r in roles}) == 1
+
+    def controller(self, role: str):
+        """Controller bound to the role's adapter; roles on the same radio share one"""
+        adapter = self.roles.get(role)
+        key = adapter.name if adapter else None
+        if key not in self._controllers:
+            self._controllers[key] = create_controller(self.backend, adapter=adapter)
+        return self._controllers[key]
+
+    def close(self):
+        for controller in self._controllers.values():
+            try:
+                controller.close()
+            except Exception:
+                pass
+        self._controllers.clear()
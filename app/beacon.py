@@ -1,142 +1,709 @@
+import collections
+import heapq
+import itertools
+import json
+import os
+import sys
 import threading
 import time
 
-from dicts import BEACON_PROTOCOL, BEACON_TYPE, RSSI_THRESHOLD, FACTIONS, LOCATIONS, DROIDS
+from dicts import (
+    BEACON_PROTOCOL, BEACON_TYPE, RSSI_THRESHOLD, FACTIONS, LOCATIONS, DROIDS,
+    ADVERTISING_PRESETS, DEFAULT_ADVERTISING_PRESET,
+)
+from options import resource_path
+
+# ----------------------------------------------------------------------
+# Payload table
+# ----------------------------------------------------------------------
+# raw is the manufacturer data after the company ID; mfg_id and mfg_data are
+# the same bytes as the strings the controllers' broadcast_mfg takes
+BeaconPayload = collections.namedtuple("BeaconPayload", ["name", "raw", "mfg_id", "mfg_data"])
+
+def encode_payload(name, raw) -> BeaconPayload:
+    """Wraps manufacturer data bytes (without the company ID) as a BeaconPayload"""
+    raw = bytes(raw)
+    return BeaconPayload(
+        name, raw, f"0x{BEACON_PROTOCOL['MFG_ID']:04X}", " ".join(f"0x{b:02X}" for b in raw)
+    )
+
+def location_payload(loc_id, cooldown_byte, threshold="MID") -> bytes:
+    return bytes([
+        BEACON_TYPE["LOCATION"], BEACON_PROTOCOL["DATA_LEN"], loc_id, cooldown_byte,
+        RSSI_THRESHOLD[threshold], BEACON_PROTOCOL["ACTIVE_FLAG"],
+    ])
+
+def droid_payload(faction_name, p_id, paired=True) -> bytes:
+    aff_byte = 0x80 + (FACTIONS.get(faction_name, 0x01) * 2)
+    return bytes([
+        BEACON_TYPE["DROID"], BEACON_PROTOCOL["DATA_LEN"], BEACON_PROTOCOL["DROID_HEADER"],
+        BEACON_PROTOCOL["STATUS_FLAG"] if paired else 0x01, aff_byte, p_id,
+    ])
+
+def _build_payload_table() -> dict:
+    """
+    Every LOCATIONS entry at each RSSI_THRESHOLD, keyed ("location", loc_id,
+    threshold), and every DROIDS personality paired and unpaired, keyed
+    ("droid", faction, personality id, paired)
+    """
+    table = {}
+    for loc_id, (_, name, cooldown) in LOCATIONS.items():
+        for threshold in RSSI_THRESHOLD:
+            table[("location", loc_id, threshold)] = encode_payload(name, location_payload(loc_id, cooldown, threshold))
+    for faction, droids in DROIDS.items():
+        for d in droids.values():
+            for paired in (True, False):
+                key = ("droid", faction, d["id"], paired)
+                # Personality IDs listed twice keep their first name
+                if key not in table:
+                    table[key] = encode_payload(d["name"], droid_payload(faction, d["id"], paired))
+    return table
+
+PAYLOADS = _build_payload_table()
 
 # ----------------------------------------------------------------------
 # Droid Beacon (Low Level)
 # ----------------------------------------------------------------------
 class DroidBeacon:
-    def __init__(self, bt_controller):
+    def __init__(self, bt_controller, instance=0):
         self.bt = bt_controller
+        # Advertising instance on the controller this beacon drives
+        self.instance = instance
         self.current_active = "None"
         self.debug_payload = ""
-        self.thread = None
+        self.debug_interval = ""
+        # Advertising interval (min, max) in ms and TX power in dBm, DEFAULT_ADVERTISING_PRESET
+        # until BeaconManager sets others; None leaves BlueZ's default
+        preset = ADVERTISING_PRESETS[DEFAULT_ADVERTISING_PRESET]
+        self.interval = (preset["min_interval"], preset["max_interval"])
+        self.tx_power = preset["tx_power"]
+        # Set while the radio arbiter has taken the adapter; the last payload is kept for resume()
+        self.paused = False
+        self._last_payload = None
         self.stop_event = threading.Event()
         self._lock = threading.Lock()
 
-    def _send_payload(self, name, payload):
-        """Formats the hex string into raw manufacturer data and triggers the BT broadcast"""
-        raw = payload.replace("0x", "").replace(" ", "").replace(",", "")
-        mfg_id = f"0x{raw[:4]}"
-        mfg_data = " ".join(f"0x{raw[i:i+2]}" for i in range(4, len(raw), 2))
+    def _send_payload(self, payload):
+        """Puts a BeaconPayload on air"""
+        with self._lock:
+            self._last_payload = payload
+            if self.paused:
+                return
+            try:
+                self.bt.broadcast_mfg(payload.mfg_id, payload.mfg_data, interval=self.interval,
+                                      tx_power=self.tx_power, instance=self.instance)
+                self.current_active = payload.name
+                self.debug_payload = f"{payload.mfg_id} {payload.mfg_data}"
+                params = self._describe_params()
+                # Logged when the beacon starts or its settings change, to line up with droid reactions
+                if params != self.debug_interval:
+                    print(f"[BEACON] Instance {self.instance} advertising at {params}")
+                self.debug_interval = params
+            except Exception:
+                pass
+
+    def _describe_params(self):
+        """Interval and TX power in effect, logged next to debug_payload"""
+        interval = f"{self.interval[0]}-{self.interval[1]} ms" if self.interval else "default interval"
+        power = f"{self.tx_power} dBm" if self.tx_power is not None else "default power"
+        return f"{interval} @ {power}"
 
+    def activate_location(self, loc_id, name, cooldown_byte, threshold="MID"):
+        """Broadcasts a Location beacon, straight from PAYLOADS for the stock locations"""
+        payload = PAYLOADS.get(("location", loc_id, threshold))
+        if payload is None or payload.raw[3] != cooldown_byte or payload.name != name:
+            payload = encode_payload(name, location_payload(loc_id, cooldown_byte, threshold))
+        self._send_payload(payload)
+
+    def activate_droid(self, p_id, p_name, faction_name, paired=True):
+        """Broadcasts a Droid beacon to simulate a specific droid's presence"""
+        payload = PAYLOADS.get(("droid", faction_name, p_id, paired))
+        if payload is None or payload.name != p_name:
+            payload = encode_payload(p_name, droid_payload(faction_name, p_id, paired))
+        self._send_payload(payload)
+
+    @property
+    def is_active(self):
+        return self._last_payload is not None and not self.stop_event.is_set()
+
+    def pause(self):
+        """Takes the advertisement off air without forgetting what was broadcasting"""
         with self._lock:
+            if self.paused:
+                return
+            self.paused = True
             try:
-                self.bt.broadcast_mfg(mfg_id, mfg_data)
-                self.current_active = name
-                self.debug_payload = f"{mfg_id} {mfg_data}"
+                self.bt.stop_advertising(self.instance)
             except Exception:
                 pass
 
-    def activate_location(self, loc_id, name, cooldown_byte):
-        """Builds the byte payload for a Location beacon"""
-        payload = (
-            f"0x{BEACON_PROTOCOL['MFG_ID']:04X} "
-            f"0x{BEACON_TYPE['LOCATION']:02X} "
-            f"0x{BEACON_PROTOCOL['DATA_LEN']:02X} "
-            f"0x{loc_id:02X} "
-            f"0x{cooldown_byte:02X} "
-            f"0x{RSSI_THRESHOLD['MID']:02X} "
-            f"0x{BEACON_PROTOCOL['ACTIVE_FLAG']:02X} "
-        )
-        self._send_payload(name, payload)
-
-    def activate_droid(self, p_id, p_name, faction_name):
-        """Constructs the byte payload to simulate a specific droid's presence"""
-        aff_id = FACTIONS.get(faction_name, 0x01)
-        aff_byte = 0x80 + (aff_id * 2)
-        payload = (
-            f"0x{BEACON_PROTOCOL['MFG_ID']:04X} "
-            f"0x{BEACON_TYPE['DROID']:02X} "
-            f"0x{BEACON_PROTOCOL['DATA_LEN']:02X} "
-            f"0x{BEACON_PROTOCOL['DROID_HEADER']:02X} "
-            f"0x{BEACON_PROTOCOL['STATUS_FLAG']:02X} "
-            f"0x{aff_byte:02X} "
-            f"0x{p_id:02X}"
-        )
-        self._send_payload(p_name, payload)
+    def resume(self):
+        """Puts the last payload back on air after pause()"""
+        with self._lock:
+            self.paused = False
+            last = self._last_payload
+        if last and not self.stop_event.is_set():
+            self._send_payload(last)
 
-    def stop(self):
-        """Stops the advertisement and resets the beacon's internal status"""
-        self.stop_event.set()
+    def silence(self):
+        """Takes the advertisement off air and forgets it, leaving pause state to the arbiter"""
         with self._lock:
+            self._last_payload = None
             try:
-                self.bt.stop_advertising()
+                self.bt.stop_advertising(self.instance)
             except Exception:
                 pass
             self.current_active = "None"
             self.debug_payload = ""
-        
-    def start_loop(self, target_type, target_id, faction=None, **kwargs):
-        """Creates a background loop that periodically refreshes the beacon broadcast"""
-        if self.thread and self.thread.is_alive():
-            self.stop_event.set()
-            self.thread.join(timeout=0.2)
-
-        self.stop_event.clear()
-
-        def loop():
-            while not self.stop_event.is_set():
-                try:
-                    wait_time = 1.5
-                    
-                    if target_type == "location":
-                        data = LOCATIONS.get(target_id)
-                        if data:
-                            self.activate_location(target_id, data[1], data[2])
-                            wait_time = max(1.0, data[2] * 5)
-                    elif target_type == "droid":
-                        f_data = DROIDS.get(faction, {})
-                        d_data = f_data.get(target_id)
-                        if d_data:
-                            self.activate_droid(d_data["id"], d_data["name"], faction)
-                            wait_time = 2.0
-                    
-                    end_sleep = time.time() + wait_time
-                    while time.time() < end_sleep and not self.stop_event.is_set():
-                        time.sleep(0.1)
-                except Exception:
-                    time.sleep(1.0)
-
-        self.thread = threading.Thread(target=loop, daemon=True)
-        self.thread.start()
+            self.debug_interval = ""
+
+    def stop(self):
+        """Stops the advertisement and resets the beacon's internal status"""
+        self.stop_event.set()
+        with self._lock:
+            self.paused = False
+        self.silence()
+
+# ----------------------------------------------------------------------
+# Playlists
+# ----------------------------------------------------------------------
+# Seconds each playlist entry stays on air unless the entry or playlist says otherwise
+DEFAULT_DWELL = 30.0
+# Seconds between re-sends of a droid beacon while it is on air; location
+# beacons are re-sent once per cooldown
+DROID_REFRESH = 2.0
+MIN_REFRESH = 1.0
+
+# kind is "location" or "droid"; target is the LOCATIONS key or the DROIDS
+# key within faction. dwell None stays on air until stopped; cooldown is
+# the seconds before the entry may go on air again. Entries on different
+# tracks play at the same time, each track rotating on its own.
+PlaylistEntry = collections.namedtuple(
+    "PlaylistEntry", ["kind", "target", "faction", "dwell", "cooldown", "threshold", "paired", "track"]
+)
+Playlist = collections.namedtuple("Playlist", ["name", "entries", "loop"])
+
+class PlaylistError(ValueError):
+    pass
+
+def location_cooldown(loc_id) -> float:
+    """A location's cooldown in seconds (its LOCATIONS cooldown byte times 5)"""
+    return LOCATIONS[loc_id][2] * 5.0
+
+def location_entry(loc_id, dwell=None, threshold="MID", cooldown=None, track=0) -> PlaylistEntry:
+    if loc_id not in LOCATIONS:
+        raise PlaylistError(f"Unknown location {loc_id!r}")
+    if threshold not in RSSI_THRESHOLD:
+        raise PlaylistError(f"Unknown RSSI threshold {threshold!r}")
+    cooldown = location_cooldown(loc_id) if cooldown is None else float(cooldown)
+    return PlaylistEntry("location", loc_id, None, dwell, cooldown, threshold, True, track)
+
+def droid_entry(faction, droid_id, dwell=None, paired=True, cooldown=0.0, track=0) -> PlaylistEntry:
+    if droid_id not in DROIDS.get(faction, {}):
+        raise PlaylistError(f"Unknown droid {droid_id!r} in faction {faction!r}")
+    return PlaylistEntry("droid", droid_id, faction, dwell, float(cooldown), None, bool(paired), track)
+
+def entry_name(entry) -> str:
+    if entry.kind == "location":
+        return LOCATIONS[entry.target][1]
+    return DROIDS[entry.faction][entry.target]["name"]
+
+def _lookup(table, value, label):
+    """Resolves a dict key given either the key itself or the entry's display name"""
+    if value in table:
+        return value
+    for key, item in table.items():
+        name = item[1] if isinstance(item, tuple) else item["name"]
+        if name == value:
+            return key
+    raise PlaylistError(f"Unknown {label} {value!r}")
+
+def parse_playlist(data, name="Playlist") -> Playlist:
+    """
+    Builds a Playlist from its JSON form:
+
+        {"name": "Walk Through the Park", "loop": true, "dwell": 30,
+         "entries": [
+            {"location": "Droid Depot", "dwell": 60},
+            {"droid": "Blue (R5-D8)", "faction": "Resistance", "paired": false},
+            {"location": 2, "threshold": "NEAR", "cooldown": 90},
+            {"droid": "Black (BB-9E)", "faction": "First Order", "track": 1}
+         ]}
+
+    Locations and droids are given by name (as in the beacon menu) or by
+    their LOCATIONS / DROIDS key. "dwell" at the top level is the default
+    for entries without one. Entries with a "track" number other than 0
+    form separate rotations that play alongside the first.
+    """
+    if not isinstance(data, dict) or not isinstance(data.get("entries"), list):
+        raise PlaylistError("A playlist is an object with an 'entries' list")
+    default_dwell = float(data.get("dwell", DEFAULT_DWELL))
+    entries = []
+    for i, item in enumerate(data["entries"]):
+        if not isinstance(item, dict):
+            raise PlaylistError(f"Entry {i + 1} is not an object")
+        dwell = float(item.get("dwell", default_dwell))
+        if dwell <= 0:
+            raise PlaylistError(f"Entry {i + 1}: dwell must be positive")
+        track = int(item.get("track", 0))
+        if "location" in item:
+            loc_id = _lookup(LOCATIONS, item["location"], "location")
+            entries.append(location_entry(loc_id, dwell, item.get("threshold", "MID"), item.get("cooldown"), track))
+        elif "droid" in item:
+            faction = item.get("faction")
+            if faction not in DROIDS:
+                raise PlaylistError(f"Entry {i + 1}: unknown faction {faction!r}")
+            droid_id = _lookup(DROIDS[faction], item["droid"], "droid")
+            entries.append(droid_entry(faction, droid_id, dwell, item.get("paired", True),
+                                       item.get("cooldown", 0.0), track))
+        else:
+            raise PlaylistError(f"Entry {i + 1} has neither 'location' nor 'droid'")
+    if not entries:
+        raise PlaylistError("Playlist has no entries")
+    return Playlist(str(data.get("name", name)), entries, bool(data.get("loop", True)))
+
+def split_tracks(playlist) -> list:
+    """One Playlist per track, in track order, each keeping its entries' order"""
+    tracks = {}
+    for entry in playlist.entries:
+        tracks.setdefault(entry.track, []).append(entry)
+    return [Playlist(playlist.name, tracks[t], playlist.loop) for t in sorted(tracks)]
+
+def load_playlist(path) -> Playlist:
+    try:
+        with open(path, "r") as f:
+            data = json.load(f)
+    except (OSError, ValueError) as e:
+        raise PlaylistError(f"{path}: {e}")
+    name = os.path.splitext(os.path.basename(path))[0].replace("_", " ").title()
+    try:
+        return parse_playlist(data, name)
+    except (PlaylistError, TypeError, ValueError) as e:
+        raise PlaylistError(f"{path}: {e}")
+
+def playlist_dirs() -> list:
+    """
+    Where playlists are read from: the ones shipped with the app (unpacked
+    next to res/ in a PyInstaller build) and the user's own, which win on
+    a file name clash. In dev mode both are app/playlists.
+    """
+    bundled = os.path.join(getattr(sys, "_MEIPASS", os.path.dirname(os.path.abspath(__file__))), "playlists")
+    user = resource_path("playlists")
+    return [bundled] if os.path.abspath(user) == os.path.abspath(bundled) else [bundled, user]
+
+def load_playlists(directory=None) -> list:
+    """Every valid *.json playlist in `directory` (playlist_dirs() by default), sorted by name"""
+    paths = {}
+    for d in [directory] if directory else playlist_dirs():
+        try:
+            names = os.listdir(d)
+        except OSError:
+            continue
+        paths.update((f, os.path.join(d, f)) for f in names if f.endswith(".json"))
+    playlists = []
+    for f in sorted(paths):
+        try:
+            playlists.append(load_playlist(paths[f]))
+        except PlaylistError as e:
+            print(f"[BEACON] Skipping playlist {e}")
+    return sorted(playlists, key=lambda p: p.name)
+
+# ----------------------------------------------------------------------
+# Beacon Scheduler
+# ----------------------------------------------------------------------
+# Lateness samples kept for stats()
+JITTER_SAMPLES = 4096
+
+class BeaconScheduler:
+    """
+    Runs timed beacon work on one thread. Jobs sit in a heap ordered by
+    monotonic deadline; the thread sleeps in Event.wait until the earliest
+    is due or the schedule changes, so nothing polls. Each job is called
+    with the deadline it was scheduled for, letting repeating jobs schedule
+    their next run from that rather than from when they actually ran, and
+    how late every job ran is kept for stats().
+    """
+
+    def __init__(self):
+        self._heap = []
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = False
+        self._thread = None
+        self._lateness = collections.deque(maxlen=JITTER_SAMPLES)
+        self.fired = 0
+        self.max_lateness = 0.0
+
+    def call_at(self, deadline, fn, *args):
+        """Runs fn(deadline, *args) at time.monotonic() `deadline`; returns a handle for cancel()"""
+        job = [deadline, next(self._seq), fn, args]
+        with self._lock:
+            if self._closed:
+                return job
+            heapq.heappush(self._heap, job)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="BeaconScheduler", daemon=True)
+                self._thread.start()
+        self._wake.set()
+        return job
+
+    def call_later(self, delay, fn, *args):
+        return self.call_at(time.monotonic() + delay, fn, *args)
+
+    def cancel(self, job):
+        # Cancelled jobs stay in the heap and are dropped when they surface
+        if job is not None:
+            job[2] = None
+
+    def clear(self):
+        with self._lock:
+            self._heap.clear()
+        self._wake.set()
+
+    def pending(self) -> int:
+        with self._lock:
+            return sum(1 for job in self._heap if job[2] is not None)
+
+    def _run(self):
+        heap = self._heap
+        while True:
+            with self._lock:
+                while heap and heap[0][2] is None:
+                    heapq.heappop(heap)
+                if self._closed:
+                    return
+                job = None
+                timeout = None
+                if heap:
+                    timeout = heap[0][0] - time.monotonic()
+                    if timeout <= 0:
+                        job = heapq.heappop(heap)
+                if job is None:
+                    # Cleared under the lock: a job pushed after this still wakes us
+                    self._wake.clear()
+            if job is None:
+                self._wake.wait(timeout)
+                continue
+
+            deadline, _, fn, args = job
+            late = time.monotonic() - deadline
+            self._lateness.append(late)
+            self.fired += 1
+            if late > self.max_lateness:
+                self.max_lateness = late
+            try:
+                fn(deadline, *args)
+            except Exception as e:
+                print(f"[BEACON] Scheduled job failed: {e}")
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            self._heap.clear()
+            thread = self._thread
+        self._wake.set()
+        if thread is not None:
+            thread.join(timeout=1.0)
+
+    def stats(self) -> dict:
+        """How late jobs ran behind their deadlines (ms), over the last JITTER_SAMPLES jobs"""
+        samples = sorted(self._lateness)
+        if not samples:
+            return {"jobs": self.fired, "mean_ms": 0.0, "p99_ms": 0.0, "max_ms": 0.0}
+        return {
+            "jobs": self.fired,
+            "mean_ms": sum(samples) / len(samples) * 1000,
+            "p99_ms": samples[min(len(samples) - 1, int(len(samples) * 0.99))] * 1000,
+            "max_ms": self.max_lateness * 1000,
+        }
+
 
 # ----------------------------------------------------------------------
 # Beacon Manager (High Level)
 # ----------------------------------------------------------------------
+# Most advertisements BeaconManager keeps on air at once, whatever the adapter offers
+MAX_INSTANCES = 4
+# Seconds each track gets on air in turn when there are more tracks than instances
+MUX_SLICE = 2.0
+
+class _Track:
+    """One rotation through a playlist's entries"""
+
+    def __init__(self, playlist):
+        self.playlist = playlist
+        self.entry = None
+        self.index = -1
+        self.ready_at = {}
+        self.refresh_job = None
+        # DroidBeacon (advertising instance) this track is on air with, if any
+        self.beacon = None
+
 class BeaconManager:
-    def __init__(self, bt_controller):
+    """
+    Plays beacons on the scheduler as tracks. A single location or droid is
+    a one-entry track that stays on air until stopped; longer tracks rotate
+    through their entries, each on air for its dwell time and kept off air
+    until its cooldown has passed since it last left. Every track gets an
+    advertising instance of its own while the adapter has enough of them
+    (SupportedInstances, up to MAX_INSTANCES); with fewer instances the
+    tracks take turns on them for MUX_SLICE seconds at a time.
+    """
+
+    def __init__(self, bt_controller, scheduler=None, max_instances=MAX_INSTANCES):
         self.bt = bt_controller
+        self.max_instances = max_instances
         self.droid_beacon = DroidBeacon(self.bt)
-        self.thread = None
+        self.beacons = [self.droid_beacon]
+        self._instances_checked = False
+        self.scheduler = scheduler or BeaconScheduler()
+        self.tracks = []
+        self._mux_job = None
+        self._mux_offset = 0
+        self.mux_switches = 0
+        # Bumped on every stop so jobs already popped by the scheduler can tell they are stale
+        self._generation = 0
+        self._lock = threading.RLock()
+
+    def _ensure_instances(self):
+        """Sizes the beacon pool to the adapter's advertising instances, asked once"""
+        if self._instances_checked:
+            return
+        self._instances_checked = True
+        try:
+            available = int(self.bt.advertising_instances())
+        except Exception:
+            available = 1
+        for instance in range(1, max(1, min(self.max_instances, available))):
+            beacon = DroidBeacon(self.bt, instance)
+            beacon.interval = self.droid_beacon.interval
+            beacon.tx_power = self.droid_beacon.tx_power
+            self.beacons.append(beacon)
+
+    @property
+    def instances(self) -> int:
+        return len(self.beacons)
 
-    def start_location(self, loc_id, name):
+    def start_location(self, loc_id, name, preset=DEFAULT_ADVERTISING_PRESET,
+                       min_interval=None, max_interval=None, tx_power=None):
         """Interface method to begin broadcasting a specific Location ID"""
-        self._run(target_type="location", target_id=loc_id)
+        self.start_playlist(Playlist(name, [location_entry(loc_id)], False),
+                            preset, min_interval, max_interval, tx_power)
 
-    def start_droid(self, faction, droid_id, name):
+    def start_droid(self, faction, droid_id, name, preset=DEFAULT_ADVERTISING_PRESET,
+                    min_interval=None, max_interval=None, tx_power=None):
         """Interface method to begin broadcasting as a specific Droid personality"""
-        self._run(target_type="droid", target_id=droid_id, faction=faction)
+        self.start_playlist(Playlist(name, [droid_entry(faction, droid_id)], False),
+                            preset, min_interval, max_interval, tx_power)
 
-    def _run(self, **kwargs):
-        """Manages the lifecycle of the BeaconLoopThread for non-blocking execution"""
+    def start_playlist(self, playlist, preset=DEFAULT_ADVERTISING_PRESET,
+                       min_interval=None, max_interval=None, tx_power=None):
+        """Replaces whatever is on air with a Playlist's tracks, until they end or stop() is called"""
         self.stop()
-        self.thread = threading.Thread(
-            target=self.droid_beacon.start_loop,
-            kwargs=kwargs,
-            name="BeaconLoopThread",
-            daemon=True
-        )
-        self.thread.start()
+        self._set_advertising_params(preset, min_interval, max_interval, tx_power)
+        self.add_playlist(playlist)
+
+    def add_location(self, loc_id, name):
+        """Adds a Location beacon alongside what is already on air"""
+        self.add_playlist(Playlist(name, [location_entry(loc_id)], False))
+
+    def add_droid(self, faction, droid_id, name):
+        """Adds a Droid beacon alongside what is already on air"""
+        self.add_playlist(Playlist(name, [droid_entry(faction, droid_id)], False))
+
+    def add_playlist(self, playlist):
+        """Starts a Playlist's tracks next to the ones already running"""
+        self._ensure_instances()
+        with self._lock:
+            if not self.tracks:
+                for beacon in self.beacons:
+                    beacon.stop_event.clear()
+            for track_playlist in split_tracks(playlist):
+                track = _Track(track_playlist)
+                self.tracks.append(track)
+                self.scheduler.call_later(0, self._advance, self._generation, track)
+
+    def _set_advertising_params(self, preset, min_interval, max_interval, tx_power):
+        """Resolves a preset from ADVERTISING_PRESETS, with explicit values taking precedence"""
+        params = dict(ADVERTISING_PRESETS.get(preset, {})) if preset else {}
+        if min_interval is not None:
+            params["min_interval"] = min_interval
+        if max_interval is not None:
+            params["max_interval"] = max_interval
+        if tx_power is not None:
+            params["tx_power"] = tx_power
+
+        low, high = params.get("min_interval"), params.get("max_interval")
+        if low is None and high is None:
+            interval = None
+        else:
+            low = low if low is not None else high
+            interval = (low, max(low, high if high is not None else low))
+
+        for beacon in self.beacons:
+            beacon.interval = interval
+            beacon.tx_power = params.get("tx_power")
+
+    # ------------------------------------------------------------------
+    # Scheduled Jobs
+    # ------------------------------------------------------------------
+    def _advance(self, due, generation, track):
+        """Takes a track's current entry off air and puts its next ready one on"""
+        with self._lock:
+            if generation != self._generation or track not in self.tracks:
+                return
+            self.scheduler.cancel(track.refresh_job)
+            track.refresh_job = None
+            if track.entry is not None:
+                track.ready_at[track.index] = due + track.entry.cooldown
+            track.entry = None
+
+            entries = track.playlist.entries
+            for step in range(1, len(entries) + 1):
+                index = track.index + step
+                if index >= len(entries):
+                    if not track.playlist.loop:
+                        self._finish(track, due)
+                        return
+                    index %= len(entries)
+                if track.ready_at.get(index, due) <= due:
+                    break
+            else:
+                # Every entry is cooling down: give up the instance until the first is ready
+                track.beacon = None
+                self._assign(due)
+                self.scheduler.call_at(min(track.ready_at.values()), self._advance, generation, track)
+                return
+
+            track.index = index
+            track.entry = entry = entries[index]
+            if track.beacon is not None:
+                self._activate(track.beacon, entry)
+            else:
+                self._assign(due)
+            refresh = self._refresh_interval(entry)
+            if entry.dwell is None or refresh < entry.dwell:
+                track.refresh_job = self.scheduler.call_at(due + refresh, self._refresh, generation, track)
+            if entry.dwell is not None:
+                self.scheduler.call_at(due + entry.dwell, self._advance, generation, track)
+
+    def _refresh(self, due, generation, track):
+        """Re-sends a track's entry on air, as the old refresh loop did"""
+        with self._lock:
+            if generation != self._generation or track.entry is None:
+                return
+            if track.beacon is not None:
+                self._activate(track.beacon, track.entry)
+            track.refresh_job = self.scheduler.call_at(due + self._refresh_interval(track.entry),
+                                                       self._refresh, generation, track)
+
+    def _rotate(self, due, generation):
+        """Moves the instances on to the next tracks waiting for one"""
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._mux_job = None
+            self._mux_offset += len(self.beacons)
+            self.mux_switches += 1
+            self._assign(due)
+
+    def _assign(self, now):
+        """
+        Hands the instances to the tracks with something to put on air. Tracks
+        that keep an instance stay on it; an instance changing tracks is
+        overwritten in place, so it never goes dark in between.
+        """
+        wanting = [t for t in self.tracks if t.entry is not None]
+        if len(wanting) <= len(self.beacons):
+            chosen = wanting
+        else:
+            k = self._mux_offset % len(wanting)
+            chosen = (wanting[k:] + wanting[:k])[:len(self.beacons)]
+            if self._mux_job is None:
+                self._mux_job = self.scheduler.call_at(now + MUX_SLICE, self._rotate, self._generation)
+
+        for track in self.tracks:
+            if track not in chosen:
+                track.beacon = None
+        held = {id(t.beacon) for t in chosen if t.beacon is not None}
+        free = [b for b in self.beacons if id(b) not in held]
+        for track in chosen:
+            if track.beacon is None:
+                track.beacon = free.pop(0)
+                self._activate(track.beacon, track.entry)
+        for beacon in free:
+            if beacon.is_active:
+                beacon.silence()
+
+    def _refresh_interval(self, entry):
+        if entry.kind == "location":
+            return max(MIN_REFRESH, location_cooldown(entry.target))
+        return DROID_REFRESH
+
+    def _activate(self, beacon, entry):
+        if entry.kind == "location":
+            _, name, cooldown_byte = LOCATIONS[entry.target]
+            beacon.activate_location(entry.target, name, cooldown_byte, entry.threshold)
+        else:
+            d = DROIDS[entry.faction][entry.target]
+            beacon.activate_droid(d["id"], d["name"], entry.faction, entry.paired)
+
+    def _finish(self, track, now):
+        self.tracks.remove(track)
+        track.beacon = None
+        if self.tracks:
+            self._assign(now)
+        else:
+            for beacon in self.beacons:
+                beacon.stop()
 
     def stop(self):
-        """Calls the low-level stop logic and ensures the management thread is cleared"""
-        self.droid_beacon.stop()
-        if self.thread and self.thread.is_alive():
-            self.thread.join(timeout=0.1)
+        """Cancels every track and takes the beacons off air"""
+        with self._lock:
+            self._generation += 1
+            self.scheduler.clear()
+            self._mux_job = None
+            self.tracks = []
+        for beacon in self.beacons:
+            beacon.stop()
+
+    def close(self):
+        self.stop()
+        self.scheduler.close()
 
     @property
     def current_active(self):
-        """Returns the name of the currently active broadcast for UI display"""
-        return self.droid_beacon.current_active
\ No newline at end of file
+        """Returns the name of the currently active broadcast(s) for UI display"""
+        names = [b.current_active for b in self.beacons if b.current_active != "None"]
+        if not names:
+            return "None"
+        tracks = self.tracks
+        status = " + ".join(names)
+        if len(tracks) > len(self.beacons):
+            status += f" ({len(tracks)} beacons sharing {len(self.beacons)})"
+        elif len(tracks) == 1 and len(tracks[0].playlist.entries) > 1:
+            track = tracks[0]
+            status += f" ({track.playlist.name} {track.index + 1}/{len(track.playlist.entries)})"
+        return status
+
+    @property
+    def is_active(self):
+        # Tracks waiting out cooldowns still hold the adapter, so the radio arbiter keeps its pause state
+        return bool(self.tracks)
+
+    def pause(self):
+        for beacon in self.beacons:
+            beacon.pause()
+
+    def resume(self):
+        for beacon in self.beacons:
+            beacon.resume()
+
+    def stats(self) -> dict:
+        """Scheduler lateness plus the instances in use and how often tracks took turns on them"""
+        return dict(self.scheduler.stats(), instances=len(self.beacons), mux_switches=self.mux_switches)
+
+    @property
+    def debug_interval(self):
+        """Advertising interval and TX power of every instance on air, each distinct setting once"""
+        return " / ".join(sorted({b.debug_interval for b in self.beacons if b.debug_interval}))
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+bleakscan.py - Passive BleakScanner source that hands manufacturer data over as bytes
+"""
+
+import asyncio
+
+from bleak import BleakScanner
+from bleak.assigned_numbers import AdvertisementDataType
+from bleak.exc import BleakError
+
+from dicts import BEACON_PROTOCOL
+from hci import STOP_POLL, Advertisement
+
+# Passive scanning on BlueZ goes through an advertisement monitor, which needs
+# a pattern: manufacturer data starting with the Disney company ID (little-endian)
+DISNEY_PATTERN = (
+    0,
+    AdvertisementDataType.MANUFACTURER_SPECIFIC_DATA,
+    BEACON_PROTOCOL["MFG_ID"].to_bytes(2, "little"),
+)
+
+# ----------------------------------------------------------------------
+# Bleak Scan Source
+# ----------------------------------------------------------------------
+class BleakScanSource:
+    """
+    Scan source for ScanManager built on BleakScanner's detection_callback.
+    Manufacturer data arrives as bytes keyed by company ID, so droids are
+    decoded without any text round-trip. The BLEDevice of every advertiser is
+    kept so a later connection can skip another discovery.
+    """
+
+    def __init__(self, adapter=None, scanner_factory=None, passive=True):
+        # HCI adapter name (e.g. "hci1"); None uses the default controller
+        self.adapter = adapter
+        self.scanner_factory = scanner_factory or BleakScanner
+        self.passive = passive
+        self.devices = {}
+        self.reports = 0
+
+    def device(self, mac: str):
+        """BLEDevice last seen for a MAC, or None"""
+        return self.devices.get(mac.upper())
+
+    def scan(self, duration, on_advert, stop_event=None):
+        """Calls on_advert(Advertisement) for every advertisement seen within `duration` seconds"""
+        asyncio.run(self._scan(duration, on_advert, stop_event))
+
+    async def _start(self, callback):
+        kwargs = {"adapter": self.adapter} if self.adapter else {}
+        if self.passive:
+            try:
+                scanner = self.scanner_factory(
+                    detection_callback=callback, scanning_mode="passive",
+                    bluez={"or_patterns": [DISNEY_PATTERN]}, **kwargs
+                )
+                await scanner.start()
+                return scanner
+            except Exception as e:
+                # Needs BlueZ's experimental advertisement monitor support
+                print(f"[SCAN] Passive scanning unavailable ({e}), scanning actively")
+                self.passive = False
+        scanner = self.scanner_factory(detection_callback=callback, **kwargs)
+        try:
+            await scanner.start()
+        except BleakError as e:
+            # ScanManager falls back to the controller on OSError
+            raise OSError(f"bleak scanner failed to start: {e}") from e
+        return scanner
+
+    async def _scan(self, duration, on_advert, stop_event):
+        def callback(device, advertisement_data):
+            self.reports += 1
+            mac = device.address.upper()
+            self.devices[mac] = device
+            on_advert(Advertisement(
+                mac,
+                advertisement_data.local_name or device.name,
+                advertisement_data.manufacturer_data,
+                advertisement_data.rssi,
+            ))
+
+        scanner = await self._start(callback)
+        try:
+            loop = asyncio.get_running_loop()
+            end = loop.time() + duration
+            while loop.time() < end and not (stop_event and stop_event.is_set()):
+                await asyncio.sleep(min(STOP_POLL, end - loop.time()))
+        finally:
+            await scanner.stop()
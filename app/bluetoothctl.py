@@ -3,29 +3,103 @@
 bluetoothctl.py - Communication layer for bluetoothctl / BlueZ
 """
 
+import collections
+import itertools
 import queue
+import re
 import subprocess
 import threading
 import time
 import select
 import os
 import signal
+from concurrent.futures import Future
+
+from btevents import DeviceCache, EventParser, format_info
+
+# Executable used for both the interactive session and one-shot commands
+BLUETOOTHCTL_BIN = os.environ.get("BLUETOOTHCTL", "bluetoothctl")
+
+# Every command is followed by a unique unknown command. bluetoothctl answers it
+# with "Invalid command in menu ...: <token>", which marks the end of the
+# previous command's output.
+SENTINEL_PREFIX = "__droidtoolbox_"
+
+# Help text bluetoothctl prints after an invalid command
+_SENTINEL_NOISE = ("Use \"help\"", "Use \"menu", "Use \"back\"")
+
+# Results of D-Bus calls bluetoothctl prints whenever they come back, usually
+# after later commands' sentinels, so they never belong to the pending command
+_ASYNC_RE = re.compile(
+    r"^(?:Changing \S+ (?:on|off) (?:succeeded|failed)|Discovery (?:started|stopped)"
+    r"|Failed to (?:start|stop) discovery)"
+)
+
+_ANSI_RE = re.compile(r"\x1b\[[0-9;?]*[A-Za-z]|[\x01\x02\r]")
+_PROMPT_RE = re.compile(r"^(?:\[[^\]]*\][#>] ?)+")
+
+# Number of recent samples per command kept for latency statistics
+LATENCY_WINDOW = 100
+
+# Supervisor: how often the child is checked and how restarts back off
+SUPERVISOR_INTERVAL = 0.5
+RESTART_BACKOFF_BASE = 0.5
+RESTART_BACKOFF_MAX = 30.0
 
 class BluetoothCtlError(RuntimeError):
     pass
 
+class _PendingCommand:
+    __slots__ = ("cmd", "sentinel", "future", "lines", "sent_at")
+
+    def __init__(self, cmd, sentinel):
+        self.cmd = cmd
+        self.sentinel = sentinel
+        self.future = Future()
+        self.lines = []
+        self.sent_at = time.monotonic()
+
+def clean_line(line: str) -> str:
+    """Strips colour codes and the interactive prompt from a bluetoothctl output line"""
+    return _PROMPT_RE.sub("", _ANSI_RE.sub("", line))
+
 class BluetoothCtl:
-    def __init__(self):
+    def __init__(self, binary=None, adapter=None):
+        self.binary = binary or BLUETOOTHCTL_BIN
+        # Controller address to `select`; None keeps bluetoothctl's default controller
+        self.adapter = adapter
         self.proc = None
+        self.current_mfg_payload = None
         self._cmd_queue = queue.Queue()
-        self._queue = queue.Queue(maxsize=500)
         self._stop_event = threading.Event()
+
+        # Live device properties fed by the [NEW]/[CHG]/[DEL] lines bluetoothctl prints
+        self.devices = DeviceCache()
+        self._parser = EventParser()
+
+        # Commands written to bluetoothctl whose output is still being collected
+        self._pending = collections.deque()
+        self._pending_lock = threading.Lock()
+        self._sentinels = itertools.count(1)
+        self._latencies = {}
+
+        # State replayed into a restarted bluetoothctl
+        self._scanning = False
+        self._mfg_args = None
+        self.restarts = 0
+        self.recovery_times = []
+        self._wake_supervisor = threading.Event()
         self._start_process()
         
         # Start a dedicated thread to write to stdin
         self._writer_thread = threading.Thread(target=self._writer, daemon=True)
         self._writer_thread.start()
 
+        self._supervisor_thread = threading.Thread(
+            target=self._supervise, name="BluetoothCtlSupervisor", daemon=True
+        )
+        self._supervisor_thread.start()
+
     # ------------------------------------------------------------------
     # Process lifecycle
     # ------------------------------------------------------------------
@@ -34,7 +108,7 @@ class BluetoothCtl:
             raise BluetoothCtlError("bluetoothctl already running")
 
         self.proc = subprocess.Popen(
-            ["bluetoothctl"],
+            [self.binary],
             stdin=subprocess.PIPE,
             stdout=subprocess.PIPE,
             stderr=subprocess.STDOUT,
@@ -44,18 +118,84 @@ class BluetoothCtl:
 
         self._stop_event.clear()
         self._reader_thread = threading.Thread(
-            target=self._reader, daemon=True
+            target=self._reader, args=(self.proc,), daemon=True
         )
         self._reader_thread.start()
 
+        if self.adapter:
+            self._send(f"select {self.adapter}")
         self._send("power on")
         self._send("agent NoInputNoOutput")
         self._send("default-agent")
         self._send("pairable off")
-        self._send("discoverable off")
+        return self._send("discoverable off")
+
+    def _supervise(self):
+        """Restarts bluetoothctl with exponential backoff if it exits underneath us"""
+        while True:
+            # The reader wakes us on EOF; the timeout covers a child that hangs up silently
+            self._wake_supervisor.wait(SUPERVISOR_INTERVAL)
+            self._wake_supervisor.clear()
+            if self._stop_event.is_set():
+                return
+            proc = self.proc
+            if proc is not None and proc.poll() is None and not self._reader_thread.is_alive():
+                # Output closed but the child lingers; it is no use to us like that
+                proc.kill()
+                proc.wait()
+            if proc is None or proc.poll() is None:
+                continue
+
+            died_at = time.monotonic()
+            print(f"[BT] bluetoothctl exited with code {proc.returncode}, restarting...")
+            self._reader_thread.join(timeout=1.0)
+            self._fail_pending(BluetoothCtlError("bluetoothctl exited"))
+
+            attempt = 0
+            while not self._stop_event.is_set():
+                try:
+                    self.proc = None
+                    self._restart()
+                    break
+                except Exception as e:
+                    if self.proc and self.proc.poll() is None:
+                        self.proc.kill()
+                    delay = min(RESTART_BACKOFF_MAX, RESTART_BACKOFF_BASE * (2 ** attempt))
+                    attempt += 1
+                    print(f"[BT] Restart attempt {attempt} failed ({e}), retrying in {delay:.1f}s")
+                    self._stop_event.wait(delay)
+            else:
+                return
+
+            elapsed = time.monotonic() - died_at
+            self.restarts += 1
+            self.recovery_times.append(elapsed)
+            print(f"[BT] bluetoothctl recovered in {elapsed * 1000:.0f} ms")
+
+    def _restart(self):
+        """Starts a fresh bluetoothctl and replays scanning and advertising state"""
+        last = self._start_process()
+        if self._scanning:
+            last = self._send("scan on")
+        if self._mfg_args:
+            self.current_mfg_payload = None
+            last = self.broadcast_mfg(*self._mfg_args)
+        # Recovery only counts once the new process has worked through the replay
+        last.result(timeout=5.0)
+
+    def recovery_stats(self) -> dict:
+        """How often bluetoothctl was restarted and how long recovery took (ms)"""
+        times = self.recovery_times
+        return {
+            "restarts": self.restarts,
+            "last_ms": times[-1] * 1000 if times else 0.0,
+            "mean_ms": sum(times) / len(times) * 1000 if times else 0.0,
+            "max_ms": max(times) * 1000 if times else 0.0,
+        }
 
     def close(self):
         self._stop_event.set()
+        self._wake_supervisor.set()
         if not self.proc:
             return
 
@@ -76,10 +216,10 @@ class BluetoothCtl:
         try:
             if not self.proc or self.proc.poll() is not None:
                 return False
-            output = self.get_info("")
-            return "Powered: yes" in output
-        except BluetoothCtlError:
+            lines = self.send_command("show").result(timeout=2.0)
+        except (TimeoutError, BluetoothCtlError):
             return False
+        return any(line.strip() == "Powered: yes" for line in lines)
 
     # ------------------------------------------------------------------
     # Read/Write threads
@@ -88,41 +228,132 @@ class BluetoothCtl:
         """Dedicated thread to prevent the main app from hanging on stdin.write"""
         while not self._stop_event.is_set():
             try:
-                cmd = self._cmd_queue.get(timeout=0.1)
-                if self.proc and self.proc.poll() is None:
-                    self.proc.stdin.write(cmd + "\n")
-                    self.proc.stdin.flush()
-            except (queue.Empty, BrokenPipeError):
+                cmd, sentinel = self._cmd_queue.get(timeout=0.1)
+            except queue.Empty:
                 continue
 
-    def _reader(self):
+            proc = self.proc
+            try:
+                if not proc or proc.poll() is not None:
+                    raise BrokenPipeError()
+                # Command and sentinel go out in one write so nothing can interleave
+                proc.stdin.write(f"{cmd}\n{sentinel}\n")
+                proc.stdin.flush()
+            except (BrokenPipeError, OSError, ValueError):
+                # Its sentinel will never come back, so release whoever is waiting
+                self._drop_pending(sentinel, BluetoothCtlError(f"bluetoothctl not running: {cmd}"))
+
+    def _reader(self, proc):
+        buf = b""
         try:
-            fd = self.proc.stdout.fileno()
+            fd = proc.stdout.fileno()
             while not self._stop_event.is_set():
                 r, _, _ = select.select([fd], [], [], 0.2)
                 if not r:
+                    # Output went quiet, so any open hex block is complete
+                    self._apply_events(self._parser.flush())
                     continue
 
-                line = self.proc.stdout.readline()
-                if not line:
+                # Read the raw fd so select() never misses lines sitting in a Python buffer
+                chunk = os.read(fd, 4096)
+                if not chunk:
                     break
 
-                try:
-                    self._queue.put_nowait(line)
-                except queue.Full:
-                    try:
-                        self._queue.get_nowait()
-                        self._queue.put_nowait(line)
-                    except queue.Empty:
-                        pass
+                buf += chunk
+                *lines, buf = buf.split(b"\n")
+                for raw in lines:
+                    self._handle_line(raw.decode("utf-8", "replace") + "\n")
         except Exception:
             pass
+        finally:
+            self._fail_pending(BluetoothCtlError("bluetoothctl output closed"))
+            self._wake_supervisor.set()
+
+    def _handle_line(self, line: str):
+        """Routes a line to the command awaiting output, or to the device event parser"""
+        text = clean_line(line)
+        stripped = text.strip()
+
+        with self._pending_lock:
+            head = self._pending[0] if self._pending else None
+            if SENTINEL_PREFIX in stripped:
+                if head and head.sentinel in stripped:
+                    self._pending.popleft()
+                    self._complete(head)
+                # Stale echoes of sentinels that already completed are dropped
+                return
+            if not stripped or stripped.startswith(_SENTINEL_NOISE):
+                return
+            if _ASYNC_RE.match(stripped):
+                if "failed" in stripped.lower():
+                    print(f"[BT] {stripped}")
+                return
+            is_event = stripped.startswith(("[NEW]", "[CHG]", "[DEL]")) or self._parser.wants(text)
+            if head and not is_event:
+                # Skip the echo of the command itself
+                if stripped != head.cmd:
+                    head.lines.append(text)
+                return
+
+        self._apply_events(self._parser.feed(text))
+
+    def _apply_events(self, events):
+        for event in events:
+            self.devices.apply(event)
+
+    def _complete(self, pending: _PendingCommand):
+        elapsed = time.monotonic() - pending.sent_at
+        verb = pending.cmd.split(" ", 1)[0]
+        self._latencies.setdefault(verb, collections.deque(maxlen=LATENCY_WINDOW)).append(elapsed)
+        if not pending.future.done():
+            pending.future.set_result(pending.lines)
+
+    def _drop_pending(self, sentinel: str, exc: Exception):
+        with self._pending_lock:
+            for pending in self._pending:
+                if pending.sentinel == sentinel:
+                    self._pending.remove(pending)
+                    if not pending.future.done():
+                        pending.future.set_exception(exc)
+                    break
+
+    def _fail_pending(self, exc: Exception):
+        with self._pending_lock:
+            while self._pending:
+                pending = self._pending.popleft()
+                if not pending.future.done():
+                    pending.future.set_exception(exc)
 
     # ------------------------------------------------------------------
     # Command sending
     # ------------------------------------------------------------------
+    def send_command(self, cmd: str) -> Future:
+        """
+        Queues a command and returns a Future resolving to exactly the output
+        lines it produced. Commands pipeline: callers don't wait on each other.
+        """
+        pending = _PendingCommand(cmd, f"{SENTINEL_PREFIX}{next(self._sentinels)}__")
+        with self._pending_lock:
+            self._pending.append(pending)
+            self._cmd_queue.put((cmd, pending.sentinel))
+        return pending.future
+
     def _send(self, cmd: str, delay: float = 0.0):
-        self._cmd_queue.put(cmd)
+        return self.send_command(cmd)
+
+    def command_stats(self) -> dict:
+        """Per-command latency (ms) over the most recent samples"""
+        with self._pending_lock:
+            snapshot = {verb: sorted(samples) for verb, samples in self._latencies.items()}
+        stats = {}
+        for verb, samples in snapshot.items():
+            stats[verb] = {
+                "count": len(samples),
+                "mean_ms": sum(samples) / len(samples) * 1000,
+                "p95_ms": samples[min(len(samples) - 1, int(len(samples) * 0.95))] * 1000,
+                "max_ms": samples[-1] * 1000,
+            }
+        return stats
 
     # ------------------------------------------------------------------
     # Public API
@@ -131,69 +362,125 @@ class BluetoothCtl:
         """Ensure the adapter is powered. Retry once if needed."""
         try:
             print("[BT] Ensuring Bluetooth is powered on...")
-            self._send("power on") 
-            time.sleep(0.1)
-            output = self.get_info("")
-            if "Powered: yes" not in output:
+            self._send("power on")
+            if not self._is_powered():
                 print("[BT] Adapter still not powered, retrying...")
                 self._send("power on")
         except BluetoothCtlError as e:
             print(f"[BT] Failed to power on: {e}")
 
     def start_scanning(self):
+        self._scanning = True
         self._send("scan on")
 
     def stop_scanning(self):
+        self._scanning = False
         self._send("scan off")
 
     def get_info(self, mac: str, timeout: float = 1.0) -> str:
         mac = mac.upper()
-        self._send(f"info {mac}", delay=0.0)
+
+        # Devices bluetoothctl already reported are answered from the live cache
+        cached = self.devices.get(mac) if mac else None
+        if cached and cached.get("ManufacturerData"):
+            return format_info(mac, cached)
+
         print(f"[BT] Fetching info for {mac}...")
-    
-        end = time.monotonic() + timeout
-        output = []
-        found_data = False
-    
-        while time.monotonic() < end:
-            try:
-                line = self._queue.get(timeout=0.1)
-                output.append(line)
-                
-                # Specifically look for the end of the data block we need
-                if "ManufacturerData" in line or "ServiceData" in line:
-                    found_data = True
-                    
-            except queue.Empty:
-                # If we haven't seen any data yet, keep waiting. 
-                # If we already have some data, give it one last short wait for trailing lines.
-                if found_data:
-                    time.sleep(0.1)
-                    break
-                continue
-                
-        if not found_data:
+        try:
+            lines = self.send_command(f"info {mac}".strip()).result(timeout)
+        except TimeoutError:
             print(f"[BT] Warning: get_info timed out for {mac}")
-    
-        return "".join(output)
+            return ""
+        except BluetoothCtlError as e:
+            # The supervisor fails queued commands when bluetoothctl exits
+            print(f"[BT] Warning: get_info failed for {mac}: {e}")
+            return ""
+        if mac:
+            self._apply_events(EventParser().parse_info(mac, lines))
+        return "".join(lines)
+
+    def discover(self, duration: float, stop_event=None) -> list:
+        """
+        Runs a timed discovery on this session's controller and returns
+        (mac, name) pairs. Setting `stop_event` ends the discovery early.
+        """
+        was_scanning = self._scanning
+        self.start_scanning()
+        (stop_event or threading.Event()).wait(duration)
+        if not was_scanning:
+            self.stop_scanning()
+
+        try:
+            lines = self.send_command("devices").result(timeout=2.0)
+        except (TimeoutError, BluetoothCtlError) as e:
+            print(f"[BT] Failed to list devices: {e}")
+            return []
+
+        devices = []
+        for line in lines:
+            parts = line.split(maxsplit=2)
+            if len(parts) >= 2 and parts[0] == "Device":
+                devices.append((parts[1].upper(), parts[2].strip() if len(parts) > 2 else ""))
+        return devices
+
+    def read_info(self, mac: str) -> str:
+        """Info lookup for scan results, correlated through the shared session"""
+        return self.get_info(mac)
 
     # ------------------------------------------------------------------
     # Advertising (stable, no clear abuse)
     # ------------------------------------------------------------------
-    def broadcast_mfg(self, mfg_id: str, mfg_data: str):
-        payload = f"{mfg_id}:{mfg_data}"
+    def advertising_instances(self) -> int:
+        """bluetoothctl registers a single advertisement, whatever the adapter supports"""
+        return 1
+
+    def broadcast_mfg(self, mfg_id: str, mfg_data: str, interval=None, tx_power=None, instance=0):
+        """
+        Advertises manufacturer data. `interval` is an optional (min, max) pair
+        in milliseconds and `tx_power` an optional level in dBm; left out, BlueZ
+        uses its defaults.
+        """
+        if instance:
+            raise BluetoothCtlError("bluetoothctl only drives advertising instance 0")
+        payload = f"{mfg_id}:{mfg_data}:{interval}:{tx_power}"
         if payload == self.current_mfg_payload:
-            return
+            return None
     
         self._send("advertise off", delay=0.1)
         self._send("menu advertise")
         self._send("clear")
         self._send(f"manufacturer {mfg_id} {mfg_data}")
+        if interval:
+            self._send(f"interval {interval[0]} {interval[1]}")
+        if tx_power is not None:
+            self._send(f"tx-power on {tx_power}")
         self._send("back")
-        self._send("advertise on")
+        done = self._send("advertise on")
         self.current_mfg_payload = payload
+        self._mfg_args = (mfg_id, mfg_data, interval, tx_power)
         print(f"[BT] Updating Advertisement: ID={mfg_id}, Data={mfg_data}")
+        return done
 
-    def stop_advertising(self):
+    def stop_advertising(self, instance=None):
+        if instance:
+            return
         self._send("advertise off")
         self.current_mfg_payload = None
+        self._mfg_args = None
+
+# ----------------------------------------------------------------------
+# Backend selection
+# ----------------------------------------------------------------------
+def create_controller(backend=None, adapter=None):
+    """
+    Returns the Bluetooth controller for the requested backend ("bluetoothctl"
+    or "dbus"), bound to an adapters.Adapter or the system default if None.
+    """
+    backend = (backend or os.environ.get("BT_BACKEND", "bluetoothctl")).lower()
+    if backend == "dbus":
+        try:
+            from bluez import BluezDBus
+            return BluezDBus(adapter=adapter.name if adapter else "hci0")
+        except Exception as e:
+            print(f"[BT] D-Bus backend unavailable ({e}), falling back to bluetoothctl")
+    return BluetoothCtl(adapter=adapter.address if adapter else None)
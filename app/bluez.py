@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+bluez.py - Native BlueZ D-Bus backend built on dbus-fast
+"""
+
+import asyncio
+import threading
+
+from dbus_fast import BusType, Message, MessageType, Variant
+from dbus_fast.aio import MessageBus
+
+from advertising import AD_MANAGER_IFACE, AdvertisingEngine, advertisement_path
+from bluetoothctl import BluetoothCtlError
+from btevents import TRACKED_PROPS, DeviceCache, DeviceEvent, format_info
+
+BLUEZ_SERVICE = "org.bluez"
+ADAPTER_IFACE = "org.bluez.Adapter1"
+DEVICE_IFACE = "org.bluez.Device1"
+PROPS_IFACE = "org.freedesktop.DBus.Properties"
+OBJECT_MANAGER_IFACE = "org.freedesktop.DBus.ObjectManager"
+DBUS_SERVICE = "org.freedesktop.DBus"
+DBUS_PATH = "/org/freedesktop/DBus"
+
+def _device_events(mac, props):
+    """CHG events for the tracked properties in a Device1 property dict of Variants"""
+    for prop in TRACKED_PROPS:
+        if prop not in props:
+            continue
+        value = props[prop].value
+        if prop == "ManufacturerData":
+            value = {company: bytes(data.value) for company, data in value.items()}
+        yield DeviceEvent("CHG", mac, prop, value)
+
+# ----------------------------------------------------------------------
+# BluezDBus (drop-in replacement for BluetoothCtl)
+# ----------------------------------------------------------------------
+class BluezDBus:
+    def __init__(self, adapter="hci0", bus=None):
+        self.adapter_path = f"/org/bluez/{adapter}"
+        self.current_mfg_payload = None
+        self._bus = bus
+        # Same live cache BluetoothCtl keeps, fed from BlueZ signals instead of console output
+        self.devices = DeviceCache()
+
+        # dbus-fast is asyncio based, so it gets a private loop on its own thread
+        self._loop = asyncio.new_event_loop()
+        self._loop_thread = threading.Thread(
+            target=self._loop.run_forever, name="BluezDBusLoop", daemon=True
+        )
+        self._loop_thread.start()
+
+        if self._bus is None:
+            self._run(self._connect())
+        self.advertiser = AdvertisingEngine(self._bus, self.adapter_path)
+        # One engine per advertising instance in use; 0 is self.advertiser
+        self.advertisers = {0: self.advertiser}
+        self._mfg_payloads = {}
+        self._set_adapter("Pairable", Variant("b", False))
+        self._set_adapter("Discoverable", Variant("b", False))
+        self._run(self._watch_devices())
+
+    # ------------------------------------------------------------------
+    # Loop / bus plumbing
+    # ------------------------------------------------------------------
+    def _run(self, coro, timeout: float = 5.0):
+        """Executes a coroutine on the D-Bus loop and waits for its result"""
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result(timeout)
+
+    async def _connect(self):
+        self._bus = await MessageBus(bus_type=BusType.SYSTEM).connect()
+
+    async def _call(self, path, interface, member, signature="", body=None):
+        reply = await self._bus.call(Message(
+            destination=BLUEZ_SERVICE,
+            path=path,
+            interface=interface,
+            member=member,
+            signature=signature,
+            body=body or [],
+        ))
+        if reply.message_type == MessageType.ERROR:
+            detail = reply.body[0] if reply.body else ""
+            raise BluetoothCtlError(f"{member} failed: {reply.error_name} {detail}".strip())
+        return reply.body
+
+    async def _watch_devices(self):
+        """Subscribes to device signals and seeds the cache with what BlueZ already knows"""
+        if not hasattr(self._bus, "add_message_handler"):
+            print("[BT] Bus has no signal support; presence mode and sniffing need a scan source")
+            return
+        self._bus.add_message_handler(self._on_signal)
+        for rule in (
+            f"type='signal',sender='{BLUEZ_SERVICE}',interface='{OBJECT_MANAGER_IFACE}'",
+            f"type='signal',sender='{BLUEZ_SERVICE}',interface='{PROPS_IFACE}',"
+            f"member='PropertiesChanged',arg0='{DEVICE_IFACE}'",
+        ):
+            reply = await self._bus.call(Message(
+                destination=DBUS_SERVICE,
+                path=DBUS_PATH,
+                interface=DBUS_SERVICE,
+                member="AddMatch",
+                signature="s",
+                body=[rule],
+            ))
+            if reply.message_type == MessageType.ERROR:
+                print(f"[BT] Warning: could not subscribe to device signals: {reply.error_name}")
+                return
+
+        body = await self._call("/", OBJECT_MANAGER_IFACE, "GetManagedObjects")
+        for path, interfaces in body[0].items():
+            self._device_added(path, interfaces)
+
+    def _device_mac(self, path):
+        """MAC for a Device1 object path on our adapter, None for anything else"""
+        prefix = self.adapter_path + "/dev_"
+        if not path or not path.startswith(prefix) or "/" in path[len(prefix):]:
+            return None
+        return path[len(prefix):].replace("_", ":").upper()
+
+    def _device_added(self, path, interfaces):
+        mac = self._device_mac(path)
+        props = interfaces.get(DEVICE_IFACE)
+        if mac is None or props is None:
+            return
+        name = props.get("Name") or props.get("Alias")
+        self.devices.apply(DeviceEvent("NEW", mac, "Name", name.value if name else None))
+        for event in _device_events(mac, props):
+            self.devices.apply(event)
+
+    def _on_signal(self, msg):
+        """Message handler on the D-Bus loop; mirrors device signals into the cache"""
+        if msg.message_type != MessageType.SIGNAL:
+            return
+        if msg.member == "PropertiesChanged" and msg.interface == PROPS_IFACE:
+            mac = self._device_mac(msg.path)
+            if mac is not None and msg.body[0] == DEVICE_IFACE:
+                for event in _device_events(mac, msg.body[1]):
+                    self.devices.apply(event)
+        elif msg.member == "InterfacesAdded" and msg.interface == OBJECT_MANAGER_IFACE:
+            self._device_added(msg.body[0], msg.body[1])
+        elif msg.member == "InterfacesRemoved" and msg.interface == OBJECT_MANAGER_IFACE:
+            mac = self._device_mac(msg.body[0])
+            if mac is not None and DEVICE_IFACE in msg.body[1]:
+                self.devices.apply(DeviceEvent("DEL", mac, "Name", None))
+
+    def _set_adapter(self, prop, value):
+        self._run(self._call(self.adapter_path, PROPS_IFACE, "Set", "ssv", [ADAPTER_IFACE, prop, value]))
+
+    def _get_all(self, path, interface) -> dict:
+        body = self._run(self._call(path, PROPS_IFACE, "GetAll", "s", [interface]))
+        return {k: v.value for k, v in body[0].items()}
+
+    def _device_path(self, mac: str) -> str:
+        return f"{self.adapter_path}/dev_{mac.upper().replace(':', '_')}"
+
+    def close(self):
+        try:
+            self.stop_advertising()
+        except Exception:
+            pass
+        if self._bus is not None and hasattr(self._bus, "disconnect"):
+            self._loop.call_soon_threadsafe(self._bus.disconnect)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+
+    def _is_powered(self) -> bool:
+        """Check if Bluetooth is powered."""
+        try:
+            return bool(self._get_all(self.adapter_path, ADAPTER_IFACE).get("Powered"))
+        except BluetoothCtlError:
+            return False
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+    def power_on(self):
+        """Ensure the adapter is powered."""
+        try:
+            if not self._is_powered():
+                print("[BT] Powering on adapter over D-Bus...")
+                self._set_adapter("Powered", Variant("b", True))
+        except BluetoothCtlError as e:
+            print(f"[BT] Failed to power on: {e}")
+
+    def start_scanning(self):
+        self._run(self._call(self.adapter_path, ADAPTER_IFACE, "SetDiscoveryFilter", "a{sv}",
+                             [{"Transport": Variant("s", "le"), "DuplicateData": Variant("b", True)}]))
+        self._run(self._call(self.adapter_path, ADAPTER_IFACE, "StartDiscovery"))
+
+    def stop_scanning(self):
+        try:
+            self._run(self._call(self.adapter_path, ADAPTER_IFACE, "StopDiscovery"))
+        except BluetoothCtlError:
+            # BlueZ reports an error if discovery was not running
+            pass
+
+    def get_info(self, mac: str, timeout: float = 1.0) -> str:
+        """Returns bluetoothctl-style info text; an empty MAC describes the adapter"""
+        if not mac:
+            props = self._get_all(self.adapter_path, ADAPTER_IFACE)
+            lines = [f"Controller {props.get('Address', '')}"]
+            lines.append(f"\tPowered: {'yes' if props.get('Powered') else 'no'}")
+            return "\n".join(lines) + "\n"
+
+        try:
+            props = self._get_all(self._device_path(mac), DEVICE_IFACE)
+        except BluetoothCtlError as e:
+            # Empty like BluetoothCtl, so callers behave the same on either backend
+            print(f"[BT] Warning: get_info failed for {mac}: {e}")
+            return ""
+        mfg = {company: data.value for company, data in props.get("ManufacturerData", {}).items()}
+        return format_info(mac.upper(), {**props, "ManufacturerData": mfg})
+
+    def read_info(self, mac: str) -> str:
+        return self.get_info(mac)
+
+    def discover(self, duration: float, stop_event=None) -> list:
+        """Runs a timed LE discovery (ended early by `stop_event`) and returns (mac, name) for every device bluez knows about"""
+        self.start_scanning()
+        (stop_event or threading.Event()).wait(duration)
+        self.stop_scanning()
+
+        body = self._run(self._call("/", OBJECT_MANAGER_IFACE, "GetManagedObjects"))
+        prefix = self.adapter_path + "/"
+        devices = []
+        for path, interfaces in body[0].items():
+            dev = interfaces.get(DEVICE_IFACE)
+            if not path.startswith(prefix) or not dev:
+                continue
+            name = dev.get("Name") or dev.get("Alias")
+            devices.append((dev["Address"].value.upper(), name.value if name else ""))
+        return devices
+
+    # ------------------------------------------------------------------
+    # Advertising
+    # ------------------------------------------------------------------
+    def advertising_instances(self) -> int:
+        """Advertisements this adapter can hold at once: what BlueZ has free plus the ones we hold"""
+        try:
+            props = self._get_all(self.adapter_path, AD_MANAGER_IFACE)
+        except BluetoothCtlError:
+            return 1
+        ours = sum(1 for engine in self.advertisers.values() if engine.registered)
+        return max(1, int(props.get("SupportedInstances", 0)) + ours)
+
+    def _advertiser(self, instance) -> AdvertisingEngine:
+        engine = self.advertisers.get(instance)
+        if engine is None:
+            engine = self.advertisers[instance] = AdvertisingEngine(
+                self._bus, self.adapter_path, advertisement_path(instance)
+            )
+        return engine
+
+    def broadcast_mfg(self, mfg_id: str, mfg_data: str, interval=None, tx_power=None, instance=0):
+        payload = f"{mfg_id}:{mfg_data}:{interval}:{tx_power}"
+        if payload == self._mfg_payloads.get(instance):
+            return
+
+        data = bytes(int(b, 16) for b in mfg_data.split())
+        self._run(self._advertiser(instance).update(int(mfg_id, 16), data, interval, tx_power))
+        self._mfg_payloads[instance] = payload
+        if instance == 0:
+            self.current_mfg_payload = payload
+        suffix = f" {instance}" if instance else ""
+        print(f"[BT] Updating Advertisement{suffix}: ID={mfg_id}, Data={mfg_data}")
+
+    def stop_advertising(self, instance=None):
+        """Takes one advertising instance off air, or all of them"""
+        instances = list(self.advertisers) if instance is None else [instance]
+        for i in instances:
+            if i in self.advertisers:
+                self._run(self.advertisers[i].stop())
+            self._mfg_payloads.pop(i, None)
+        if 0 in instances:
+            self.current_mfg_payload = None
+
+    def advertising_stats(self) -> dict:
+        return self.advertiser.stats()
@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""
+btevents.py - Typed device events from bluetoothctl output and a live property cache
+"""
+
+import collections
+import re
+import threading
+
+# Device properties the cache keeps
+TRACKED_PROPS = ("Name", "RSSI", "ManufacturerData", "TxPower", "Connected", "Paired")
+
+# Callback notifications waiting for the dispatcher before new keys are dropped
+MAX_PENDING_NOTIFICATIONS = 1000
+
+_EVENT_RE = re.compile(r"^\[(NEW|CHG|DEL)\] Device ([0-9A-Fa-f:]{17})\s*(.*)$")
+_PROP_RE = re.compile(r"^\s*([A-Za-z.]+(?: Key| Value)?):\s*(.*)$")
+_HEX_LINE_RE = re.compile(r"^\s+((?:[0-9a-fA-F]{2} ){0,15}[0-9a-fA-F]{2})(?:\s|$)")
+
+DeviceEvent = collections.namedtuple("DeviceEvent", ["kind", "mac", "prop", "value"])
+
+def _parse_value(prop, raw):
+    """Converts bluetoothctl's text for a property into a Python value"""
+    raw = raw.strip()
+    if prop in ("RSSI", "TxPower"):
+        # Newer bluez prints "0xffffffc1 (-63)", older just "-63"
+        match = re.search(r"\((-?\d+)\)", raw)
+        try:
+            return int(match.group(1) if match else raw, 0)
+        except ValueError:
+            return None
+    if prop in ("Connected", "Paired"):
+        return raw == "yes"
+    return raw
+
+def format_info(mac: str, props: dict) -> str:
+    """Renders cached properties as bluetoothctl `info` text"""
+    lines = [f"Device {mac}"]
+    for key in ("Name", "Paired", "Connected", "RSSI", "TxPower"):
+        if props.get(key) is None:
+            continue
+        value = props[key]
+        if isinstance(value, bool):
+            value = "yes" if value else "no"
+        lines.append(f"\t{key}: {value}")
+    # ManufacturerData is written last so DroidScanner can split on it
+    for company, data in (props.get("ManufacturerData") or {}).items():
+        lines.append(f"\tManufacturerData Key: 0x{company:04x}")
+        lines.append("\tManufacturerData Value:")
+        lines.append("  " + " ".join(f"{b:02x}" for b in data))
+    return "\n".join(lines) + "\n"
+
+# ----------------------------------------------------------------------
+# Event Parser
+# ----------------------------------------------------------------------
+class EventParser:
+    """
+    Streaming parser for [NEW]/[CHG]/[DEL] lines. ManufacturerData values span
+    several hex-dump lines, so they are buffered until a non-hex line (or an
+    explicit flush) ends the block.
+    """
+
+    def __init__(self):
+        self._mfg_keys = {}
+        self._hex_block = None  # (mac, company, bytearray)
+
+    def feed(self, line: str) -> list:
+        """Parses one cleaned output line and returns the events it completed"""
+        if self._hex_block is not None:
+            match = _HEX_LINE_RE.match(line)
+            if match:
+                self._hex_block[2].extend(bytes.fromhex(match.group(1)))
+                return []
+        events = self.flush()
+
+        match = _EVENT_RE.match(line.strip())
+        if not match:
+            return events
+        kind, mac, rest = match.group(1), match.group(2).upper(), match.group(3)
+
+        if kind != "CHG":
+            events.append(DeviceEvent(kind, mac, "Name", rest or None))
+            return events
+
+        prop_match = _PROP_RE.match(rest)
+        if not prop_match:
+            return events
+        prop, raw = prop_match.groups()
+        events.extend(self._property(mac, prop, raw))
+        return events
+
+    def wants(self, line: str) -> bool:
+        """True if the line continues a ManufacturerData hex block being collected"""
+        return self._hex_block is not None and _HEX_LINE_RE.match(line) is not None
+
+    def parse_info(self, mac: str, lines) -> list:
+        """Turns the output of `info <mac>` into CHG events"""
+        mac = mac.upper()
+        events = []
+        for line in lines:
+            if self._hex_block is not None:
+                match = _HEX_LINE_RE.match(line)
+                if match:
+                    self._hex_block[2].extend(bytes.fromhex(match.group(1)))
+                    continue
+            events.extend(self.flush())
+            prop_match = _PROP_RE.match(line)
+            if prop_match:
+                events.extend(self._property(mac, *prop_match.groups()))
+        events.extend(self.flush())
+        return events
+
+    def flush(self) -> list:
+        """Completes a pending ManufacturerData hex block"""
+        if self._hex_block is None:
+            return []
+        mac, company, data = self._hex_block
+        self._hex_block = None
+        return [DeviceEvent("CHG", mac, "ManufacturerData", {company: bytes(data)})]
+
+    def _property(self, mac, prop, raw):
+        prop = prop.replace(".", " ")
+        if prop == "ManufacturerData Key":
+            try:
+                self._mfg_keys[mac] = int(raw.split()[0], 16)
+            except (ValueError, IndexError):
+                pass
+            return []
+        if prop == "ManufacturerData Value":
+            self._hex_block = (mac, self._mfg_keys.get(mac, 0), bytearray())
+            # Some bluez versions put the first bytes on the same line
+            match = _HEX_LINE_RE.match(" " + raw)
+            if match:
+                self._hex_block[2].extend(bytes.fromhex(match.group(1)))
+            return []
+        if prop in TRACKED_PROPS:
+            return [DeviceEvent("CHG", mac, prop, _parse_value(prop, raw))]
+        return []
+
+# ----------------------------------------------------------------------
+# Device Cache
+# ----------------------------------------------------------------------
+class DeviceCache:
+    """
+    Per-MAC property store updated from DeviceEvents. Subscriber callbacks run
+    on a dispatcher thread; while it is busy, repeated updates to the same
+    property coalesce into the latest value instead of queueing up.
+    """
+
+    def __init__(self, max_pending=MAX_PENDING_NOTIFICATIONS):
+        self._devices = {}
+        self._lock = threading.Lock()
+        self._subscribers = []
+        self._pending = collections.OrderedDict()
+        self._pending_cond = threading.Condition()
+        self._max_pending = max_pending
+        self.events = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self._dispatcher = None
+
+    def apply(self, event: DeviceEvent):
+        """Updates the store and schedules subscriber notifications"""
+        with self._lock:
+            self.events += 1
+            if event.kind == "DEL":
+                self._devices.pop(event.mac, None)
+            else:
+                props = self._devices.setdefault(event.mac, {})
+                if event.prop == "ManufacturerData":
+                    # Replaced rather than updated so copies handed out by get() stay stable
+                    props["ManufacturerData"] = {**props.get("ManufacturerData", {}), **event.value}
+                elif event.value is not None or event.prop not in props:
+                    props[event.prop] = event.value
+
+        if self._subscribers:
+            self._notify(event)
+
+    def get(self, mac: str) -> dict:
+        """Returns a copy of the cached properties for a device (empty if unseen)"""
+        with self._lock:
+            return dict(self._devices.get(mac.upper(), {}))
+
+    def macs(self) -> list:
+        with self._lock:
+            return list(self._devices)
+
+    def stats(self) -> dict:
+        with self._pending_cond:
+            pending = len(self._pending)
+        return {
+            "devices": len(self._devices),
+            "events": self.events,
+            "coalesced": self.coalesced,
+            "dropped": self.dropped,
+            "pending": pending,
+        }
+
+    # ------------------------------------------------------------------
+    # Subscribers
+    # ------------------------------------------------------------------
+    def subscribe(self, callback):
+        """Registers callback(event) for every device event"""
+        self._subscribers.append(callback)
+        if self._dispatcher is None:
+            self._dispatcher = threading.Thread(
+                target=self._dispatch, name="DeviceEventDispatch", daemon=True
+            )
+            self._dispatcher.start()
+
+    def unsubscribe(self, callback):
+        try:
+            self._subscribers.remove(callback)
+        except ValueError:
+            pass
+
+    def _notify(self, event: DeviceEvent):
+        key = (event.mac, event.kind, event.prop)
+        with self._pending_cond:
+            if key in self._pending:
+                self._pending[key] = event
+                self.coalesced += 1
+                return
+            if len(self._pending) >= self._max_pending:
+                self.dropped += 1
+                return
+            self._pending[key] = event
+            self._pending_cond.notify()
+
+    def _dispatch(self):
+        while True:
+            with self._pending_cond:
+                while not self._pending:
+                    self._pending_cond.wait()
+                _, event = self._pending.popitem(last=False)
+            for callback in list(self._subscribers):
+                try:
+                    callback(event)
+                except Exception as e:
+                    print(f"[BT] Device event callback failed: {e}")
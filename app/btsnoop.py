@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+btsnoop.py - Replays LE advertising reports from btsnoop captures (btmon -w) as a scan source
+"""
+
+import collections
+import mmap
+import struct
+import threading
+import time
+
+from hci import EVT_LE_META_EVENT, HCI_EVENT_PKT, parse_le_meta_event
+
+BTSNOOP_MAGIC = b"btsnoop\0"
+BTSNOOP_VERSION = 1
+
+# Datalink types: what each record's bytes start with
+DATALINK_HCI = 1001      # HCI packet without the type byte; flags say command/event
+DATALINK_H4 = 1002       # UART H4: HCI packet with its type byte
+DATALINK_MONITOR = 2001  # Linux monitor (btmon): flags carry adapter index << 16 | opcode
+
+MONITOR_EVENT_PKT = 0x03
+
+# magic, version, datalink
+_FILE_HEADER = struct.Struct(">8sII")
+# original length, included length, flags, cumulative drops, timestamp (microseconds)
+_RECORD_HEADER = struct.Struct(">IIIIq")
+# btsnoop timestamps count microseconds from 0 AD; BlueZ writes them as
+# microseconds since 2000 plus this offset
+_EPOCH_2000 = 0x00E03AB44A676000
+_UNIX_2000 = 946684800
+
+# Original-timing replay sleeps in chunks no longer than this, to notice the stop event (seconds)
+STOP_POLL = 0.02
+
+CaptureEvent = collections.namedtuple("CaptureEvent", ["timestamp", "index", "event"])
+
+class CaptureError(ValueError):
+    pass
+
+def _unix_time(ts_us: int) -> float:
+    return (ts_us - _EPOCH_2000) / 1e6 + _UNIX_2000
+
+# ----------------------------------------------------------------------
+# Capture Reader
+# ----------------------------------------------------------------------
+class BtsnoopReader:
+    """
+    Memory-maps a btsnoop capture and walks its records in place. Only HCI
+    LE Meta events are handed out, as memoryviews into the map without the
+    packet type byte, so nothing else in the capture is copied or parsed.
+    A record cut short at the end of the file (a capture still being
+    written) ends the walk.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "rb")
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise CaptureError(f"{path} is empty")
+        self._view = memoryview(self._map)
+        if len(self._map) < _FILE_HEADER.size:
+            self.close()
+            raise CaptureError(f"{path} is too short to be a btsnoop file")
+        magic, version, self.datalink = _FILE_HEADER.unpack_from(self._map, 0)
+        if magic != BTSNOOP_MAGIC or version != BTSNOOP_VERSION:
+            self.close()
+            raise CaptureError(f"{path} is not a btsnoop v1 file")
+        if self.datalink not in (DATALINK_HCI, DATALINK_H4, DATALINK_MONITOR):
+            self.close()
+            raise CaptureError(f"{path}: unsupported datalink {self.datalink}")
+        self.records = 0
+
+    def events(self, index=None):
+        """
+        Yields a CaptureEvent (unix time, adapter index, event memoryview)
+        for every LE Meta event. `index` keeps one adapter of a monitor capture.
+        """
+        view = self._view
+        size = len(view)
+        unpack = _RECORD_HEADER.unpack_from
+        header = _RECORD_HEADER.size
+        datalink = self.datalink
+        pos = _FILE_HEADER.size
+        records = 0
+        try:
+            while pos + header <= size:
+                _, length, flags, drops, ts = unpack(view, pos)
+                start = pos + header
+                pos = start + length
+                if pos > size:
+                    break
+                records += 1
+
+                if datalink == DATALINK_MONITOR:
+                    if flags & 0xFFFF != MONITOR_EVENT_PKT:
+                        continue
+                    adapter = flags >> 16
+                    if index is not None and adapter != index:
+                        continue
+                elif datalink == DATALINK_H4:
+                    if length < 1 or view[start] != HCI_EVENT_PKT:
+                        continue
+                    start += 1
+                    adapter = 0
+                else:
+                    # Bit 1 set: command or event; bit 0 set: received (so an event)
+                    if flags & 0x03 != 0x03:
+                        continue
+                    adapter = 0
+
+                if pos - start < 4 or view[start] != EVT_LE_META_EVENT:
+                    continue
+                yield CaptureEvent(_unix_time(ts), adapter, view[start:pos])
+        finally:
+            self.records = records
+
+    def close(self):
+        try:
+            self._view.release()
+        except (AttributeError, BufferError):
+            pass
+        try:
+            self._map.close()
+        except (AttributeError, BufferError):
+            pass
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+# ----------------------------------------------------------------------
+# Capture Source
+# ----------------------------------------------------------------------
+class CaptureSource:
+    """
+    Scan source for ScanManager and LocationSniffer that plays a btsnoop
+    capture instead of listening to a radio. With `speed` 1.0 reports arrive
+    at their recorded pace (2.0 twice as fast, and so on); with `speed`
+    None they are delivered as fast as they decode. Successive scan() calls
+    continue where the last one stopped; once the capture runs out, scans
+    stay quiet until their duration is up or `loop` restarts it.
+    """
+
+    def __init__(self, path, speed=None, index=None, loop=False):
+        self.path = path
+        self.speed = speed
+        self.index = index
+        self.loop = loop
+        self._reader = None
+        self._events = None
+        self._pending = []
+        self._capture_start = None
+        self._wall_start = None
+        self.finished = threading.Event()
+        self.events = 0
+        self.reports = 0
+        self.decode_s = 0.0
+
+    def _next_event(self):
+        if self._pending:
+            return self._pending.pop()
+        if self._events is None:
+            self._reader = BtsnoopReader(self.path)
+            self._events = self._reader.events(self.index)
+        try:
+            return next(self._events)
+        except StopIteration:
+            self._events = None
+            self._reader.close()
+            self._reader = None
+            if not self.loop or not self.events:
+                self.finished.set()
+                return None
+            self._capture_start = None
+            return self._next_event()
+
+    def scan(self, duration, on_advert, stop_event=None):
+        """Calls on_advert(Advertisement) for every report replayed within `duration` seconds"""
+        end = time.monotonic() + duration
+        while time.monotonic() < end and not (stop_event and stop_event.is_set()):
+            if self.finished.is_set():
+                wait = min(STOP_POLL, end - time.monotonic())
+                if stop_event is not None:
+                    stop_event.wait(max(0.0, wait))
+                else:
+                    time.sleep(max(0.0, wait))
+                continue
+
+            item = self._next_event()
+            if item is None:
+                continue
+            if self.speed:
+                if not self._wait_for(item.timestamp, end, stop_event):
+                    # Not due before this scan ends: keep it for the next one
+                    self._pending.append(item)
+                    break
+
+            t0 = time.perf_counter()
+            adverts = parse_le_meta_event(item.event)
+            self.decode_s += time.perf_counter() - t0
+            self.events += 1
+            self.reports += len(adverts)
+            for advert in adverts:
+                on_advert(advert)
+
+    def _wait_for(self, timestamp, end, stop_event) -> bool:
+        """Sleeps until a recorded timestamp is due; False if the scan ends first"""
+        now = time.monotonic()
+        if self._capture_start is None:
+            self._capture_start = timestamp
+            self._wall_start = now
+        due = self._wall_start + (timestamp - self._capture_start) / self.speed
+        while now < due:
+            if now >= end or (stop_event and stop_event.is_set()):
+                return False
+            delay = min(due - now, end - now, STOP_POLL)
+            if stop_event is not None:
+                stop_event.wait(delay)
+            else:
+                time.sleep(delay)
+            now = time.monotonic()
+        return True
+
+    def close(self):
+        if self._reader is not None:
+            self._events = None
+            self._reader.close()
+            self._reader = None
+
+    def stats(self) -> dict:
+        return {
+            "events": self.events,
+            "reports": self.reports,
+            "decode_s": self.decode_s,
+            "reports_per_s": self.reports / self.decode_s if self.decode_s else 0.0,
+        }
@@ -4,6 +4,7 @@ connect.py - Performs the logic in droid connections
 """
 
 import asyncio
+import collections
 import os
 import random
 import re
@@ -14,11 +15,149 @@ import time
 from bleak import BleakClient, BleakScanner
 from dicts import CHARACTERISTICS, COMMANDS, AUDIO_GROUPS
 
+# Lag probe period on the BLE loop and the lag above which the loop counts as blocked (seconds)
+LAG_INTERVAL = 0.25
+SLOW_CALLBACK = 0.05
+# Lag samples and per-command timings kept for stats()
+LAG_WINDOW = 240
+COMMAND_WINDOW = 500
+
+# queued_s: submit to start on the loop; run_s: start to finish; ok: no error and no failed write
+CommandTiming = collections.namedtuple("CommandTiming", ["command", "queued_s", "run_s", "ok"])
+
+# ----------------------------------------------------------------------
+# BLE Event Loop
+# ----------------------------------------------------------------------
+class BleLoop:
+    """
+    The one asyncio loop every droid connection and command runs on, on its
+    own thread for the life of the app. submit() returns the command's
+    concurrent.futures.Future with `command` and, once done, `timing` (a
+    CommandTiming) attached; failures are logged instead of vanishing with
+    the future. A probe wakes every LAG_INTERVAL and records how late it
+    woke, flagging anything that held the loop longer than SLOW_CALLBACK.
+    BT_LOOP_DEBUG=1 also turns on asyncio debug mode, which names the
+    callbacks that ran that long.
+    """
+
+    def __init__(self, name="BleLoop"):
+        self.loop = asyncio.new_event_loop()
+        if os.environ.get("BT_LOOP_DEBUG"):
+            self.loop.set_debug(True)
+            self.loop.slow_callback_duration = SLOW_CALLBACK
+        self._lock = threading.Lock()
+        self._timings = {}
+        self._counts = {}
+        self._lag = collections.deque(maxlen=LAG_WINDOW)
+        self.max_lag = 0.0
+        self.slow_callbacks = 0
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.create_task(self._monitor_lag())
+        self.loop.run_forever()
+
+    async def _monitor_lag(self):
+        while True:
+            start = self.loop.time()
+            await asyncio.sleep(LAG_INTERVAL)
+            lag = max(0.0, self.loop.time() - start - LAG_INTERVAL)
+            self._lag.append(lag)
+            self.max_lag = max(self.max_lag, lag)
+            if lag > SLOW_CALLBACK:
+                self.slow_callbacks += 1
+                print(f"[BLE] Event loop blocked for {lag * 1000:.0f} ms")
+
+    def submit(self, command, coro):
+        """Runs a coroutine on the loop; returns its Future with timing attached when done"""
+        submitted = time.perf_counter()
+        marks = []
+
+        async def timed():
+            marks.append(time.perf_counter())
+            try:
+                return await coro
+            finally:
+                marks.append(time.perf_counter())
+
+        future = asyncio.run_coroutine_threadsafe(timed(), self.loop)
+        future.command = command
+        future.timing = None
+        future.add_done_callback(lambda f: self._finished(f, submitted, marks))
+        return future
+
+    def _finished(self, future, submitted, marks):
+        if future.cancelled():
+            ok = False
+        elif future.exception() is not None:
+            ok = False
+            print(f"[BLE] {future.command} failed: {future.exception()}")
+        else:
+            ok = future.result() is not False
+        started = marks[0] if marks else submitted
+        finished = marks[1] if len(marks) > 1 else started
+        future.timing = CommandTiming(future.command, started - submitted, finished - started, ok)
+        self.record(future.timing)
+
+    def record(self, timing):
+        with self._lock:
+            self._timings.setdefault(timing.command, collections.deque(maxlen=COMMAND_WINDOW)).append(timing)
+            count = self._counts.setdefault(timing.command, [0, 0])
+            count[0] += 1
+            if not timing.ok:
+                count[1] += 1
+
+    def stats(self) -> dict:
+        """Per-command counts, failures and latency (ms) over the recent window, plus loop lag"""
+        commands = {}
+        with self._lock:
+            for command, timings in self._timings.items():
+                total = sorted(t.queued_s + t.run_s for t in timings)
+                commands[command] = {
+                    "count": self._counts[command][0],
+                    "failed": self._counts[command][1],
+                    "queued_ms": sum(t.queued_s for t in timings) / len(timings) * 1000,
+                    "mean_ms": sum(total) / len(total) * 1000,
+                    "p95_ms": total[min(len(total) - 1, int(len(total) * 0.95))] * 1000,
+                }
+        lag = list(self._lag)
+        return {
+            "commands": commands,
+            "lag_mean_ms": sum(lag) / len(lag) * 1000 if lag else 0.0,
+            "lag_max_ms": self.max_lag * 1000,
+            "slow_callbacks": self.slow_callbacks,
+        }
+
+    def close(self, timeout=2.0):
+        """Cancels whatever is still running on the loop and stops its thread"""
+        async def shutdown():
+            tasks = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        if self.loop.is_closed():
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(shutdown(), self.loop).result(timeout)
+        except Exception:
+            pass
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout)
+        if not self._thread.is_alive():
+            self.loop.close()
+
 # ----------------------------------------------------------------------
 # Droid Connection (Low Level)
 # ----------------------------------------------------------------------
 class DroidConnection:
-    def __init__(self):
+    def __init__(self, adapter=None, client_factory=None):
+        # HCI adapter name (e.g. "hci1") for bleak; None uses the default controller
+        self.adapter = adapter
+        # Builds the client for a device; BleakClient unless a stand-in is given
+        self.client_factory = client_factory or BleakClient
         self.client = None
         self.loop = None
         self.lock = asyncio.Lock()
@@ -42,15 +181,18 @@ class DroidConnection:
                 print(f"[BLE ERROR] Failed to send: {e}")
                 return False
 
-    async def connect(self, mac: str, on_disconnect=None) -> bool:
-        print(f"[BLE] Attempting to find device: {mac}")
-        device = await BleakScanner.find_device_by_address(mac, timeout=5.0)
+    async def connect(self, mac: str, on_disconnect=None, device=None) -> bool:
+        adapter_kwargs = {"adapter": self.adapter} if self.adapter else {}
+        # A BLEDevice from a recent bleak scan saves another discovery
+        if device is None:
+            print(f"[BLE] Attempting to find device: {mac}")
+            device = await BleakScanner.find_device_by_address(mac, timeout=5.0, **adapter_kwargs)
         if not device:
             print(f"[BLE] Device {mac} not found in range.")
             return False
 
         # In Bleak 0.19.x, the callback is passed here
-        self.client = BleakClient(device, timeout=10.0, disconnected_callback=on_disconnect)
+        self.client = self.client_factory(device, timeout=10.0, disconnected_callback=on_disconnect, **adapter_kwargs)
         
         try:
             await self.client.connect()
@@ -92,15 +234,29 @@ class DroidConnection:
 # Connection Manager (High Level)
 # ----------------------------------------------------------------------
 class ConnectionManager:
-    def __init__(self):
-        self.conn = DroidConnection()
+    """
+    Drives droid connections on the app-wide BleLoop. Every command returns
+    the tracked Future from BleLoop.submit (None when there is no droid to
+    send to), so callers can wait on it and its timing lands in stats().
+    """
+
+    def __init__(self, adapter=None, ble_loop=None, client_factory=None):
+        self.ble = ble_loop or BleLoop()
+        self.conn = DroidConnection(adapter, client_factory)
+        self.conn.loop = self.ble.loop
         self.audio_in_progress = False
-        
+
         # New State Tracking
         self.is_connecting = False
         self.last_error = None
         self.active_mac = None
         self.active_name = None
+        # Optional callable(mac) -> BLEDevice, e.g. BleakScanSource.device
+        self.device_lookup = None
+        # RemoteControl whose state is reset when the droid drops
+        self.remote_control = None
+        self._session = None
+        self._session_stop = None
 
     @property
     def is_connected(self):
@@ -108,202 +264,239 @@ class ConnectionManager:
         return self.conn.is_connected if self.conn else False
 
     def connect_droid(self, mac, name):
-        """Initiates a background thread to handle the asynchronous Bleak connection process"""
+        """Starts the connection session on the BLE loop; returns its Future"""
         if self.is_connecting:
-            return
-        
+            return None
+
         self.is_connecting = True
         self.last_error = None
         self.active_mac = mac
         self.active_name = name
-        
-        threading.Thread(target=self._connect_thread, args=(mac, name), daemon=True).start()
 
-    def _connect_thread(self, mac, name):
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        self.conn.loop = loop 
-        
-        stop_event = asyncio.Event()
+        self._session = asyncio.run_coroutine_threadsafe(self._run_connection(mac, name), self.ble.loop)
+        return self._session
+
+    async def _run_connection(self, mac, name):
+        """Connects, then holds the session until the droid drops or disconnect_droid() is called"""
+        loop = asyncio.get_running_loop()
+        stop_event = self._session_stop = asyncio.Event()
 
         def handle_disconnect(_):
             print(f"[BLE] {name} disconnected. Resetting remote state.")
-            
+
             # Clean slate
             if self.remote_control:
                 self.remote_control.stop_all()
-            
+
             loop.call_soon_threadsafe(stop_event.set)
 
-        async def run_connection():
-            try:
-                # Pass the handler into our modified connect method
-                success = await asyncio.wait_for(self.conn.connect(mac, on_disconnect=handle_disconnect), timeout=15.0)
-                self.is_connecting = False
-                
-                if not success:
-                    self.last_error = f"Failed to connect to {name}"
-                    stop_event.set()
-                    return
+        start = time.perf_counter()
+        success = False
+        try:
+            # Pass the handler into our modified connect method
+            device = self.device_lookup(mac) if self.device_lookup else None
+            success = await asyncio.wait_for(
+                self.conn.connect(mac, on_disconnect=handle_disconnect, device=device), timeout=15.0
+            )
+            self.ble.record(CommandTiming("connect", 0.0, time.perf_counter() - start, success))
+            self.is_connecting = False
 
-                await stop_event.wait()
+            if not success:
+                self.last_error = f"Failed to connect to {name}"
+                return False
 
-            except Exception as e:
-                self.last_error = f"Connection Error: {str(e)}"
-                stop_event.set()
+            await stop_event.wait()
+            return True
 
-        try:
-            loop.run_until_complete(run_connection())
+        except Exception as e:
+            if not success:
+                self.ble.record(CommandTiming("connect", 0.0, time.perf_counter() - start, False))
+            self.last_error = f"Connection Error: {str(e)}"
+            return False
         finally:
             self.is_connecting = False
+            self._session_stop = None
             # Hard stop packets for safety if still physically connected
             if self.conn.client and self.conn.client.is_connected:
-                loop.run_until_complete(self._emergency_stop_packets())
-                loop.run_until_complete(self.conn.disconnect())
-            loop.close()
+                await self._emergency_stop_packets()
+                await self.conn.disconnect()
+
+    async def _emergency_stop_packets(self):
+        """Zero speed to every motor"""
+        # 27 00 05 44 [MotorID] 00 00 00 00
+        # Motor IDs: 0 = Left, 1 = Right, 2 = Head
+        ok = True
+        for motor_id in [0, 1, 2]:
+            packet = bytearray([0x27, 0x00, 0x05, 0x44, motor_id, 0x00, 0x00, 0x00])
+            ok = await self.conn._write(packet) and ok
+        return ok
+
+    def _submit(self, command, coro):
+        return self.ble.submit(command, coro)
+
+    def _write(self, command, packet):
+        return self.ble.submit(command, self.conn._write(bytearray(packet)))
 
     def run_action(self, label, category):
         """Parses UI button labels and categories to trigger corresponding Bluetooth commands"""
-        if not self.is_connected or not self.conn.loop:
-            print(f"[CONN] Action '{label}' ignored: No active loop/connection.")
-            return
+        if not self.is_connected:
+            print(f"[CONN] Action '{label}' ignored: No active connection.")
+            return None
 
         print(f"[CONN] Dispatching {category} action: {label}")
         if category == "Audio":
             if self.audio_in_progress:
-                return
+                return None
             match = re.match(r"G(\d+)C(\d+)", label)
             if match:
                 g, c = map(int, match.groups())
-                asyncio.run_coroutine_threadsafe(self._play_audio(g, c), self.conn.loop)
-        
+                return self.send_audio(g, c)
+
         elif category == "Scripts":
             match = re.search(r'\d+', label)
             if match:
-                script_id = int(match.group())
-                asyncio.run_coroutine_threadsafe(self.conn.run_script(script_id), self.conn.loop)
+                return self.run_script(int(match.group()))
+        return None
+
+    def send_audio(self, group, clip):
+        return self._submit("send_audio", self._play_audio(group, clip))
+
+    def run_script(self, script_id):
+        return self._submit("run_script", self.conn.run_script(script_id))
 
     async def _play_audio(self, group, clip):
         try:
             self.audio_in_progress = True
-            # The 'await' here allows the motor commands to 
+            # The 'await' here allows the motor commands to
             # slip in between the group set and the clip play
-            await self.conn.send_audio(group, clip)
-        except Exception as e:
-            print(f"Audio Task Error: {e}")
+            return await self.conn.send_audio(group, clip)
         finally:
             # Short cooldown to prevent command overlapping
             await asyncio.sleep(0.2)
             self.audio_in_progress = False
 
     def disconnect_droid(self):
-        """Thread-safe request to disconnect the droid and stop the background event loop"""
-        if self.is_connected and self.conn.loop and not self.conn.loop.is_closed():
-            asyncio.run_coroutine_threadsafe(self.conn.disconnect(), self.conn.loop)
-            self.conn.loop.call_soon_threadsafe(self.conn.loop.stop)
-        
+        """Thread-safe request to disconnect the droid; returns the disconnect Future, if any"""
+        future = None
+        if self.is_connected:
+            future = self._submit("disconnect", self.conn.disconnect())
+        stop_event = self._session_stop
+        if stop_event is not None:
+            self.ble.loop.call_soon_threadsafe(stop_event.set)
+
         self.is_connecting = False
         self.active_mac = None
         self.active_name = None
+        return future
+
+    def close(self):
+        """Disconnects and stops the BLE loop; call once on exit"""
+        future = self.disconnect_droid()
+        if future is not None:
+            try:
+                future.result(timeout=2.0)
+            except Exception:
+                pass
+        self.ble.close()
+
+    def stats(self) -> dict:
+        return self.ble.stats()
 
     def remote_throttle_left(self, speed: float):
-        self._send_motor_direct(0, speed) # Motor 0
+        return self._send_motor_direct(0, speed) # Motor 0
 
     def remote_throttle_right(self, speed: float):
-        self._send_motor_direct(1, speed) # Motor 1
+        return self._send_motor_direct(1, speed) # Motor 1
 
     def _send_motor_direct(self, motor_id, speed):
         if not self.is_connected:
-            return
+            return None
 
         mag = abs(speed)
         if mag < 0.05:
             # 27 00 05 44 [MotorID] 00 00 00 00
             packet = bytearray([0x27, 0x00, 0x05, 0x44, motor_id, 0x00, 0x00, 0x00])
-            asyncio.run_coroutine_threadsafe(self.conn._write(packet), self.conn.loop)
-            return
+            return self._write("motor", packet)
 
         # Direction: 0x0 for Fwd, 0x8 for Rev
         dir_nibble = 0x00 if speed > 0 else 0x80
         dm_byte = dir_nibble | motor_id
-        
+
         # SS = Speed (0x60 to 0xFF)
         byte_speed = int(0x60 + (mag * (0xFF - 0x60)))
-        
+
         # Format: 27 00 05 44 DM SS RR RR (RRRR = Ramp 0x012C)
         packet = bytearray([0x27, 0x00, 0x05, 0x44, dm_byte, byte_speed, 0x01, 0x2C])
-        asyncio.run_coroutine_threadsafe(self.conn._write(packet), self.conn.loop)
+        return self._write("motor", packet)
 
     def bb_drive(self, direction, speed):
+        if not self.is_connected:
+            return None
         packet = [0x2B, 0x42, 0x0F, 0x48, 0x44, 0x05]
         packet.append(direction)
         packet.append(speed)
         packet.extend([0x01, 0x90, 0x00, 0x00])
-        asyncio.run_coroutine_threadsafe(self.conn._write(packet), self.conn.loop)
+        return self._write("bb_drive", packet)
 
     def bb_rotate(self, direction, speed):
+        if not self.is_connected:
+            return None
         packet = [0x2B, 0x42, 0x0F, 0x48, 0x44, 0x04]
         packet.append(direction)
         packet.append(speed)
         packet.extend([0x00, 0x05, 0x00, 0x00])
-        asyncio.run_coroutine_threadsafe(self.conn._write(packet), self.conn.loop)
+        return self._write("bb_rotate", packet)
 
     def remote_head(self, value: float):
         if not self.is_connected:
-            return
+            return None
 
         mag = abs(value)
         if mag < 0.05:
             # 0x02 is Head Motor ID
             packet = bytearray([0x27, 0x00, 0x05, 0x44, 0x02, 0x00, 0x00, 0x00])
-            asyncio.run_coroutine_threadsafe(self.conn._write(packet), self.conn.loop)
-            return
+            return self._write("head", packet)
 
         # Use Command 0x0F Type 2 for Head (smoother R2 rotation)
         # Format: 2B 42 0F 48 44 02 XX YY AA AA BB BB
         # XX: 00=Right, FF=Left | YY: Speed | AA: Ramp | BB: Delay
         direction = 0x00 if value > 0 else 0xFF
         byte_speed = int(mag * 0xFF)
-        
+
         packet = bytearray([
-            0x2B, 0x42, 0x0F, 0x48, 0x44, 0x02, 
+            0x2B, 0x42, 0x0F, 0x48, 0x44, 0x02,
             direction, byte_speed, 0x00, 0x64, 0x00, 0x01
         ])
-        asyncio.run_coroutine_threadsafe(self.conn._write(packet), self.conn.loop)
+        return self._write("head", packet)
 
     def remote_sound_random(self):
         """Play a random sound clip (Groups 1–7, Clips 1–7)"""
         if not self.is_connected:
-            return
+            return None
 
         if self.audio_in_progress:
-            return
+            return None
 
         group = random.randint(1, 3)
         clip = random.randint(1, 3)
-        
-        asyncio.run_coroutine_threadsafe(self._play_audio(group, clip), self.conn.loop)
-        
+
+        return self.send_audio(group, clip)
+
     def remote_accessory(self):
         if not self.is_connected:
-            return
+            return None
 
         # Using the Audio Controller command (0x0F) to trigger accessory logic
         # Command 0x00 CC PP where CC is the command and PP is the parameter
         # Based on typical droid accessory behavior:
         # 27 42 0f 44 44 00 [CMD] [PARAM]
-        
-        # We send the "Trigger Accessory" signal. 
+
+        # We send the "Trigger Accessory" signal.
         # If hardware is present, it moves/sounds. If not, the droid ignores it.
         packet = bytearray([0x27, 0x42, 0x0F, 0x44, 0x44, 0x00, 0x10, 0x08])
-        asyncio.run_coroutine_threadsafe(self.conn._write(packet), self.conn.loop)
-        
+        return self._write("accessory", packet)
+
     def remote_stop(self):
         if not self.is_connected:
-            return
-
-        # 27 00 05 44 [MotorID] 00 00 00 00
-        # Motor IDs: 0 = Left, 1 = Right, 2 = Head
-        for motor_id in [0, 1, 2]:
-            packet = bytearray([0x27, 0x00, 0x05, 0x44, motor_id, 0x00, 0x00, 0x00])
-            asyncio.run_coroutine_threadsafe(self.conn._write(packet), self.conn.loop)
+            return None
+        return self._submit("remote_stop", self._emergency_stop_packets())
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+decoder.py - Decodes droid and location beacons from raw manufacturer data bytes
+"""
+
+import collections
+
+from dicts import BEACON_PROTOCOL, BEACON_TYPE, FACTIONS, DROIDS, LOCATIONS, RSSI_THRESHOLD
+
+# Manufacturer data (without the company ID) is [type, length, 4 bytes of fields]
+PAYLOAD_LEN = 6
+_DROID_MARKER = bytes([BEACON_TYPE["DROID"], BEACON_PROTOCOL["DATA_LEN"]])
+_LOCATION_MARKER = bytes([BEACON_TYPE["LOCATION"], BEACON_PROTOCOL["DATA_LEN"]])
+
+DroidInfo = collections.namedtuple("DroidInfo", ["faction", "personality_id", "name", "paired", "identity"])
+LocationInfo = collections.namedtuple(
+    "LocationInfo", ["location_id", "name", "audio_group", "cooldown_s", "rssi_threshold", "active"]
+)
+
+# ----------------------------------------------------------------------
+# Lookup tables, built once from dicts.py
+# ----------------------------------------------------------------------
+def _build_droid_table():
+    """
+    DroidInfo for every (paired, affiliation byte, personality byte), indexed
+    as paired << 16 | aff << 8 | personality. Affiliations that don't map to
+    a faction stay None.
+    """
+    factions_by_id = {f_id: name for name, f_id in FACTIONS.items()}
+    table = [None] * (2 << 16)
+    for aff in range(256):
+        faction = factions_by_id.get((aff - 0x80) // 2)
+        if faction is None:
+            continue
+        # Some personality IDs are listed twice; the first entry wins, as it always has
+        names = {}
+        for d in DROIDS.get(faction, {}).values():
+            names.setdefault(d["id"], d["name"])
+        for p_id in range(256):
+            name = names.get(p_id)
+            identity = f"{name} ({faction})" if name else f"Unknown ID:{hex(p_id)} ({faction})"
+            for paired in (0, 1):
+                table[paired << 16 | aff << 8 | p_id] = DroidInfo(faction, p_id, name, bool(paired), identity)
+    return table
+
+_DROID_TABLE = _build_droid_table()
+_LOCATION_TABLE = [LOCATIONS.get(i) for i in range(256)]
+_THRESHOLD_NAMES = {v: k for k, v in RSSI_THRESHOLD.items()}
+
+def _signed(byte):
+    return byte - 256 if byte > 127 else byte
+
+def _droid(payload, offset):
+    status, aff, p_id = payload[offset + 3], payload[offset + 4], payload[offset + 5]
+    return _DROID_TABLE[(status >> 7) << 16 | aff << 8 | p_id]
+
+def _location(payload, offset):
+    loc_id = payload[offset + 2]
+    cooldown, threshold, active = payload[offset + 3], payload[offset + 4], payload[offset + 5]
+    entry = _LOCATION_TABLE[loc_id]
+    return LocationInfo(
+        loc_id,
+        entry[1] if entry else None,
+        entry[0] if entry else None,
+        cooldown * 5,
+        _signed(threshold),
+        active == BEACON_PROTOCOL["ACTIVE_FLAG"],
+    )
+
+# ----------------------------------------------------------------------
+# Public API
+# ----------------------------------------------------------------------
+def decode(data):
+    """
+    Returns a DroidInfo or LocationInfo for one manufacturer data payload, or
+    None if it isn't a beacon this toolbox understands. Payloads normally
+    start with the beacon type; anything else is searched for one.
+    """
+    if len(data) >= PAYLOAD_LEN and data[1] == BEACON_PROTOCOL["DATA_LEN"]:
+        kind = data[0]
+        if kind == BEACON_TYPE["DROID"]:
+            return _droid(data, 0)
+        if kind == BEACON_TYPE["LOCATION"]:
+            return _location(data, 0)
+
+    data = bytes(data)
+    offset = data.find(_DROID_MARKER)
+    if 0 <= offset <= len(data) - PAYLOAD_LEN:
+        return _droid(data, offset)
+    offset = data.find(_LOCATION_MARKER)
+    if 0 <= offset <= len(data) - PAYLOAD_LEN:
+        return _location(data, offset)
+    return None
+
+def identify(data):
+    """Returns "Name (Faction)" for a droid beacon payload, None for anything else"""
+    # Same fast path as decode(), without building a LocationInfo only to drop it
+    if len(data) >= PAYLOAD_LEN and data[1] == BEACON_PROTOCOL["DATA_LEN"]:
+        kind = data[0]
+        if kind == BEACON_TYPE["DROID"]:
+            info = _DROID_TABLE[(data[3] >> 7) << 16 | data[4] << 8 | data[5]]
+            return info.identity if info else None
+        if kind == BEACON_TYPE["LOCATION"]:
+            return None
+    info = decode(data)
+    return info.identity if isinstance(info, DroidInfo) else None
+
+def threshold_name(rssi_threshold: int):
+    """RSSI_THRESHOLD key for a location beacon's threshold in dBm, if it is a standard one"""
+    return _THRESHOLD_NAMES.get(rssi_threshold & 0xFF)
+
+def decode_batch(payloads) -> list:
+    """
+    decode() for many payloads at once. Well-formed droid beacons, by far the
+    common case, are looked up inline without a call per payload; the rest go
+    through decode().
+    """
+    droid, data_len, table = BEACON_TYPE["DROID"], BEACON_PROTOCOL["DATA_LEN"], _DROID_TABLE
+    results = []
+    append = results.append
+    for p in payloads:
+        if len(p) >= PAYLOAD_LEN and p[0] == droid and p[1] == data_len:
+            append(table[(p[3] >> 7) << 16 | p[4] << 8 | p[5]])
+        else:
+            append(decode(p))
+    return results
+
+def identify_batch(payloads) -> list:
+    """identify() for many payloads at once, resolving well-formed beacons inline"""
+    droid, location = BEACON_TYPE["DROID"], BEACON_TYPE["LOCATION"]
+    data_len, table = BEACON_PROTOCOL["DATA_LEN"], _DROID_TABLE
+    results = []
+    append = results.append
+    for p in payloads:
+        if len(p) >= PAYLOAD_LEN and p[1] == data_len:
+            kind = p[0]
+            if kind == droid:
+                info = table[(p[3] >> 7) << 16 | p[4] << 8 | p[5]]
+                append(info.identity if info else None)
+                continue
+            if kind == location:
+                append(None)
+                continue
+        append(identify(p))
+    return results
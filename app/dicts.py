@@ -29,6 +29,18 @@ RSSI_THRESHOLD = {
     "MAX":  0x8C,    # (-116 dBm): Maximum range before drop-off
 }
 
+# Advertising interval (milliseconds) and TX power (dBm) presets for beacons
+# - The kernel default interval is 1.28 s, slow enough that droids in a busy room miss beacons
+# - Shorter intervals and higher power make droids react sooner at the cost of battery
+# - FAST is opt-in: 20 ms is below the 100 ms minimum many controllers enforce for
+#   non-connectable legacy advertising, so they may reject or clamp it
+ADVERTISING_PRESETS = {
+    "FAST":      {"min_interval": 20,  "max_interval": 30,   "tx_power": 7},
+    "BALANCED":  {"min_interval": 100, "max_interval": 150,  "tx_power": 0},
+    "LOW_POWER": {"min_interval": 500, "max_interval": 1000, "tx_power": -10},
+}
+DEFAULT_ADVERTISING_PRESET = "BALANCED"
+
 # LOCATION BEACONS
 # - Droids that react to a location beacon will not sleep for 6 hours
 # - The first element in each tuple tells the droid which audio group to play from
@@ -198,6 +210,7 @@ UI_STRINGS = {
     "MAIN_FOOTER": "Choose an option",
     "MAIN_SCAN": "Scan for droids",
     "MAIN_BEACON": "Emit a beacon",
+    "MAIN_SNIFF": "Find location beacons",
     "MAIN_CONNECT": "Connect to a droid",
     "MAIN_OPTIONS": "Settings",
     "MAIN_EXIT": "Quit Application",
@@ -209,8 +222,22 @@ UI_STRINGS = {
     
     "SCAN_HEADER": "--- DROID SCANNER ---",
     "SCAN_MSG": "Scanning for Droids...",
+    "SCAN_LIVE": "Scanning... {count} found, first in {first:.1f}s",
     "SCAN_NONE": "No Droids found",
     "SCAN_PROMPT": "Select a Droid",
+    "SCAN_DONE": "Select a Droid ({duration:.1f}s, {reason})",
+    "SCAN_TRACKING": "Tracking {count} droids nearby",
+    "SCAN_STALE": "(cached)",
+
+    "RADAR_HEADER": "--- DROID RADAR ---",
+    "RADAR_EMPTY": "Listening for droids...",
+    "RADAR_SELECTED": "{name} ({mac}) {rssi} dBm",
+    "RADAR_LEGEND": "{faction}: {count}",
+
+    "SNIFF_HEADER": "--- LOCATION SNIFFER ---",
+    "SNIFF_LISTENING": "Listening for location beacons...",
+    "SNIFF_NEAREST": "Nearest: {name} ({rssi} dBm)",
+    "SNIFF_ITEM": "{name} [{state}] {rssi} dBm, cooldown {cooldown}s",
     
     "FAVORITES_HEADER": "--- FAVORITE DROIDS ---",
     "FAVORITES_EMPTY": "No droids saved yet",
@@ -221,7 +248,10 @@ UI_STRINGS = {
     "BEACON_HEADER_MAIN": "--- DROID BEACON CONTROL ---",
     "BEACON_HEADER_LOCATIONS": "--- LOCATION BEACONS ---",
     "BEACON_HEADER_DROIDS": "--- {faction} DROIDS ---",
+    "BEACON_HEADER_PLAYLISTS": "--- BEACON PLAYLISTS ---",
+    "BEACON_PLAYLISTS_EMPTY": "No playlists in playlists/",
     "BEACON_FOOTER": "Active: {status}",
+    "BEACON_FOOTER_TUNED": "Active: {status} | {interval}",
     
     "CONN_CONNECTING": "Connecting to {name}...",
     "CONN_FAILED": "Failed to connect",
@@ -254,10 +284,22 @@ UI_BUTTONS = {
     "STOP":   {"label": "Stop",         "btn": "X",  "color_ref": "x"},
     "DELETE": {"label": "Delete",       "btn": "X",  "color_ref": "x"},
     "FAV":    {"label": "Favorite",     "btn": "Y",  "color_ref": "y"},
+    "ADD":    {"label": "Add",          "btn": "Y",  "color_ref": "y"},
     "EXIT":   {"label": "Exit",         "btn": "B",  "color_ref": "b"},
     "SCAN":   {"label": "Scan",         "btn": "X",  "color_ref": "x"},
     "SOUND":  {"label": "Play sound",   "btn": "A",  "color_ref": "a"},
     "ACC":    {"label": "Accessory",    "btn": "Y",  "color_ref": "y"},
+    "TRACK":  {"label": "Track",        "btn": "START", "color_ref": "s", "glyph": "+"}, # glyph: shown instead of btn when it won't fit the circle
+    "RADAR":  {"label": "Radar",        "btn": "SELECT", "color_ref": "s", "glyph": "-"},
+}
+
+# RADAR BLIP COLORS
+# Blips are colored by the faction in the droid's beacon; None is for droids that haven't been identified
+RADAR_COLORS = {
+    "Scoundrel":   (211, 185, 72),
+    "Resistance":  (230, 90, 40),
+    "First Order": (200, 30, 30),
+    None:          (150, 150, 150),
 }
 
 # COLOR THEMES
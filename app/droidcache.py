@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+droidcache.py - Compact on-disk cache of every droid the toolbox has identified
+"""
+
+import mmap
+import os
+import struct
+import threading
+import time
+
+from decoder import identify
+from options import resource_path
+
+CACHE_MAGIC = b"DTKD"
+CACHE_VERSION = 1
+
+# magic, version, record count
+_HEADER = struct.Struct("<4sBI")
+# MAC, manufacturer data payload, last RSSI, last seen (unix seconds)
+_RECORD = struct.Struct("<6s6sbI")
+PAYLOAD_LEN = 6
+
+# Oldest records are dropped beyond this many droids
+MAX_RECORDS = 4096
+# Cached droids older than this aren't offered as likely nearby (seconds)
+STALE_AFTER = 7 * 24 * 3600
+
+def _mac_bytes(mac: str) -> bytes:
+    return bytes.fromhex(mac.replace(":", ""))
+
+def _mac_str(raw: bytes) -> str:
+    return ":".join(f"{b:02X}" for b in raw)
+
+# ----------------------------------------------------------------------
+# Known Droid Cache
+# ----------------------------------------------------------------------
+class KnownDroidCache:
+    """
+    Fixed-size binary records (17 bytes per droid) in known_droids.bin next to
+    settings.json. The raw beacon payload is stored rather than the identity
+    text; decoder.py turns it back into "Name (Faction)" with a table lookup.
+    Nothing is read at construction: the file is memory-mapped on first use.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or resource_path("known_droids.bin")
+        self._records = None
+        self._dirty = False
+        self._lock = threading.Lock()
+
+    def _read(self) -> dict:
+        records = {}
+        try:
+            with open(self.path, "rb") as f:
+                if os.fstat(f.fileno()).st_size < _HEADER.size:
+                    return records
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    magic, version, count = _HEADER.unpack_from(mm, 0)
+                    if magic != CACHE_MAGIC or version != CACHE_VERSION:
+                        print(f"[CACHE] Ignoring {self.path}: unknown format")
+                        return records
+                    # A truncated file keeps the records that are complete
+                    count = min(count, (len(mm) - _HEADER.size) // _RECORD.size)
+                    for mac, payload, rssi, last_seen in _RECORD.iter_unpack(
+                        mm[_HEADER.size:_HEADER.size + count * _RECORD.size]
+                    ):
+                        records[_mac_str(mac)] = (payload, rssi, last_seen)
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, struct.error) as e:
+            print(f"[CACHE] Failed to read {self.path}: {e}")
+        return records
+
+    def _loaded(self) -> dict:
+        # Caller holds the lock
+        if self._records is None:
+            self._records = self._read()
+        return self._records
+
+    def update(self, mac: str, payload: bytes, rssi=None, last_seen=None):
+        """Remembers a decoded droid; written out by save()"""
+        payload = bytes(payload[:PAYLOAD_LEN]).ljust(PAYLOAD_LEN, b"\0")
+        rssi = max(-128, min(127, int(rssi))) if rssi is not None else -127
+        with self._lock:
+            self._loaded()[mac.upper()] = (payload, rssi, int(last_seen or time.time()))
+            self._dirty = True
+
+    def recent(self, max_age=STALE_AFTER) -> list:
+        """(mac, identity, rssi, last_seen) for droids seen within max_age, strongest first"""
+        cutoff = time.time() - max_age
+        with self._lock:
+            records = list(self._loaded().items())
+        found = []
+        for mac, (payload, rssi, last_seen) in records:
+            if last_seen < cutoff:
+                continue
+            identity = identify(payload)
+            if identity:
+                found.append((mac, identity, rssi, last_seen))
+        found.sort(key=lambda r: -r[2])
+        return found
+
+    def save(self):
+        """Writes the cache atomically if anything changed"""
+        with self._lock:
+            if not self._dirty:
+                return
+            records = sorted(self._records.items(), key=lambda r: -r[1][2])[:MAX_RECORDS]
+            self._dirty = False
+
+        tmp_path = self.path + ".tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(_HEADER.pack(CACHE_MAGIC, CACHE_VERSION, len(records)))
+                f.write(b"".join(
+                    _RECORD.pack(_mac_bytes(mac), payload, rssi, last_seen)
+                    for mac, (payload, rssi, last_seen) in records
+                ))
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"[CACHE] Failed to write {self.path}: {e}")
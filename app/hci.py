@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+hci.py - Raw HCI socket scanner that decodes LE advertising reports directly
+"""
+
+import collections
+import select
+import socket
+import struct
+import time
+
+# Linux HCI socket constants (not every Python build exposes them)
+AF_BLUETOOTH = getattr(socket, "AF_BLUETOOTH", 31)
+BTPROTO_HCI = getattr(socket, "BTPROTO_HCI", 1)
+SOL_HCI = getattr(socket, "SOL_HCI", 0)
+HCI_FILTER = getattr(socket, "HCI_FILTER", 2)
+
+HCI_EVENT_PKT = 0x04
+EVT_LE_META_EVENT = 0x3E
+LE_ADVERTISING_REPORT = 0x02
+LE_EXT_ADVERTISING_REPORT = 0x0D
+
+AD_SHORT_NAME = 0x08
+AD_COMPLETE_NAME = 0x09
+AD_MANUFACTURER_DATA = 0xFF
+
+# Largest HCI event (1 byte packet type + 2 byte header + 255 byte payload)
+HCI_MAX_EVENT_SIZE = 260
+# Events drained per wakeup into the preallocated receive buffer
+BATCH_SLOTS = 64
+# Longest a scan waits before noticing its stop event (seconds)
+STOP_POLL = 0.02
+
+Advertisement = collections.namedtuple("Advertisement", ["mac", "name", "manufacturer_data", "rssi"])
+
+def _mac(raw) -> str:
+    """HCI carries addresses little-endian"""
+    return bytes(raw[::-1]).hex(":").upper()
+
+def parse_ad_structures(data):
+    """Returns (name, {company_id: bytes}) from an advertising data block"""
+    name = None
+    manufacturer = {}
+    i = 0
+    end = len(data)
+    while i < end:
+        length = data[i]
+        if length == 0 or i + 1 + length > end:
+            break
+        ad_type = data[i + 1]
+        value = data[i + 2:i + 1 + length]
+        if ad_type == AD_MANUFACTURER_DATA and len(value) >= 2:
+            manufacturer[value[0] | (value[1] << 8)] = bytes(value[2:])
+        elif ad_type in (AD_COMPLETE_NAME, AD_SHORT_NAME):
+            name = bytes(value).decode("utf-8", "replace")
+        i += 1 + length
+    return name, manufacturer
+
+def parse_event(packet) -> list:
+    """Decodes one HCI event packet (starting with the 0x04 type byte) into Advertisements"""
+    if len(packet) < 5 or packet[0] != HCI_EVENT_PKT:
+        return []
+    return parse_le_meta_event(packet[1:])
+
+def parse_le_meta_event(event) -> list:
+    """Decodes an HCI event without the packet type byte (as btsnoop stores it) into Advertisements"""
+    if len(event) < 4 or event[0] != EVT_LE_META_EVENT:
+        return []
+
+    subevent = event[2]
+    count = event[3]
+    pos = 4
+    reports = []
+    try:
+        if subevent == LE_ADVERTISING_REPORT:
+            for _ in range(count):
+                addr = event[pos + 2:pos + 8]
+                data_len = event[pos + 8]
+                data = event[pos + 9:pos + 9 + data_len]
+                rssi = struct.unpack_from("b", event, pos + 9 + data_len)[0]
+                name, manufacturer = parse_ad_structures(data)
+                reports.append(Advertisement(_mac(addr), name, manufacturer, rssi))
+                pos += 10 + data_len
+        elif subevent == LE_EXT_ADVERTISING_REPORT:
+            for _ in range(count):
+                addr = event[pos + 3:pos + 9]
+                rssi = struct.unpack_from("b", event, pos + 13)[0]
+                data_len = event[pos + 23]
+                data = event[pos + 24:pos + 24 + data_len]
+                name, manufacturer = parse_ad_structures(data)
+                reports.append(Advertisement(_mac(addr), name, manufacturer, rssi))
+                pos += 24 + data_len
+    except (IndexError, struct.error):
+        # Truncated report: keep what decoded cleanly
+        pass
+    return reports
+
+# ----------------------------------------------------------------------
+# HCI Scanner
+# ----------------------------------------------------------------------
+class HciScanner:
+    """
+    Listens on a raw HCI socket for LE advertising reports. BlueZ still owns
+    the controller, so discovery is switched on through the regular Bluetooth
+    controller and this socket only observes the events it produces.
+    """
+
+    def __init__(self, dev_id=0, controller=None, sock=None):
+        self.dev_id = dev_id
+        self.controller = controller
+        self._sock = sock
+        self._owns_sock = sock is None
+        self._buf = bytearray(HCI_MAX_EVENT_SIZE * BATCH_SLOTS)
+        self._view = memoryview(self._buf)
+        self.events = 0
+        self.reports = 0
+
+    def _open(self):
+        sock = socket.socket(AF_BLUETOOTH, socket.SOCK_RAW, BTPROTO_HCI)
+        # struct hci_filter: type_mask, event_mask[2], opcode
+        event_mask = [0, 0]
+        event_mask[EVT_LE_META_EVENT >> 5] |= 1 << (EVT_LE_META_EVENT & 31)
+        sock.setsockopt(SOL_HCI, HCI_FILTER,
+                        struct.pack("<IIIH", 1 << HCI_EVENT_PKT, event_mask[0], event_mask[1], 0))
+        sock.bind((self.dev_id,))
+        return sock
+
+    def read_batch(self, timeout: float) -> list:
+        """Waits up to `timeout` for events, then drains everything queued on the socket"""
+        r, _, _ = select.select([self._sock], [], [], timeout)
+        if not r:
+            return []
+
+        sizes = []
+        offset = 0
+        while len(sizes) < BATCH_SLOTS:
+            try:
+                n = self._sock.recv_into(self._view[offset:offset + HCI_MAX_EVENT_SIZE], 0, socket.MSG_DONTWAIT)
+            except BlockingIOError:
+                break
+            if n == 0:
+                break
+            sizes.append((offset, n))
+            offset += HCI_MAX_EVENT_SIZE
+
+        adverts = []
+        for start, n in sizes:
+            adverts.extend(parse_event(self._view[start:start + n]))
+        self.events += len(sizes)
+        self.reports += len(adverts)
+        return adverts
+
+    def scan(self, duration, on_advert, stop_event=None):
+        """Calls on_advert(Advertisement) for every report seen within `duration` seconds"""
+        if self._sock is None:
+            self._sock = self._open()
+        if self.controller:
+            self.controller.start_scanning()
+        try:
+            end = time.monotonic() + duration
+            while True:
+                remaining = end - time.monotonic()
+                if remaining <= 0 or (stop_event and stop_event.is_set()):
+                    break
+                for advert in self.read_batch(min(remaining, STOP_POLL)):
+                    on_advert(advert)
+        finally:
+            if self.controller:
+                self.controller.stop_scanning()
+            if self._owns_sock:
+                self._sock.close()
+                self._sock = None
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+presence.py - Live droid presence table with smoothed RSSI and TTL eviction
+"""
+
+import bisect
+import collections
+import threading
+import time
+
+# Seconds without a sighting before a droid drops off the table
+PRESENCE_TTL = 30.0
+# Weight of the newest RSSI sample in the exponential moving average
+RSSI_ALPHA = 0.3
+# Minimum seconds between snapshots handed to readers
+PUBLISH_INTERVAL = 0.1
+
+class _Entry:
+    __slots__ = ("mac", "info", "rssi", "last_rssi", "first_seen", "last_seen", "sightings", "key")
+
+# ----------------------------------------------------------------------
+# Presence Tracker
+# ----------------------------------------------------------------------
+class PresenceTracker:
+    """
+    Keeps one entry per droid, ordered nearest first. The ordering is kept
+    sorted as sightings arrive (only entries whose smoothed RSSI moved to a
+    different whole dBm are repositioned), and readers get an immutable
+    snapshot that is swapped in at most every PUBLISH_INTERVAL, so they never
+    wait on the writers' lock.
+    """
+
+    def __init__(self, ttl=PRESENCE_TTL, alpha=RSSI_ALPHA, publish_interval=PUBLISH_INTERVAL):
+        self.ttl = ttl
+        self.alpha = alpha
+        self.publish_interval = publish_interval
+        self._entries = {}
+        self._by_last_seen = collections.OrderedDict()
+        self._order = []
+        self._lock = threading.Lock()
+        self._snapshot = ()
+        self._published_at = 0.0
+        self._dirty = False
+        self.observations = 0
+        self.evicted = 0
+        self.publishes = 0
+
+    def observe(self, mac, rssi, info=None, now=None):
+        """
+        Records a sighting. `info` is a dict (identity, nickname and so on)
+        merged into the droid's snapshot row; it replaces any earlier one.
+        """
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            self.observations += 1
+            entry = self._entries.get(mac)
+            if entry is None:
+                entry = _Entry()
+                entry.mac = mac
+                entry.info = info or {}
+                entry.rssi = rssi
+                entry.last_rssi = rssi
+                entry.first_seen = now
+                entry.sightings = 0
+                entry.key = None
+                self._entries[mac] = entry
+            else:
+                if info:
+                    entry.info = info
+                if rssi is not None:
+                    entry.rssi = rssi if entry.rssi is None else self.alpha * rssi + (1 - self.alpha) * entry.rssi
+                    entry.last_rssi = rssi
+
+            entry.last_seen = now
+            entry.sightings += 1
+            self._by_last_seen[mac] = entry
+            self._by_last_seen.move_to_end(mac)
+            self._reposition(entry)
+            self._dirty = True
+
+            if now - self._published_at >= self.publish_interval:
+                self._evict(now)
+                self._publish(now)
+
+    def _reposition(self, entry):
+        # Unknown RSSI sorts last
+        key = (-round(entry.rssi) if entry.rssi is not None else 1000, entry.mac)
+        if key == entry.key:
+            return
+        if entry.key is not None:
+            del self._order[bisect.bisect_left(self._order, entry.key)]
+        bisect.insort(self._order, key)
+        entry.key = key
+
+    def _evict(self, now):
+        cutoff = now - self.ttl
+        while self._by_last_seen:
+            mac, entry = next(iter(self._by_last_seen.items()))
+            if entry.last_seen >= cutoff:
+                break
+            self._by_last_seen.popitem(last=False)
+            del self._entries[mac]
+            del self._order[bisect.bisect_left(self._order, entry.key)]
+            self.evicted += 1
+            self._dirty = True
+
+    def _publish(self, now):
+        if self._dirty:
+            entries = self._entries
+            self._snapshot = tuple(self._row(entries[mac], now) for _, mac in self._order)
+            self._dirty = False
+            self.publishes += 1
+        self._published_at = now
+
+    def _row(self, entry, now):
+        row = dict(entry.info)
+        row.update(
+            mac=entry.mac,
+            rssi=round(entry.rssi) if entry.rssi is not None else None,
+            last_rssi=entry.last_rssi,
+            first_seen=entry.first_seen,
+            last_seen=entry.last_seen,
+            age=now - entry.last_seen,
+            sightings=entry.sightings,
+        )
+        return row
+
+    def info(self, mac):
+        """The info dict stored for a droid, or None if it isn't in the table"""
+        entry = self._entries.get(mac)
+        return entry.info if entry else None
+
+    def snapshot(self) -> tuple:
+        """Rows ordered nearest first. Never blocks; expiry runs only if the lock is free."""
+        now = time.monotonic()
+        if now - self._published_at >= self.publish_interval and self._lock.acquire(blocking=False):
+            try:
+                self._evict(now)
+                self._publish(now)
+            finally:
+                self._lock.release()
+        return self._snapshot
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_last_seen.clear()
+            self._order.clear()
+            self._snapshot = ()
+            self._dirty = False
+
+    def stats(self) -> dict:
+        return {
+            "droids": len(self._entries),
+            "observations": self.observations,
+            "evicted": self.evicted,
+            "publishes": self.publishes,
+        }
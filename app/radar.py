@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+"""
+radar.py - Proximity radar of tracked droids, drawn with batched SDL calls
+"""
+
+import array
+import ctypes
+import math
+import zlib
+
+import sdl2
+
+from dicts import FACTIONS, RADAR_COLORS, RSSI_THRESHOLD
+
+# Smoothed RSSI at the centre and at the edge of the radar (dBm)
+RADAR_NEAR_RSSI = -35
+RADAR_FAR_RSSI = -100
+# Blip texture size and drawn blip diameter (pixels)
+BLIP_TEXTURE_SIZE = 32
+BLIP_SIZE = 12
+# Points per ring outline
+RING_SEGMENTS = 96
+# Blips fade to this opacity as they approach the presence TTL
+MIN_BLIP_ALPHA = 60
+
+# SDL_RenderGeometryRaw arrived in SDL 2.0.18
+HAS_GEOMETRY = sdl2.dll.version >= 2018
+
+# Texture coordinates of one blip quad, clockwise from the top left
+_QUAD_UV = array.array("f", (0, 0, 1, 0, 1, 1, 0, 1))
+
+def _signed(byte):
+    return byte - 256 if byte > 127 else byte
+
+def faction_of(identity):
+    """Faction named in an "Name (Faction)" identity, or None"""
+    if identity and identity.endswith(")"):
+        faction = identity[identity.rfind("(") + 1:-1]
+        if faction in FACTIONS:
+            return faction
+    return None
+
+# ----------------------------------------------------------------------
+# Radar View
+# ----------------------------------------------------------------------
+class RadarView:
+    """
+    Plots presence rows around a centre point: distance from the centre
+    follows smoothed RSSI, the bearing is fixed per MAC so blips only move
+    in and out. The rings are rendered once into a texture; every blip is a
+    textured quad in a single SDL_RenderGeometryRaw call, coloured by faction
+    through its vertex colours. Without RenderGeometry the blips fall back to
+    one SDL_RenderCopy each from the same pre-rendered texture.
+    """
+
+    def __init__(self, ui, center, radius):
+        self.ui = ui
+        self.center = center
+        self.radius = radius
+        self.use_geometry = HAS_GEOMETRY
+        self._blip = None
+        self._rings = None
+        self._rings_color = None
+        self._styles = {}
+        self._indices = array.array("i")
+        self.blips_drawn = 0
+
+    # ------------------------------------------------------------------
+    # Textures
+    # ------------------------------------------------------------------
+    def _blip_texture(self):
+        """A white anti-aliased disc; vertex colours / colour mod tint it per faction"""
+        if self._blip is not None:
+            return self._blip
+        size = BLIP_TEXTURE_SIZE
+        surface = sdl2.SDL_CreateRGBSurfaceWithFormat(0, size, size, 32, sdl2.SDL_PIXELFORMAT_RGBA32)
+        if not surface:
+            return None
+        pixels = bytearray(size * size * 4)
+        mid = (size - 1) / 2
+        edge = size / 2
+        for y in range(size):
+            for x in range(size):
+                d = math.hypot(x - mid, y - mid)
+                alpha = max(0.0, min(1.0, edge - d))
+                i = (y * size + x) * 4
+                pixels[i:i + 4] = bytes((255, 255, 255, int(alpha * 255)))
+        pitch = surface.contents.pitch
+        dst = surface.contents.pixels
+        for y in range(size):
+            ctypes.memmove(dst + y * pitch, bytes(pixels[y * size * 4:(y + 1) * size * 4]), size * 4)
+        self._blip = sdl2.SDL_CreateTextureFromSurface(self.ui.renderer, surface)
+        sdl2.SDL_FreeSurface(surface)
+        if self._blip:
+            sdl2.SDL_SetTextureBlendMode(self._blip, sdl2.SDL_BLENDMODE_BLEND)
+        return self._blip
+
+    def _ring_points(self, cx, cy, r):
+        points = (sdl2.SDL_FPoint * (RING_SEGMENTS + 1))()
+        for i in range(RING_SEGMENTS + 1):
+            a = 2 * math.pi * i / RING_SEGMENTS
+            points[i].x = cx + r * math.cos(a)
+            points[i].y = cy + r * math.sin(a)
+        return points
+
+    def _rings_texture(self):
+        """Range rings at the standard beacon RSSI thresholds, re-rendered when the theme changes"""
+        color = self.ui.c_row_bg
+        key = (color.r, color.g, color.b)
+        if self._rings is not None and self._rings_color == key:
+            return self._rings
+        self._destroy(self._rings)
+
+        size = self.radius * 2 + 1
+        renderer = self.ui.renderer
+        texture = sdl2.SDL_CreateTexture(
+            renderer, sdl2.SDL_PIXELFORMAT_RGBA8888, sdl2.SDL_TEXTUREACCESS_TARGET, size, size
+        )
+        if not texture:
+            return None
+        sdl2.SDL_SetTextureBlendMode(texture, sdl2.SDL_BLENDMODE_BLEND)
+        previous = sdl2.SDL_GetRenderTarget(renderer)
+        sdl2.SDL_SetRenderTarget(renderer, texture)
+        sdl2.SDL_SetRenderDrawColor(renderer, 0, 0, 0, 0)
+        sdl2.SDL_RenderClear(renderer)
+
+        r = self.radius
+        sdl2.SDL_SetRenderDrawColor(renderer, color.r // 2, color.g // 2, color.b // 2, 255)
+        sdl2.SDL_RenderDrawLine(renderer, 0, r, size - 1, r)
+        sdl2.SDL_RenderDrawLine(renderer, r, 0, r, size - 1)
+        sdl2.SDL_SetRenderDrawColor(renderer, color.r, color.g, color.b, 255)
+        rings = [(f"{_signed(v)} dBm", self._distance(_signed(v))) for v in RSSI_THRESHOLD.values()]
+        rings.append((None, r))
+        for label, dist in rings:
+            if dist <= 0:
+                continue
+            sdl2.SDL_RenderDrawLinesF(renderer, self._ring_points(r, r, dist), RING_SEGMENTS + 1)
+        for label, dist in rings:
+            if label and 0 < dist < r:
+                self.ui.draw_text((r + 3, r - dist + 1), label, color)
+
+        sdl2.SDL_SetRenderTarget(renderer, previous)
+        self._rings = texture
+        self._rings_color = key
+        return texture
+
+    # ------------------------------------------------------------------
+    # Layout
+    # ------------------------------------------------------------------
+    def _distance(self, rssi):
+        span = RADAR_NEAR_RSSI - RADAR_FAR_RSSI
+        return self.radius * max(0.0, min(1.0, (RADAR_NEAR_RSSI - rssi) / span))
+
+    def _style(self, mac, identity):
+        """(bearing x, bearing y, RGB bytes, identity) for a droid, cached until its identity changes"""
+        a = zlib.crc32(mac.encode()) / 0xFFFFFFFF * 2 * math.pi
+        rgb = RADAR_COLORS.get(faction_of(identity), RADAR_COLORS[None])
+        style = self._styles[mac] = (math.cos(a), math.sin(a), bytes(rgb), identity)
+        return style
+
+    def position(self, row):
+        """Screen position of a presence row's blip"""
+        cx, cy = self.center
+        rssi = row.get("rssi")
+        dist = self.radius if rssi is None else self._distance(rssi)
+        style = self._styles.get(row["mac"]) or self._style(row["mac"], row.get("identity"))
+        return cx + style[0] * dist, cy + style[1] * dist
+
+    # ------------------------------------------------------------------
+    # Drawing
+    # ------------------------------------------------------------------
+    def draw(self, rows, selected_mac=None, ttl=None):
+        """Draws the rings and one blip per row; returns the selected row's position, if any"""
+        renderer = self.ui.renderer
+        cx, cy = self.center
+        rings = self._rings_texture()
+        if rings:
+            sdl2.SDL_RenderCopy(renderer, rings, None,
+                                sdl2.SDL_Rect(cx - self.radius, cy - self.radius, self.radius * 2 + 1, self.radius * 2 + 1))
+
+        blip = self._blip_texture()
+        selected = None
+        if not rows or not blip:
+            self.blips_drawn = 0
+            return selected
+
+        # Everything per blip is inlined; this loop is most of the frame with hundreds of droids
+        half = BLIP_SIZE / 2
+        radius = self.radius
+        scale = radius / (RADAR_NEAR_RSSI - RADAR_FAR_RSSI)
+        fade = (255 - MIN_BLIP_ALPHA) / ttl if ttl else 0.0
+        styles = self._styles
+        xy = array.array("f")
+        colors = bytearray()
+        for row in rows:
+            mac = row["mac"]
+            identity = row.get("identity")
+            style = styles.get(mac)
+            if style is None or style[3] != identity:
+                style = self._style(mac, identity)
+
+            rssi = row.get("rssi")
+            dist = radius if rssi is None else min(radius, max(0.0, (RADAR_NEAR_RSSI - rssi) * scale))
+            x = cx + style[0] * dist
+            y = cy + style[1] * dist
+            if mac == selected_mac:
+                selected = (x, y)
+            alpha = 255 - min(255 - MIN_BLIP_ALPHA, int((row.get("age") or 0.0) * fade))
+
+            xy.extend((x - half, y - half, x + half, y - half, x + half, y + half, x - half, y + half))
+            colors += (style[2] + bytes((alpha,))) * 4
+
+        if self.use_geometry:
+            self._draw_geometry(blip, xy, colors, len(rows))
+        else:
+            self._draw_copies(blip, xy, colors, len(rows))
+        self.blips_drawn = len(rows)
+
+        if selected:
+            sx, sy = selected
+            c = self.ui.c_text
+            sdl2.SDL_SetRenderDrawColor(renderer, c.r, c.g, c.b, 255)
+            sdl2.SDL_RenderDrawLinesF(renderer, self._ring_points(sx, sy, BLIP_SIZE), RING_SEGMENTS + 1)
+        return selected
+
+    def _draw_geometry(self, blip, xy, colors, count):
+        # Quad i is vertices 4i..4i+3 as two triangles; the index list only grows
+        if len(self._indices) < count * 6:
+            self._indices = array.array("i", (
+                4 * q + k for q in range(max(count, 2 * len(self._indices) // 6)) for k in (0, 1, 2, 0, 2, 3)
+            ))
+        uv = _QUAD_UV * count
+        sdl2.SDL_RenderGeometryRaw(
+            self.ui.renderer, blip,
+            (ctypes.c_float * len(xy)).from_buffer(xy), 8,
+            ctypes.cast((ctypes.c_uint8 * len(colors)).from_buffer(colors), ctypes.POINTER(sdl2.SDL_Color)), 4,
+            (ctypes.c_float * len(uv)).from_buffer(uv), 8,
+            count * 4,
+            ctypes.addressof((ctypes.c_int * len(self._indices)).from_buffer(self._indices)), count * 6, 4,
+        )
+
+    def _draw_copies(self, blip, xy, colors, count):
+        renderer = self.ui.renderer
+        rect = sdl2.SDL_FRect(0, 0, BLIP_SIZE, BLIP_SIZE)
+        last = None
+        for i in range(count):
+            color = bytes(colors[i * 16:i * 16 + 4])
+            if color != last:
+                sdl2.SDL_SetTextureColorMod(blip, color[0], color[1], color[2])
+                sdl2.SDL_SetTextureAlphaMod(blip, color[3])
+                last = color
+            rect.x, rect.y = xy[i * 8], xy[i * 8 + 1]
+            sdl2.SDL_RenderCopyF(renderer, blip, None, rect)
+        sdl2.SDL_SetTextureColorMod(blip, 255, 255, 255)
+        sdl2.SDL_SetTextureAlphaMod(blip, 255)
+
+    def _destroy(self, texture):
+        if texture:
+            sdl2.SDL_DestroyTexture(texture)
+
+    def close(self):
+        self._destroy(self._blip)
+        self._destroy(self._rings)
+        self._blip = None
+        self._rings = None
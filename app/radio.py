@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+radio.py - Arbitrates adapter time between connections, advertising and discovery
+"""
+
+import collections
+import threading
+import time
+
+# Higher wins when activities share an adapter
+PRIORITIES = {
+    "connection": 3,
+    "advertise": 2,
+    "scan": 1,
+}
+
+# Share of each period a lower-priority activity keeps while a higher-priority
+# one is active on the same adapter. Connection traffic always wins, and
+# discovery is duty-cycled while a beacon is on air.
+DUTY_CYCLES = {
+    ("scan", "advertise"): 0.5,
+    ("scan", "connection"): 0.0,
+    ("advertise", "connection"): 0.0,
+}
+
+# Length of one duty-cycle period and the scheduler tick (seconds)
+DUTY_PERIOD = 2.0
+SLOT = 0.1
+# How often a gated loop checks for pause, resume and stop (seconds)
+GATE_POLL = 0.02
+
+_Activity = collections.namedtuple("_Activity", ["name", "adapter", "is_active", "pause", "resume"])
+
+# ----------------------------------------------------------------------
+# Radio Arbiter
+# ----------------------------------------------------------------------
+class RadioArbiter:
+    """
+    Polls registered activities every slot and pauses or resumes them so that
+    activities sharing an adapter get radio time by priority. Activities on
+    different adapters never affect each other.
+    """
+
+    def __init__(self, period=DUTY_PERIOD, slot=SLOT, duty_cycles=None):
+        self.period = period
+        self.slot = slot
+        self.duty_cycles = DUTY_CYCLES if duty_cycles is None else duty_cycles
+        self._activities = {}
+        self._paused = set()
+        self._period_index = -1
+        self._stats = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def register(self, name, adapter=None, is_active=None, pause=None, resume=None):
+        """
+        Adds an activity. `adapter` is the HCI name it runs on (None for the
+        default), `is_active()` says whether it currently wants the radio and
+        `pause()`/`resume()` hand the radio back and take it again.
+        """
+        with self._lock:
+            self._activities[name] = _Activity(name, adapter, is_active or (lambda: False), pause, resume)
+            self._stats[name] = {"active_s": 0.0, "on_air_s": 0.0, "pauses": 0}
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="RadioArbiter", daemon=True)
+            self._thread.start()
+
+    def close(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=1.0)
+            self._thread = None
+
+    # ------------------------------------------------------------------
+    # Scheduling
+    # ------------------------------------------------------------------
+    def duty(self, name, active) -> float:
+        """Share of the period `name` gets given the set of active activity names"""
+        activity = self._activities[name]
+        share = 1.0
+        for other in active:
+            if other == name or PRIORITIES.get(other, 0) <= PRIORITIES.get(name, 0):
+                continue
+            if self._activities[other].adapter != activity.adapter:
+                continue
+            share = min(share, self.duty_cycles.get((name, other), 1.0))
+        return share
+
+    def _run(self):
+        started = time.monotonic()
+        last = started
+        while not self._stop.wait(self.slot):
+            now = time.monotonic()
+            self.tick(now - started, now - last)
+            last = now
+
+    def tick(self, elapsed, dt):
+        """Decides every activity's state for the slot starting at `elapsed` seconds"""
+        with self._lock:
+            activities = list(self._activities.values())
+
+        active = set()
+        for activity in activities:
+            try:
+                if activity.is_active():
+                    active.add(activity.name)
+            except Exception:
+                pass
+
+        phase = (elapsed % self.period) / self.period
+        # Owners can restart an activity behind our back (a scan that was
+        # still powering up), so pauses are reasserted once per period
+        period_index = int(elapsed // self.period)
+        reassert = period_index != self._period_index
+        self._period_index = period_index
+
+        for activity in activities:
+            stats = self._stats[activity.name]
+            if activity.name not in active:
+                # Whoever owns it stopped on its own, so nothing to resume
+                self._paused.discard(activity.name)
+                continue
+
+            granted = phase < self.duty(activity.name, active)
+            stats["active_s"] += dt
+            if granted:
+                stats["on_air_s"] += dt
+                if activity.name in self._paused:
+                    self._paused.discard(activity.name)
+                    self._call(activity.resume, activity.name, "resume")
+            elif activity.name not in self._paused:
+                self._paused.add(activity.name)
+                stats["pauses"] += 1
+                self._call(activity.pause, activity.name, "pause")
+            elif reassert:
+                self._call(activity.pause, activity.name, "pause")
+
+    def _call(self, fn, name, action):
+        if fn is None:
+            return
+        try:
+            fn()
+        except Exception as e:
+            print(f"[RADIO] Failed to {action} {name}: {e}")
+
+    def is_paused(self, name) -> bool:
+        return name in self._paused
+
+    def stats(self) -> dict:
+        """Per-activity time wanting the radio, time granted and the resulting duty cycle"""
+        result = {}
+        with self._lock:
+            for name, s in self._stats.items():
+                result[name] = {
+                    "active_s": s["active_s"],
+                    "on_air_s": s["on_air_s"],
+                    "duty": s["on_air_s"] / s["active_s"] if s["active_s"] else 0.0,
+                    "pauses": s["pauses"],
+                }
+        return result
+
+# ----------------------------------------------------------------------
+# Radio Gate
+# ----------------------------------------------------------------------
+class _Burst:
+    """
+    stop_event stand-in for one granted stretch of a gated loop: set once the
+    owner's stop event is, or the gate has paused since it was handed out.
+    """
+
+    def __init__(self, gate, stop_event):
+        self._gate = gate
+        self._stop = stop_event
+        self._epoch = gate._epoch
+
+    def is_set(self) -> bool:
+        return self._stop.is_set() or self._gate._epoch != self._epoch
+
+    def wait(self, timeout=None) -> bool:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self.is_set():
+            step = GATE_POLL if deadline is None else min(GATE_POLL, deadline - time.monotonic())
+            if step <= 0:
+                return False
+            self._stop.wait(step)
+        return True
+
+class RadioGate:
+    """
+    pause()/resume() for activities that run their own radio loop, such as a
+    scan source. Owners iterate bursts() and run the radio for each stretch
+    it yields, handing the yielded event to the backend as its stop_event;
+    pause() ends the current stretch and holds the next one back until
+    resume().
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._paused = False
+        self._epoch = 0
+
+    @property
+    def paused(self) -> bool:
+        return self._paused
+
+    def pause(self):
+        with self._lock:
+            if not self._paused:
+                self._paused = True
+                self._epoch += 1
+
+    def resume(self):
+        with self._lock:
+            self._paused = False
+
+    def bursts(self, stop_event, duration=None):
+        """
+        Yields (seconds left or None, stop event) for every stretch the radio
+        is granted until `stop_event` is set or `duration` has passed.
+        """
+        end = None if duration is None else time.monotonic() + duration
+        while not stop_event.is_set():
+            remaining = None if end is None else end - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return
+            if self._paused:
+                stop_event.wait(GATE_POLL if remaining is None else min(GATE_POLL, remaining))
+                continue
+            yield remaining, _Burst(self, stop_event)
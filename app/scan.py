@@ -5,11 +5,99 @@ scan.py - Performs the logic in scan actions
 
 import os
 import re
-import subprocess
 import time
 import threading
+from concurrent.futures import ThreadPoolExecutor, wait
 
-from dicts import FACTIONS, DROIDS
+from decoder import identify
+from dicts import BEACON_PROTOCOL
+from presence import PresenceTracker, PRESENCE_TTL
+from radio import RadioGate
+
+# Concurrent `info` lookups for droids whose manufacturer data wasn't heard during discovery
+INFO_WORKERS = 4
+# Presence mode restarts the scan source this often (seconds)
+PRESENCE_WINDOW = 30.0
+
+# Adaptive scan termination (seconds): a scan runs at least SCAN_MIN_S, ends once
+# no new droid has appeared for SCAN_IDLE_S, and never runs past SCAN_MAX_S
+SCAN_MIN_S = 1.0
+SCAN_IDLE_S = 1.5
+SCAN_MAX_S = 10.0
+# How often a running scan checks whether it should end (seconds)
+SESSION_POLL = 0.02
+# How long start_scan waits for a cancelled scan to wind down (seconds)
+SCAN_JOIN_TIMEOUT = 1.0
+
+# ----------------------------------------------------------------------
+# Scan Session
+# ----------------------------------------------------------------------
+class ScanSession:
+    """
+    One scan: its stop event, adaptive deadline and the reason it ended.
+    The deadline starts at `duration` and moves out while new droids keep
+    arriving, up to `max_duration`. Backends only see `stop_event`. With
+    `idle` set to None the session never ends for lack of new droids.
+    """
+
+    def __init__(self, duration, favorites=(), idle=SCAN_IDLE_S, min_duration=SCAN_MIN_S, max_duration=SCAN_MAX_S):
+        self.stop_event = threading.Event()
+        self.started = time.monotonic()
+        self.ended = None
+        self.reason = None
+        self.idle = idle
+        self.min_duration = min(min_duration, duration)
+        self.max_duration = max(max_duration, duration)
+        self.deadline = self.started + duration
+        self.last_new = self.started
+        self.found = 0
+        self.waiting_for = set(favorites)
+        self._had_favorites = bool(self.waiting_for)
+
+    @property
+    def cancelled(self) -> bool:
+        return self.reason == "cancelled"
+
+    @property
+    def duration(self) -> float:
+        return (self.ended or time.monotonic()) - self.started
+
+    def note(self, mac):
+        """Records a newly seen droid, pushing the deadline out if needed"""
+        now = time.monotonic()
+        self.found += 1
+        self.last_new = now
+        self.waiting_for.discard(mac)
+        if self.idle is not None:
+            self.deadline = min(max(self.deadline, now + self.idle), self.started + self.max_duration)
+
+    def finish(self, reason):
+        if self.reason is None:
+            self.reason = reason
+            self.ended = time.monotonic()
+        self.stop_event.set()
+
+    def cancel(self):
+        self.finish("cancelled")
+
+    def check(self) -> bool:
+        """Ends the session if one of its stop conditions holds; True once it has ended"""
+        if self.stop_event.is_set():
+            return True
+        now = time.monotonic()
+        if self._had_favorites and not self.waiting_for:
+            self.finish("all favorites seen")
+        elif (self.idle is not None and now - self.started >= self.min_duration
+              and now - self.last_new >= self.idle):
+            self.finish(f"no new droids for {self.idle * 1000:.0f} ms")
+        elif now >= self.deadline:
+            self.finish("time limit")
+        return self.stop_event.is_set()
+
+    def watch(self):
+        while not self.stop_event.wait(SESSION_POLL):
+            if self.check():
+                break
 
 # ----------------------------------------------------------------------
 # DroidScanner (Low Level)
@@ -30,37 +118,43 @@ class DroidScanner:
 
             parts = re.split(r'AdvertisingFlags|RSSI|TxPower|ServiceData', parts)[0]
             clean_hex = "".join(re.findall(r'[0-9a-fA-F]+', parts)).lower()
-
-            if "0304" in clean_hex:
-                start = clean_hex.find("0304")
-                payload = clean_hex[start:start+12]
-
-                if len(payload) >= 12:
-                    raw_aff_byte = int(payload[8:10], 16)
-                    raw_pers_val = int(payload[10:12], 16)
-                    derived_aff_id = (raw_aff_byte - 0x80) // 2
-                    
-                    target_f_key = None
-                    for f_key, f_val in FACTIONS.items():
-                        if f_val == derived_aff_id:
-                            target_f_key = f_key
-                            break
-
-                    if target_f_key:
-                        faction_droids = DROIDS.get(target_f_key, {})
-                        for d_info in faction_droids.values():
-                            if d_info["id"] == raw_pers_val:
-                                return f"{d_info['name']} ({target_f_key})"
-                        return f"Unknown ID:{hex(raw_pers_val)} ({target_f_key})"
-            return None
+            if len(clean_hex) % 2:
+                clean_hex = clean_hex[:-1]
+            return self._decode_manufacturer_data(bytes.fromhex(clean_hex))
         except Exception:
             return None
 
+    def _decode_manufacturer_data(self, data):
+        """Resolves faction and personality from raw manufacturer data bytes"""
+        return identify(data)
+
+    def manufacturer_data(self, mac):
+        """(Disney manufacturer data, RSSI) from the controller's live device cache, if it has one"""
+        devices = getattr(self.bt, "devices", None)
+        if devices is None:
+            return None, None
+        props = devices.get(mac)
+        mfg = props.get("ManufacturerData") or {}
+        return mfg.get(BEACON_PROTOCOL["MFG_ID"]), props.get("RSSI")
+
+    def lookup(self, mac):
+        """Identifies a droid straight from the controller's live device cache, if it has one"""
+        data, _ = self.manufacturer_data(mac)
+        return self._decode_manufacturer_data(data) if data else None
+
 # ----------------------------------------------------------------------
 # Scan Manager (High Level)
 # ----------------------------------------------------------------------
 class ScanManager:
-    def __init__(self, bt_controller, lock=None, favorites=None, progress_callback=None):
+    """
+    Streams droids into the result list as they are seen. Devices whose
+    manufacturer data isn't known yet are looked up on a small worker pool
+    so one slow `info` doesn't hold back the rest. Scans and presence mode
+    only use the radio while `gate` is open, whatever the source.
+    """
+
+    def __init__(self, bt_controller, lock=None, favorites=None, progress_callback=None, source=None, known=None,
+                 sightings=None, gate=None):
         self.bt = bt_controller
         self.scanner = DroidScanner(bt_controller)
         self._lock = lock or threading.Lock()
@@ -68,69 +162,334 @@ class ScanManager:
         self.scanning = False
         self.scan_results = []
         self.progress_callback = progress_callback
+        # Optional advertisement source (see create_scan_source); None scans through the controller
+        self.source = source
+        # Optional droidcache.KnownDroidCache: seeds each scan and remembers what it decodes
+        self.known = known
+        # Optional sightings.SightingLog: every droid heard, for later presence reports
+        self.sightings = sightings
+        # radio.RadioGate the radio arbiter pauses and resumes scanning through
+        self.gate = gate or RadioGate()
 
-    def start_scan(self, duration=3.0):
-        """Initiates the background thread to perform a non-blocking device scan"""
-        if self.scanning:
+        self._pool = ThreadPoolExecutor(max_workers=INFO_WORKERS, thread_name_prefix="ScanInfo")
+        self._seen = set()
+        self._lookups = []
+        self.scan_started = None
+        self.first_result_s = None
+        # Current (or last finished) ScanSession
+        self.session = None
+        self._scan_worker = None
+
+        # Continuous presence mode (see start_presence)
+        self.tracking = False
+        self.presence = PresenceTracker()
+        self._presence_stop = threading.Event()
+        self._presence_worker = None
+
+    def start_scan(self, duration=3.0, idle=SCAN_IDLE_S, max_duration=SCAN_MAX_S):
+        """
+        Initiates the background thread to perform a non-blocking device scan.
+        The scan ends early once every favorite has been seen or nothing new
+        has turned up for `idle` seconds, and runs longer (up to
+        `max_duration`) while droids are still arriving.
+        """
+        # Presence mode owns the scan source until stop_presence()
+        if self.scanning or self.tracking:
             return
+        # A cancelled scan or stopped presence loop must be gone before the next one starts
+        self.join_workers()
+
         self.scanning = True
-        threading.Thread(target=self._scan_thread, args=(duration,), daemon=True).start()
+        session = ScanSession(duration, favorites=list(self.favorites or {}), idle=idle, max_duration=max_duration)
+        with self._lock:
+            self.scan_results = []
+            self._seen = set()
+            self._lookups = []
+            self.scan_started = session.started
+            self.first_result_s = None
+            self.session = session
+        self._scan_worker = threading.Thread(target=self._scan_thread, args=(session,), name="Scan", daemon=True)
+        self._scan_worker.start()
+
+    def join_workers(self):
+        """Waits for scan and presence threads that were told to stop, so they never share the source"""
+        for worker in (self._scan_worker, self._presence_worker):
+            if worker is not None and worker.is_alive() and worker is not threading.current_thread():
+                worker.join(SCAN_JOIN_TIMEOUT)
 
     def stop_scan(self):
-        """Signals the Bluetooth controller to cease discovery and updates state"""
+        """Cancels the running scan; the backend stops within SESSION_POLL"""
+        session = self.session
+        if session is not None:
+            session.cancel()
         self.scanning = False
 
-    def _scan_thread(self, duration):
+    def _scan_thread(self, session):
+        watcher = threading.Thread(target=session.watch, name="ScanSession", daemon=True)
         try:
+            self._seed_from_cache()
             self.bt.power_on()
-            
-            # Use the built-in timeout flag of bluetoothctl if available
-            # This allows the process to exit gracefully rather than being killed
-            subprocess.run(["bluetoothctl", "--timeout", str(int(duration)), "scan", "on"], 
-                           capture_output=True, text=True)
-            
-            raw_devs = subprocess.run(["bluetoothctl", "devices"], 
-                                      capture_output=True, text=True).stdout
-            found_macs = [l.split()[1] for l in raw_devs.splitlines() if "DROID" in l.upper()]
-            
-            current_favorites = self.favorites or {}
-            temp_results = []
-
-            for mac in found_macs:
-                mac = mac.upper()
-                
-                # Instead of restarting scan on, just get the info
-                # If the data is missing, the previous scan duration was likely too short
-                info_text = subprocess.run(["bluetoothctl", "info", mac], 
-                                           capture_output=True, text=True).stdout
-                
-                identity = self.scanner._parse_personality(info_text)
-                
-                fav_entry = current_favorites.get(mac)
-                nickname = None
-                profile = "R-Arcade"
-
-                if fav_entry:
-                    nickname = fav_entry.get("nickname")
-                    profile = fav_entry.get("controller_profile", "R-Arcade")
-                else:
-                    if identity and "BB-Series" in identity:
-                        profile = "BB-Arcade"
-                
-                temp_results.append({
-                    "mac": mac,
-                    "nickname": nickname,
-                    "identity": identity if identity else "Droid Found",
-                    "controller_profile": profile
-                })
+            watcher.start()
 
+            done = False
+            if self.source is not None and not session.stop_event.is_set():
+                try:
+                    self._scan_source(session)
+                    done = True
+                except OSError as e:
+                    print(f"[SCAN] Scan source failed ({e}), falling back to the controller")
+                    self.source = None
+            if not done and not session.stop_event.is_set():
+                self._scan_controller(session)
+            session.finish("time limit")
+
+            with self._lock:
+                lookups = list(self._lookups)
+            if session.cancelled:
+                for future in lookups:
+                    future.cancel()
+                return
+            wait(lookups)
+
+            # Cached droids that didn't show up this time are gone
             with self._lock:
-                self.scan_results = temp_results
+                if self.session is session:
+                    self.scan_results = [r for r in self.scan_results if not r.get("stale")]
+            if self.known is not None:
+                self.known.save()
 
         except Exception as e:
             print(f"Scan Error: {e}")
         finally:
-            self.scanning = False
+            session.finish("error")
+            print(f"[SCAN] Scan ran {session.duration:.2f} s, {session.found} droids: {session.reason}")
+            if self.session is session:
+                self.scanning = False
+
+    def _seed_from_cache(self):
+        """Lists droids from earlier sessions straight away, marked stale until heard again"""
+        if self.known is None:
+            return
+        favorites = self.favorites or {}
+        rows = []
+        for mac, identity, rssi, last_seen in self.known.recent():
+            row = self._build_result(mac, identity, favorites)
+            row.update(stale=True, rssi=rssi, last_seen=last_seen)
+            rows.append(row)
+        with self._lock:
+            live = {r["mac"] for r in self.scan_results}
+            self.scan_results.extend(r for r in rows if r["mac"] not in live)
+
+    def _scan_controller(self, session):
+        # Controllers with a live device cache report droids while discovery runs
+        devices = getattr(self.bt, "devices", None)
+        if devices is not None:
+            devices.subscribe(self._on_device_event)
+        else:
+            # Droids only turn up once discovery returns, so "nothing new lately" means nothing
+            session.idle = None
+        found = []
+        try:
+            for remaining, stop in self.gate.bursts(session.stop_event, session.max_duration):
+                found.extend(self.bt.discover(remaining, stop_event=stop))
+        finally:
+            if devices is not None:
+                devices.unsubscribe(self._on_device_event)
+        if session.cancelled:
+            return
+
+        # Anything the event stream missed (or every droid, without a cache)
+        for mac, name in found:
+            if "DROID" in name.upper():
+                self._offer(mac.upper())
+
+    def _on_device_event(self, event):
+        if event.kind == "DEL" or not self.scanning:
+            return
+        name = self.bt.devices.get(event.mac).get("Name") or ""
+        if "DROID" in name.upper():
+            self._offer(event.mac)
+
+    def _offer(self, mac):
+        """Publishes a droid straight from the cache, or queues an info lookup for it"""
+        with self._lock:
+            if mac in self._seen:
+                return
+            self._seen.add(mac)
+            session = self.session
+        session.note(mac)
+
+        identity = self.scanner.lookup(mac)
+        if identity is not None:
+            self._publish(mac, identity)
+            return
+        future = self._pool.submit(self._lookup_info, mac, session)
+        with self._lock:
+            self._lookups.append(future)
+
+    def _lookup_info(self, mac, session):
+        # If the data is missing, the scan duration was likely too short to hear it
+        info_text = self.bt.read_info(mac)
+        if not session.cancelled:
+            self._publish(mac, self.scanner._parse_personality(info_text))
+
+    def _scan_source(self, session):
+        """Decodes advertisements from the scan source in-process as they arrive"""
+        def on_advert(advert):
+            data = advert.manufacturer_data.get(BEACON_PROTOCOL["MFG_ID"])
+            if data is None:
+                return
+            with self._lock:
+                if advert.mac in self._seen:
+                    return
+            # Location beacons, MagicBands and other Disney adverts aren't droids
+            identity = self.scanner._decode_manufacturer_data(data)
+            if identity is None:
+                return
+            with self._lock:
+                if advert.mac in self._seen:
+                    return
+                self._seen.add(advert.mac)
+            session.note(advert.mac)
+            self._publish(advert.mac, identity, data, advert.rssi)
+
+        for remaining, stop in self.gate.bursts(session.stop_event, session.max_duration):
+            self.source.scan(remaining, on_advert, stop_event=stop)
+
+    def _publish(self, mac, identity, data=None, rssi=None):
+        if data is None:
+            data, rssi = self.scanner.manufacturer_data(mac)
+        if self.sightings is not None:
+            self.sightings.record(mac, data, rssi)
+        result = self._build_result(mac, identity, self.favorites or {})
+        with self._lock:
+            if self.first_result_s is None and self.scan_started is not None:
+                self.first_result_s = time.monotonic() - self.scan_started
+            # A live sighting confirms (replaces) the cached row for the same droid
+            for i, row in enumerate(self.scan_results):
+                if row["mac"] == mac:
+                    self.scan_results[i] = result
+                    break
+            else:
+                self.scan_results.append(result)
+        if identity and data and self.known is not None:
+            self.known.update(mac, data, rssi)
+
+    # ------------------------------------------------------------------
+    # Presence mode
+    # ------------------------------------------------------------------
+    def start_presence(self, ttl=PRESENCE_TTL):
+        """Scans continuously, keeping a live table of nearby droids in `presence`"""
+        if self.tracking:
+            return
+        # A one-shot scan would share the source with the presence loop
+        self.stop_scan()
+        self.join_workers()
+        self.tracking = True
+        self.presence.ttl = ttl
+        self.presence.clear()
+        self._presence_stop.clear()
+        self._presence_worker = threading.Thread(target=self._presence_thread, name="PresenceThread", daemon=True)
+        self._presence_worker.start()
+
+    def stop_presence(self):
+        self._presence_stop.set()
+        self.tracking = False
+
+    def get_presence(self):
+        """Nearest-first droid rows; reads a published snapshot, so it never waits on scan threads"""
+        return list(self.presence.snapshot())
+
+    def _presence_thread(self):
+        try:
+            self.bt.power_on()
+            while self.source is not None and not self._presence_stop.is_set():
+                try:
+                    for _, stop in self.gate.bursts(self._presence_stop):
+                        self.source.scan(PRESENCE_WINDOW, self._presence_advert, stop_event=stop)
+                except OSError as e:
+                    print(f"[SCAN] Scan source failed ({e}), falling back to the controller")
+                    self.source = None
+            if not self._presence_stop.is_set():
+                self._presence_controller()
+        except Exception as e:
+            print(f"Presence Error: {e}")
+        finally:
+            self.tracking = False
+            if self.known is not None:
+                self.known.save()
+
+    def _presence_advert(self, advert):
+        data = advert.manufacturer_data.get(BEACON_PROTOCOL["MFG_ID"])
+        if data is None:
+            return
+        info = None
+        if self.presence.info(advert.mac) is None:
+            identity = identify(data)
+            # Location beacons, MagicBands and other Disney adverts aren't droids
+            if identity is None:
+                return
+            info = self._build_result(advert.mac, identity, self.favorites or {})
+            if self.known is not None:
+                self.known.update(advert.mac, data, advert.rssi)
+        if self.sightings is not None:
+            self.sightings.record(advert.mac, data, advert.rssi)
+        self.presence.observe(advert.mac, advert.rssi, info)
+
+    def _presence_controller(self):
+        devices = getattr(self.bt, "devices", None)
+        if devices is None:
+            print("[SCAN] Presence mode needs a controller with a live device cache")
+            return
+
+        def on_event(event):
+            if event.kind == "DEL" or event.prop not in ("RSSI", "ManufacturerData", "Name"):
+                return
+            props = devices.get(event.mac)
+            mfg = props.get("ManufacturerData") or {}
+            if BEACON_PROTOCOL["MFG_ID"] not in mfg and "DROID" not in (props.get("Name") or "").upper():
+                return
+            if self.sightings is not None:
+                self.sightings.record(event.mac, mfg.get(BEACON_PROTOCOL["MFG_ID"]), props.get("RSSI"))
+            # Identify once, or again if the name arrived before the manufacturer data
+            info = None
+            known = self.presence.info(event.mac)
+            if known is None or (known.get("identity") == "Droid Found" and mfg):
+                info = self._build_result(event.mac, self.scanner.lookup(event.mac), self.favorites or {})
+                data = mfg.get(BEACON_PROTOCOL["MFG_ID"])
+                if self.known is not None and data and info["identity"] != "Droid Found":
+                    self.known.update(event.mac, data, props.get("RSSI"))
+            self.presence.observe(event.mac, props.get("RSSI"), info)
+
+        devices.subscribe(on_event)
+        try:
+            for _, stop in self.gate.bursts(self._presence_stop):
+                self.bt.start_scanning()
+                try:
+                    stop.wait()
+                finally:
+                    self.bt.stop_scanning()
+        finally:
+            devices.unsubscribe(on_event)
+
+    def _build_result(self, mac, identity, favorites):
+        fav_entry = favorites.get(mac)
+        nickname = None
+        profile = "R-Arcade"
+
+        if fav_entry:
+            nickname = fav_entry.get("nickname")
+            profile = fav_entry.get("controller_profile", "R-Arcade")
+        else:
+            if identity and "BB-Series" in identity:
+                profile = "BB-Arcade"
+
+        return {
+            "mac": mac,
+            "nickname": nickname,
+            "identity": identity if identity else "Droid Found",
+            "controller_profile": profile
+        }
 
     def get_results(self):
         """Provides a thread-safe copy of the currently discovered droid list"""
@@ -140,4 +499,28 @@ class ScanManager:
     def clear_results(self):
         """Resets the result list and error tracking for a new scan session"""
         with self._lock:
-            self.scan_results = []
\ No newline at end of file
+            self.scan_results = []
+
+# ----------------------------------------------------------------------
+# Scan sources
+# ----------------------------------------------------------------------
+def create_scan_source(kind=None, adapter=None, controller=None):
+    """
+    Returns an advertisement source for ScanManager, or None to scan through
+    the Bluetooth controller. `kind` defaults to the BT_SCAN_SOURCE variable;
+    "btsnoop:<path>" replays a capture at BT_REPLAY_SPEED (1.0 by default).
+    """
+    kind = kind or os.environ.get("BT_SCAN_SOURCE", "")
+    if kind.lower().startswith("btsnoop:"):
+        from btsnoop import CaptureSource
+        speed = float(os.environ.get("BT_REPLAY_SPEED", "1.0")) or None
+        return CaptureSource(kind[len("btsnoop:"):], speed=speed, loop=True)
+    kind = kind.lower()
+    if kind == "hci":
+        from hci import HciScanner
+        dev_id = int(adapter[3:]) if adapter and adapter[3:].isdigit() else 0
+        return HciScanner(dev_id, controller=controller)
+    if kind == "bleak":
+        from bleakscan import BleakScanSource
+        return BleakScanSource(adapter=adapter)
+    return None
@@ -0,0 +1,391 @@
+#!/usr/bin/env python3
+"""
+sightings.py - Append-only log of droid sightings and a memory-mapped reader for it
+"""
+
+import collections
+import glob
+import math
+import mmap
+import os
+import struct
+import threading
+import time
+
+from decoder import DroidInfo, decode_batch, identify
+from dicts import BEACON_PROTOCOL, BEACON_TYPE, FACTIONS
+from options import resource_path
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+LOG_MAGIC = b"DTSL"
+LOG_VERSION = 1
+
+# magic, version, record size, reserved
+_HEADER = struct.Struct("<4sBBH")
+# unix seconds, milliseconds, MAC (first 2 bytes, last 4 bytes), identity ID, RSSI
+_RECORD = struct.Struct("<IHHIHb")
+if np is not None:
+    _DTYPE = np.dtype([
+        ("sec", "<u4"), ("ms", "<u2"), ("mac_hi", "<u2"), ("mac_lo", "<u4"), ("identity", "<u2"), ("rssi", "i1"),
+    ])
+
+# RSSI stored when a sighting didn't report one
+NO_RSSI = -128
+
+# Queued sightings are written when this many are waiting, or every FLUSH_INTERVAL seconds
+BATCH_SIZE = 512
+FLUSH_INTERVAL = 2.0
+# Sightings queued beyond this are dropped (oldest first) rather than blocking the scan
+MAX_PENDING = 100000
+# The same droid is logged at most this often (seconds)
+MIN_INTERVAL = 1.0
+# The log is rotated past this size; rotated logs beyond KEEP_LOGS are deleted
+MAX_LOG_BYTES = 8 * 1024 * 1024
+KEEP_LOGS = 4
+
+# Identity IDs are the beacon's affiliation byte << 8 | personality byte; 0 is "not identified"
+_AFFILIATION = {name: 0x80 + f_id * 2 for name, f_id in FACTIONS.items()}
+
+def identity_id(info) -> int:
+    """Identity ID for a decoded beacon, 0 for anything that isn't a known droid"""
+    if isinstance(info, DroidInfo):
+        return _AFFILIATION[info.faction] << 8 | info.personality_id
+    return 0
+
+def identity_name(ident: int):
+    """"Name (Faction)" for an identity ID, None for 0"""
+    if not ident:
+        return None
+    return identify(bytes([
+        BEACON_TYPE["DROID"], BEACON_PROTOCOL["DATA_LEN"], BEACON_PROTOCOL["DROID_HEADER"], 0,
+        ident >> 8, ident & 0xFF,
+    ]))
+
+def _mac_int(mac: str) -> int:
+    """48-bit integer for "AA:BB:CC:DD:EE:FF"; ValueError for anything else"""
+    digits = mac.replace(":", "")
+    # isalnum() rules out the signs, underscores and spaces int() would accept
+    if len(digits) != 12 or not digits.isalnum():
+        raise ValueError(f"not a MAC address: {mac!r}")
+    return int(digits, 16)
+
+def _mac_str(value: int) -> str:
+    return ":".join(f"{value >> shift & 0xFF:02X}" for shift in range(40, -8, -8))
+
+def log_files(path) -> list:
+    """The log and its rotated predecessors, oldest first"""
+    stem, ext = os.path.splitext(path)
+    rotated = []
+    for name in glob.glob(f"{glob.escape(stem)}.*{ext}"):
+        suffix = name[len(stem) + 1:len(name) - len(ext)]
+        if suffix.isdigit():
+            rotated.append((int(suffix), name))
+    files = [name for _, name in sorted(rotated, reverse=True)]
+    if os.path.exists(path):
+        files.append(path)
+    return files
+
+# ----------------------------------------------------------------------
+# Sighting Log (writer)
+# ----------------------------------------------------------------------
+class SightingLog:
+    """
+    Fixed 15-byte records appended to sightings.bin next to settings.json.
+    record() only appends to a queue; a writer thread decodes the queued
+    payloads in one batch and writes them out together, rotating the file
+    once it passes MAX_LOG_BYTES. If the writer falls behind, the oldest
+    queued sightings are dropped so callers never wait on the disk.
+    """
+
+    def __init__(self, path=None, min_interval=MIN_INTERVAL, max_bytes=MAX_LOG_BYTES, keep=KEEP_LOGS):
+        self.path = path or resource_path("sightings.bin")
+        self.min_interval = min_interval
+        self.max_bytes = max_bytes
+        self.keep = keep
+        self._pending = collections.deque(maxlen=MAX_PENDING)
+        self._last_logged = {}
+        self._wake = threading.Event()
+        self._closed = threading.Event()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self.written = 0
+        self.dropped = 0
+        self.rotations = 0
+
+    def record(self, mac: str, data=None, rssi=None, when=None):
+        """Queues a sighting of `mac` with its manufacturer data payload, if known"""
+        when = time.time() if when is None else when
+        last = self._last_logged.get(mac)
+        if last is not None and when - last < self.min_interval:
+            return
+        # A bad address is counted as dropped here rather than killing the writer thread
+        try:
+            mac_int = _mac_int(mac)
+        except (ValueError, AttributeError):
+            self.dropped += 1
+            return
+        self._last_logged[mac] = when
+        if self._thread is None:
+            self._start()
+
+        pending = self._pending
+        if len(pending) == pending.maxlen:
+            self.dropped += 1
+        pending.append((when, mac_int, data, rssi))
+        if len(pending) >= BATCH_SIZE:
+            self._wake.set()
+
+    def _start(self):
+        with self._start_lock:
+            if self._thread is None and not self._closed.is_set():
+                self._thread = threading.Thread(target=self._writer, name="SightingLog", daemon=True)
+                self._thread.start()
+
+    def _writer(self):
+        while not self._closed.is_set():
+            self._wake.wait(FLUSH_INTERVAL)
+            self._wake.clear()
+            self.flush()
+        self.flush()
+
+    def flush(self):
+        """Writes everything queued so far; called from the writer thread and on close"""
+        batch = []
+        pending = self._pending
+        while pending:
+            batch.append(pending.popleft())
+        if not batch:
+            return
+
+        infos = decode_batch([bytes(data) if data else b"" for _, _, data, _ in batch])
+        chunk = b"".join(
+            _RECORD.pack(
+                int(when), int(when * 1000) % 1000, mac_int >> 32, mac_int & 0xFFFFFFFF,
+                identity_id(info), max(-127, min(127, int(rssi))) if rssi is not None else NO_RSSI,
+            )
+            for (when, mac_int, _, rssi), info in zip(batch, infos)
+        )
+        try:
+            self._append(chunk)
+            self.written += len(batch)
+        except OSError as e:
+            self.dropped += len(batch)
+            print(f"[SIGHTINGS] Failed to write {self.path}: {e}")
+
+    def _append(self, chunk):
+        try:
+            size = os.path.getsize(self.path)
+        except FileNotFoundError:
+            size = 0
+        if size and size + len(chunk) > self.max_bytes:
+            self._rotate()
+            size = 0
+        with open(self.path, "ab") as f:
+            if not size:
+                f.write(_HEADER.pack(LOG_MAGIC, LOG_VERSION, _RECORD.size, 0))
+            f.write(chunk)
+
+    def _rotate(self):
+        """sightings.bin becomes sightings.1.bin, .1 becomes .2 and so on"""
+        stem, ext = os.path.splitext(self.path)
+        oldest = f"{stem}.{self.keep}{ext}"
+        if os.path.exists(oldest):
+            os.remove(oldest)
+        for i in range(self.keep - 1, 0, -1):
+            name = f"{stem}.{i}{ext}"
+            if os.path.exists(name):
+                os.replace(name, f"{stem}.{i + 1}{ext}")
+        if self.keep > 0:
+            os.replace(self.path, f"{stem}.1{ext}")
+        else:
+            os.remove(self.path)
+        self.rotations += 1
+
+    def close(self):
+        """Stops the writer thread after it has written everything queued"""
+        self._closed.set()
+        self._wake.set()
+        with self._start_lock:
+            thread = self._thread
+        if thread is not None:
+            thread.join()
+        else:
+            self.flush()
+
+    def stats(self) -> dict:
+        return {
+            "written": self.written,
+            "pending": len(self._pending),
+            "dropped": self.dropped,
+            "rotations": self.rotations,
+        }
+
+# ----------------------------------------------------------------------
+# Sighting Reader
+# ----------------------------------------------------------------------
+Downsampled = collections.namedtuple("Downsampled", ["start", "bucket", "macs", "identities", "sightings", "rssi"])
+Downsampled.__doc__ = """
+Per-droid series over fixed time buckets. `start` is the unix time of the
+first bucket; `sightings[i][j]` counts droid `macs[i]`'s sightings in bucket
+j and `rssi[i][j]` is their mean RSSI (NaN without a reading). With NumPy
+both are 2-D arrays, otherwise lists of lists.
+"""
+
+class SightingReader:
+    """
+    Reads a sighting log and, by default, its rotated predecessors through
+    memory maps. A record cut short by a crash is ignored. With NumPy the
+    records are mapped as a structured array and downsampled with bincount;
+    without it they are unpacked with struct.
+    """
+
+    def __init__(self, path=None, rotated=True):
+        path = path or resource_path("sightings.bin")
+        self.paths = log_files(path) if rotated else ([path] if os.path.exists(path) else [])
+
+    def _valid(self, path, size) -> int:
+        """Number of complete records in a log file, 0 if it isn't one"""
+        if size < _HEADER.size:
+            return 0
+        with open(path, "rb") as f:
+            magic, version, record_size, _ = _HEADER.unpack(f.read(_HEADER.size))
+        if magic != LOG_MAGIC or version != LOG_VERSION or record_size != _RECORD.size:
+            print(f"[SIGHTINGS] Ignoring {path}: unknown format")
+            return 0
+        return (size - _HEADER.size) // _RECORD.size
+
+    def _files(self):
+        for path in self.paths:
+            try:
+                count = self._valid(path, os.path.getsize(path))
+            except OSError as e:
+                print(f"[SIGHTINGS] Failed to read {path}: {e}")
+                continue
+            if count:
+                yield path, count
+
+    def __len__(self):
+        return sum(count for _, count in self._files())
+
+    def records(self):
+        """
+        Every record, oldest first: a NumPy structured array (memory-mapped
+        for a single file), or a list of (sec, ms, mac_hi, mac_lo, identity,
+        rssi) tuples without NumPy.
+        """
+        if np is not None:
+            maps = [np.memmap(path, dtype=_DTYPE, mode="r", offset=_HEADER.size, shape=(count,))
+                    for path, count in self._files()]
+            if not maps:
+                return np.empty(0, dtype=_DTYPE)
+            return maps[0] if len(maps) == 1 else np.concatenate(maps)
+
+        rows = []
+        for path, count in self._files():
+            with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                rows.extend(_RECORD.iter_unpack(mm[_HEADER.size:_HEADER.size + count * _RECORD.size]))
+        return rows
+
+    def sightings(self):
+        """(unix time, MAC, identity or None, RSSI or None) for every record; slow for big logs"""
+        names = {}
+        for sec, ms, mac_hi, mac_lo, ident, rssi in (tuple(r) for r in self.records()):
+            if ident not in names:
+                names[ident] = identity_name(int(ident))
+            yield (int(sec) + int(ms) / 1000, _mac_str(int(mac_hi) << 32 | int(mac_lo)), names[ident],
+                   None if rssi == NO_RSSI else int(rssi))
+
+    def downsample(self, bucket=60.0, start=None, end=None) -> Downsampled:
+        """Per-droid sighting counts and mean RSSI per `bucket` seconds (per minute by default)"""
+        if np is not None:
+            return self._downsample_np(self.records(), bucket, start, end)
+        return self._downsample_py(self.records(), bucket, start, end)
+
+    def _downsample_np(self, rows, bucket, start, end):
+        sec = rows["sec"]
+        keep = np.ones(len(rows), dtype=bool)
+        if start is not None:
+            keep &= sec >= int(start)
+        if end is not None:
+            keep &= sec < end
+        if not keep.all():
+            rows = rows[keep]
+            sec = rows["sec"]
+        if not len(rows):
+            return Downsampled(start, bucket, [], [], np.zeros((0, 0), dtype=np.int64), np.zeros((0, 0)))
+
+        first = int(sec.min()) if start is None else int(start)
+        first -= first % int(bucket) if bucket >= 1 else 0
+        buckets = ((sec.astype(np.int64) - first) // bucket).astype(np.int64)
+        n_buckets = int(buckets.max()) + 1
+
+        macs, inv = np.unique(rows["mac_hi"].astype(np.uint64) << np.uint64(32) | rows["mac_lo"], return_inverse=True)
+        cell = inv.astype(np.int64) * n_buckets + buckets
+        size = len(macs) * n_buckets
+        counts = np.bincount(cell, minlength=size)
+        rssi = rows["rssi"]
+        has_rssi = rssi != NO_RSSI
+        rssi_sum = np.bincount(cell[has_rssi], weights=rssi[has_rssi], minlength=size)
+        rssi_n = np.bincount(cell[has_rssi], minlength=size)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = rssi_sum / rssi_n
+
+        # Any identified sighting names the droid
+        idents = np.zeros(len(macs), dtype=np.uint16)
+        identified = rows["identity"] != 0
+        idents[inv[identified]] = rows["identity"][identified]
+
+        return Downsampled(
+            first, bucket,
+            [_mac_str(int(m)) for m in macs],
+            [identity_name(int(i)) for i in idents],
+            counts.reshape(len(macs), n_buckets),
+            mean.reshape(len(macs), n_buckets),
+        )
+
+    def _downsample_py(self, rows, bucket, start, end):
+        rows = [r for r in rows if (start is None or r[0] >= start) and (end is None or r[0] < end)]
+        if not rows:
+            return Downsampled(start, bucket, [], [], [], [])
+
+        first = min(r[0] for r in rows) if start is None else int(start)
+        first -= first % int(bucket) if bucket >= 1 else 0
+        index, idents, cells = {}, [], {}
+        n_buckets = 0
+        for sec, _, mac_hi, mac_lo, ident, rssi in rows:
+            mac = mac_hi << 32 | mac_lo
+            i = index.get(mac)
+            if i is None:
+                i = index[mac] = len(idents)
+                idents.append(0)
+            if ident:
+                idents[i] = ident
+            b = int((sec - first) // bucket)
+            n_buckets = max(n_buckets, b + 1)
+            cell = cells.get((i, b))
+            if cell is None:
+                cell = cells[(i, b)] = [0, 0, 0]
+            cell[0] += 1
+            if rssi != NO_RSSI:
+                cell[1] += rssi
+                cell[2] += 1
+
+        # Sorted by MAC, like the NumPy path
+        order = sorted(index.items())
+        counts = [[0] * n_buckets for _ in order]
+        mean = [[math.nan] * n_buckets for _ in order]
+        row_of = {i: n for n, (_, i) in enumerate(order)}
+        for (i, b), (count, total, n) in cells.items():
+            counts[row_of[i]][b] = count
+            if n:
+                mean[row_of[i]][b] = total / n
+        return Downsampled(
+            first, bucket,
+            [_mac_str(mac) for mac, _ in order],
+            [identity_name(idents[i]) for _, i in order],
+            counts, mean,
+        )
@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+sniffer.py - Listens for park location beacons and tracks the nearest active one
+"""
+
+import collections
+import threading
+import time
+
+from decoder import LocationInfo, decode_batch, threshold_name
+from dicts import BEACON_PROTOCOL
+from radio import RadioGate
+
+# Reports are collected for this long and then decoded together (seconds)
+BATCH_INTERVAL = 0.05
+# A location counts as nearby while it was heard within this window (seconds)
+NEARBY_WINDOW = 10.0
+# Detections kept for display
+DETECTION_LOG_SIZE = 50
+# Scan source sessions are restarted this often (seconds)
+SNIFF_WINDOW = 30.0
+
+Beacon = collections.namedtuple("Beacon", ["mac", "location", "rssi", "last_seen", "reports"])
+
+# ----------------------------------------------------------------------
+# Location Sniffer
+# ----------------------------------------------------------------------
+class LocationSniffer:
+    """
+    Receives manufacturer 0x0183 advertisements from a scan source (or the
+    controller's device cache) and keeps the type 0x0A location beacons.
+    Reports are queued by the scanning thread and decoded in batches on a
+    worker thread; repeats of a payload a beacon already sent only refresh
+    its RSSI and last-seen time instead of being decoded again. Listening
+    only uses the radio while `gate` is open.
+    """
+
+    def __init__(self, bt_controller, source=None, gate=None):
+        self.bt = bt_controller
+        self.source = source
+        self.gate = gate or RadioGate()
+        self.running = False
+        self.beacons = {}
+        self.detections = collections.deque(maxlen=DETECTION_LOG_SIZE)
+        self._last_payload = {}
+        self._pending = collections.deque()
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._listener = None
+        self._decoder = None
+
+        self.reports = 0
+        self.duplicates = 0
+        self.decoded = 0
+        self.batches = 0
+        self._started = None
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        self._stop.clear()
+        # Each visit starts clean: no stale beacons, and stats cover this session only
+        with self._lock:
+            self.beacons = {}
+            self._last_payload = {}
+            self._pending.clear()
+            self.reports = self.duplicates = self.decoded = self.batches = 0
+        self._started = time.monotonic()
+        self._listener = threading.Thread(target=self._listen_thread, name="SnifferListen", daemon=True)
+        self._listener.start()
+        self._decoder = threading.Thread(target=self._decode_thread, name="SnifferDecode", daemon=True)
+        self._decoder.start()
+
+    def stop(self, timeout=2.0):
+        """Stops listening, freeing the scan source, and waits for the decode thread to drain the queue"""
+        was_running = self._started is not None and not self._stop.is_set()
+        self._stop.set()
+        self.running = False
+        for worker in (self._listener, self._decoder):
+            if worker is not None:
+                worker.join(timeout)
+        self._listener = self._decoder = None
+        if was_running:
+            s = self.stats()
+            print(f"[SNIFF] Stopped: {s['reports']} reports ({s['duplicates']} duplicates) "
+                  f"in {s['batches']} batches, {s['ingest_rate']:.0f} reports/s")
+
+    # ------------------------------------------------------------------
+    # Ingest
+    # ------------------------------------------------------------------
+    def feed(self, mac, data, rssi):
+        """Queues one manufacturer data report; safe to call from any thread"""
+        self._pending.append((mac, bytes(data), rssi, time.monotonic()))
+
+    def _on_advert(self, advert):
+        data = advert.manufacturer_data.get(BEACON_PROTOCOL["MFG_ID"])
+        if data is not None:
+            self.feed(advert.mac, data, advert.rssi)
+
+    def _listen_thread(self):
+        try:
+            self.bt.power_on()
+            while self.source is not None and not self._stop.is_set():
+                try:
+                    for _, stop in self.gate.bursts(self._stop):
+                        self.source.scan(SNIFF_WINDOW, self._on_advert, stop_event=stop)
+                except OSError as e:
+                    print(f"[SNIFF] Scan source failed ({e}), falling back to the controller")
+                    self.source = None
+            if not self._stop.is_set():
+                self._listen_controller()
+        except Exception as e:
+            print(f"[SNIFF] Listen error: {e}")
+        finally:
+            self.running = False
+
+    def _listen_controller(self):
+        devices = getattr(self.bt, "devices", None)
+        if devices is None:
+            print("[SNIFF] Sniffing needs a scan source or a controller with a live device cache")
+            return
+
+        def on_event(event):
+            if event.prop != "ManufacturerData" or event.kind == "DEL":
+                return
+            data = event.value.get(BEACON_PROTOCOL["MFG_ID"])
+            if data is not None:
+                self.feed(event.mac, data, devices.get(event.mac).get("RSSI"))
+
+        devices.subscribe(on_event)
+        try:
+            for _, stop in self.gate.bursts(self._stop):
+                self.bt.start_scanning()
+                try:
+                    stop.wait()
+                finally:
+                    self.bt.stop_scanning()
+        finally:
+            devices.unsubscribe(on_event)
+
+    # ------------------------------------------------------------------
+    # Batch decoding
+    # ------------------------------------------------------------------
+    def _decode_thread(self):
+        while not self._stop.wait(BATCH_INTERVAL):
+            self.process_pending()
+        self.process_pending()
+
+    def process_pending(self):
+        """Decodes everything queued so far in one batch"""
+        count = len(self._pending)
+        if not count:
+            return
+        batch = [self._pending.popleft() for _ in range(count)]
+
+        # Collapse identical reports, keeping the newest RSSI
+        latest = {}
+        for mac, data, rssi, seen in batch:
+            key = (mac, data)
+            previous = latest.get(key)
+            latest[key] = (rssi, seen, previous[2] + 1 if previous else 1)
+
+        fresh = [key for key in latest if self._last_payload.get(key[0]) != key[1]]
+        decoded = dict(zip(fresh, decode_batch([data for _, data in fresh]))) if fresh else {}
+
+        with self._lock:
+            for (mac, data), (rssi, seen, reports) in latest.items():
+                if (mac, data) in decoded:
+                    self._last_payload[mac] = data
+                    info = decoded[(mac, data)]
+                    if not isinstance(info, LocationInfo):
+                        self.beacons.pop(mac, None)
+                        continue
+                    self._log_detection(mac, info, rssi)
+                    previous = self.beacons.get(mac)
+                    total = reports + (previous.reports if previous else 0)
+                    self.beacons[mac] = Beacon(mac, info, rssi, seen, total)
+                else:
+                    beacon = self.beacons.get(mac)
+                    if beacon is not None:
+                        self.beacons[mac] = beacon._replace(
+                            rssi=rssi if rssi is not None else beacon.rssi,
+                            last_seen=seen,
+                            reports=beacon.reports + reports,
+                        )
+
+            # Counted only once the batch is visible, so stats() never runs ahead of the beacons
+            self.duplicates += count - len(fresh)
+            self.decoded += len(fresh)
+            self.reports += count
+            self.batches += 1
+
+    def _log_detection(self, mac, info, rssi):
+        name = info.name or f"Unknown location {info.location_id}"
+        threshold = threshold_name(info.rssi_threshold) or f"{info.rssi_threshold} dBm"
+        entry = (
+            f"{name} (ID {info.location_id}) from {mac}: cooldown {info.cooldown_s}s, "
+            f"threshold {threshold}, {'active' if info.active else 'inactive'}, RSSI {rssi}"
+        )
+        self.detections.appendleft((time.time(), entry))
+        print(f"[SNIFF] {entry}")
+
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+    def nearby(self, window=NEARBY_WINDOW) -> list:
+        """Location beacons heard within `window` seconds, strongest first"""
+        cutoff = time.monotonic() - window
+        with self._lock:
+            beacons = [b for b in self.beacons.values() if b.last_seen >= cutoff]
+        return sorted(beacons, key=lambda b: b.rssi if b.rssi is not None else -1000, reverse=True)
+
+    def nearest_active(self):
+        """The strongest active location beacon nearby, or None"""
+        for beacon in self.nearby():
+            if beacon.location.active:
+                return beacon
+        return None
+
+    def stats(self) -> dict:
+        elapsed = time.monotonic() - self._started if self._started else 0.0
+        with self._lock:
+            return {
+                "reports": self.reports,
+                "duplicates": self.duplicates,
+                "decoded": self.decoded,
+                "batches": self.batches,
+                "beacons": len(self.beacons),
+                "ingest_rate": self.reports / elapsed if elapsed > 0 else 0.0,
+            }
@@ -3,7 +3,6 @@
 toolbox.py - Backend logic manager for navigation and actions
 """
 
-import asyncio
 import os
 import random
 import time
@@ -16,14 +15,19 @@ import sdl2.ext
 # ----------------------------------------------------------------------
 # Local imports
 # ----------------------------------------------------------------------
-from bluetoothctl import BluetoothCtl
+from adapters import AdapterRegistry
 from input import Input
-from scan import ScanManager
-from beacon import BeaconManager
+from scan import ScanManager, create_scan_source
+from sniffer import LocationSniffer
+from beacon import BeaconManager, load_playlists
+from droidcache import KnownDroidCache
+from sightings import SightingLog
 from connect import ConnectionManager
 from options import OptionsManager
+from radar import RadarView, faction_of
+from radio import RadioArbiter, RadioGate
 from remote import RemoteControl
-from ui import UserInterface
+from ui import UserInterface, HEADER_HEIGHT, FOOTER_HEIGHT, BUTTON_AREA_HEIGHT
 
 from dicts import (
     FAVORITES,
@@ -33,6 +37,7 @@ from dicts import (
     COMMANDS,
     CONTROLLER_PROFILES,
     AUDIO_GROUPS,
+    RADAR_COLORS,
     UI_STRINGS,
     UI_BUTTONS,
     UI_THEMES
@@ -45,25 +50,61 @@ class DroidToolbox:
     def __init__(self) -> None:
         self.input = Input()
         self.ui = UserInterface()
-        self.bt = BluetoothCtl()
+        self.adapters = AdapterRegistry()
+        self.bt = self.adapters.controller("scan")
         self._lock = threading.Lock()
 
         # Managers
         self.options_mgr = OptionsManager(self.ui)
+        # The radio arbiter pauses scans, presence and sniffing through this, whatever the scan source
+        self.scan_gate = RadioGate()
         self.scan_mgr = ScanManager(
-            self.bt, lock=self._lock, favorites=self.options_mgr.get_favorites_dict(), progress_callback=self._show_progress
+            self.bt, lock=self._lock, favorites=self.options_mgr.get_favorites_dict(), progress_callback=self._show_progress,
+            source=create_scan_source(adapter=self.adapters.adapter_name("scan"), controller=self.bt),
+            known=KnownDroidCache(), sightings=SightingLog(), gate=self.scan_gate
         )
-        self.beacon_mgr = BeaconManager(self.bt)
-        self.conn_mgr = ConnectionManager()
+        # Reuses the scan source; the sniffer and the scan view never run together
+        self.sniffer = LocationSniffer(self.bt, source=self.scan_mgr.source, gate=self.scan_gate)
+        self.beacon_mgr = BeaconManager(self.adapters.controller("advertise"))
+        self.conn_mgr = ConnectionManager(adapter=self.adapters.adapter_name("connect"))
+        # BLEDevices from a bleak scan are only valid on the adapter that saw them
+        if hasattr(self.scan_mgr.source, "device") and self.adapters.shared("scan", "connect"):
+            self.conn_mgr.device_lookup = self.scan_mgr.source.device
         self.remote = RemoteControl(self.conn_mgr)
+        self.conn_mgr.remote_control = self.remote
+        # Radar fills the left of the screen between the header and the buttons
+        radar_top = HEADER_HEIGHT + 10
+        radar_radius = (self.ui.screen_height - FOOTER_HEIGHT - BUTTON_AREA_HEIGHT - radar_top) // 2
+        self.radar = RadarView(self.ui, (20 + radar_radius, radar_top + radar_radius), radar_radius)
+        self.radar_mac = None
         self.active_profile = None
 
+        # Shares radio time between roles that run on the same adapter
+        self.radio = RadioArbiter()
+        self.radio.register(
+            "connection", self.adapters.adapter_name("connect"),
+            is_active=lambda: self.conn_mgr.is_connecting or self.conn_mgr.is_connected,
+        )
+        self.radio.register(
+            "advertise", self.adapters.adapter_name("advertise"),
+            is_active=lambda: self.beacon_mgr.is_active,
+            pause=self.beacon_mgr.pause, resume=self.beacon_mgr.resume,
+        )
+        self.radio.register(
+            "scan", self.adapters.adapter_name("scan"),
+            is_active=lambda: self.scan_mgr.scanning or self.scan_mgr.tracking or self.sniffer.running,
+            pause=self.scan_gate.pause, resume=self.scan_gate.resume,
+        )
+        self.radio.start()
+
         # Menu Map
         self.view_map = {
             "main": (self._render_main, self._update_main),
             "options": (self._render_options, self._update_options),
             "scan": (self._render_scan, self._update_scan),
+            "radar": (self._render_radar, self._update_radar),
             "beacon": (self._render_beacon, self._update_beacon),
+            "sniff": (self._render_sniff, self._update_sniff),
             "connect": (self._render_connect, self._update_connect),
             "connected": (self._render_connected, self._update_connected),
             "audio": (self._render_audio_menu, self._update_audio_menu),
@@ -83,6 +124,7 @@ class DroidToolbox:
         self.script_idx = 0
         
         self.beacon_selection = []
+        self.beacon_playlists = []
         self.options_selection = []
         self.audio_group_selected = None
         self.current_view = "main"
@@ -116,7 +158,7 @@ class DroidToolbox:
             cfg = UI_BUTTONS.get(key)
             if cfg:
                 self.ui.buttons_config.append({
-                    "key": cfg["btn"],
+                    "key": cfg.get("glyph", cfg["btn"]),
                     "label": cfg["label"],
                     "color": color_map.get(cfg["color_ref"], self.ui.c_text)
                 })
@@ -124,8 +166,12 @@ class DroidToolbox:
     def _reset_bluetooth_adapter(self):
         if self.conn_mgr.is_connecting or self.conn_mgr.is_connected:
                     return
+        # Beacons keep running across views; the radio arbiter shares the adapter with scans
         self.scan_mgr.stop_scan()
-        self.beacon_mgr.stop()
+        self.scan_mgr.stop_presence()
+        self.sniffer.stop()
+        # The sniffer reuses the scan source, so the scan threads must be gone first
+        self.scan_mgr.join_workers()
         time.sleep(0.3)
 
     def _monitor_input(self) -> None:
@@ -151,6 +197,8 @@ class DroidToolbox:
         elif target == "beacon":
             self.beacon_selection = []
             self.beacon_idx = 0
+        elif target == "sniff":
+            self.sniffer.start()
         elif target == "exit":
             self.running = False
 
@@ -199,6 +247,10 @@ class DroidToolbox:
                     label = f"[{personality}] {identity} ({mac[-5:]})"
                 else:
                     label = f"{identity} ({mac[-5:]})"
+                if item.get("rssi") is not None:
+                    label = f"{label} {item['rssi']} dBm"
+                if item.get("stale"):
+                    label = f"{label} {UI_STRINGS['SCAN_STALE']}"
             
             else:
                 label = str(item)
@@ -241,7 +293,7 @@ class DroidToolbox:
         self.ui.draw_header(UI_STRINGS["MAIN_HEADER"])
         status = self._get_active_status(UI_STRINGS["MAIN_FOOTER"])
         self.ui.draw_status_footer(status)
-        menu_items = [UI_STRINGS["MAIN_SCAN"], UI_STRINGS["MAIN_BEACON"], UI_STRINGS["MAIN_CONNECT"], UI_STRINGS["MAIN_OPTIONS"], UI_STRINGS["MAIN_EXIT"]]
+        menu_items = [UI_STRINGS["MAIN_SCAN"], UI_STRINGS["MAIN_BEACON"], UI_STRINGS["MAIN_SNIFF"], UI_STRINGS["MAIN_CONNECT"], UI_STRINGS["MAIN_OPTIONS"], UI_STRINGS["MAIN_EXIT"]]
         
         self._render_menu_list(menu_items, self.main_idx)
 
@@ -249,13 +301,13 @@ class DroidToolbox:
         self.ui.draw_buttons()
 
     def _update_main(self):
-        menu_items = [UI_STRINGS["MAIN_SCAN"], UI_STRINGS["MAIN_BEACON"], 
+        menu_items = [UI_STRINGS["MAIN_SCAN"], UI_STRINGS["MAIN_BEACON"], UI_STRINGS["MAIN_SNIFF"],
                           UI_STRINGS["MAIN_CONNECT"], UI_STRINGS["MAIN_OPTIONS"], UI_STRINGS["MAIN_EXIT"]]
             
         self.main_idx = self.input.ui_handle_navigation(self.main_idx, 1, len(menu_items))
 
         if self.input.ui_key("A"):
-            views = ["scan", "beacon", "connect", "options", "exit"]
+            views = ["scan", "beacon", "sniff", "connect", "options", "exit"]
             self._change_view(views[self.main_idx])
         elif self.input.ui_key("B"):
             self.running = False
@@ -361,13 +413,27 @@ class DroidToolbox:
     # ----------------------------------------------------------------------
     def _render_scan(self):
         self.ui.draw_header(UI_STRINGS["SCAN_HEADER"])
-        items = self.scan_mgr.get_results()
+        items = self._scan_items()
 
-        if self.scan_mgr.scanning:
+        if self.scan_mgr.tracking:
+            status_msg = UI_STRINGS["SCAN_TRACKING"].format(count=len(items))
+        elif self.scan_mgr.scanning:
             self.ui.spin()
-            status_msg = UI_STRINGS['SCAN_MSG']
+            # Results stream in while scanning, so show how quickly the first one arrived
+            first = self.scan_mgr.first_result_s
+            if items and first is not None:
+                status_msg = UI_STRINGS["SCAN_LIVE"].format(count=len(items), first=first)
+            else:
+                status_msg = UI_STRINGS['SCAN_MSG']
+        elif items:
+            # Say how long the last scan ran and what ended it
+            session = self.scan_mgr.session
+            if session is not None and session.reason and not session.cancelled:
+                status_msg = UI_STRINGS["SCAN_DONE"].format(duration=session.duration, reason=session.reason)
+            else:
+                status_msg = UI_STRINGS["SCAN_PROMPT"]
         else:
-            status_msg = UI_STRINGS["SCAN_PROMPT"] if items else UI_STRINGS["SCAN_NONE"]
+            status_msg = UI_STRINGS["SCAN_NONE"]
         
         # Apply the helper here
         status = self._get_active_status(status_msg)
@@ -377,11 +443,17 @@ class DroidToolbox:
             self.idx = min(self.idx, len(items) - 1)
             self._render_menu_list(items, self.idx)
 
-        self._set_buttons("SELECT", "FAV", "SCAN", "BACK")
+        self._set_buttons("SELECT", "FAV", "SCAN", "TRACK", "RADAR", "BACK")
         self.ui.draw_buttons()
 
+    def _scan_items(self):
+        """Live presence rows (nearest first) while tracking, otherwise the last scan"""
+        if self.scan_mgr.tracking:
+            return self.scan_mgr.get_presence()
+        return self.scan_mgr.get_results()
+
     def _update_scan(self):
-        items = self.scan_mgr.get_results()
+        items = self._scan_items()
         selected = items[self.idx] if items else None
 
         if selected:
@@ -409,20 +481,136 @@ class DroidToolbox:
                 daemon=True
             ).start()
 
-        if self.input.ui_key("X"):
+        if self.input.ui_key("X") and not self.scan_mgr.tracking:
             self.scan_mgr.start_scan()
             self._show_progress(UI_STRINGS["SCAN_MSG"])
 
+        elif self.input.ui_key("START"):
+            if self.scan_mgr.tracking:
+                self.scan_mgr.stop_presence()
+            else:
+                self.scan_mgr.start_presence()
+
+        elif self.input.ui_key("SELECT"):
+            # The radar plots presence rows, so it always tracks; start_presence() ends the scan first
+            self.scan_mgr.start_presence()
+            self.radar_mac = selected["mac"] if selected else None
+            self.current_view = "radar"
+
         elif self.input.ui_key("B"):
             self._reset_to_main()
 
+    # ----------------------------------------------------------------------
+    # Radar
+    # ----------------------------------------------------------------------
+    def _render_radar(self):
+        self.ui.draw_header(UI_STRINGS["RADAR_HEADER"])
+        rows = self.scan_mgr.get_presence()
+
+        selected = next((r for r in rows if r["mac"] == self.radar_mac), None)
+        if selected is None and rows:
+            selected = rows[0]
+            self.radar_mac = selected["mac"]
+        self.radar.draw(rows, self.radar_mac, ttl=self.scan_mgr.presence.ttl)
+
+        # Legend: blip colour and count per faction
+        counts = {}
+        for row in rows:
+            faction = faction_of(row.get("identity"))
+            counts[faction] = counts.get(faction, 0) + 1
+        x = self.ui.screen_width // 2 + 100
+        y = HEADER_HEIGHT + 20
+        for faction, rgb in RADAR_COLORS.items():
+            self.ui.draw_rectangle((x, y + 2, 10, 10), fill=sdl2.SDL_Color(*rgb, 255))
+            label = UI_STRINGS["RADAR_LEGEND"].format(faction=faction or UI_STRINGS["UNKNOWN"], count=counts.get(faction, 0))
+            self.ui.draw_text((x + 16, y), label)
+            y += 20
+
+        if selected:
+            name = selected.get("nickname") or selected.get("identity") or "Droid"
+            status_msg = UI_STRINGS["RADAR_SELECTED"].format(name=name, mac=selected["mac"][-5:], rssi=selected["rssi"])
+        else:
+            status_msg = UI_STRINGS["RADAR_EMPTY"]
+        self.ui.draw_status_footer(self._get_active_status(status_msg))
+
+        self._set_buttons("FAV", "BACK")
+        self.ui.draw_buttons()
+
+    def _update_radar(self):
+        rows = self.scan_mgr.get_presence()
+        macs = [r["mac"] for r in rows]
+        if macs:
+            idx = macs.index(self.radar_mac) if self.radar_mac in macs else 0
+            self.radar_mac = macs[self.input.ui_handle_navigation(idx, 1, len(macs))]
+
+            if self.input.ui_key("Y"):
+                selected = rows[macs.index(self.radar_mac)]
+                mac = selected["mac"]
+                if self.options_mgr.has_favorite(mac):
+                    self.options_mgr.delete_favorite(mac)
+                    self._show_progress(UI_STRINGS["FAVORITES_DELCONF"])
+                else:
+                    nickname = selected.get("nickname") or selected.get("identity") or "Droid"
+                    self.options_mgr.save_favorite(mac, nickname, selected.get("personality", "Default"),
+                                                   selected.get("controller_profile"))
+                    self._show_progress(UI_STRINGS["FAVORITES_SAVED"])
+
+        if self.input.ui_key("B"):
+            # Back to the list, still tracking
+            self.idx = macs.index(self.radar_mac) if self.radar_mac in macs else 0
+            self.current_view = "scan"
+
+    # ----------------------------------------------------------------------
+    # Location Sniffer
+    # ----------------------------------------------------------------------
+    def _render_sniff(self):
+        self.ui.draw_header(UI_STRINGS["SNIFF_HEADER"])
+        beacons = self.sniffer.nearby()
+
+        nearest = self.sniffer.nearest_active()
+        if nearest:
+            status_msg = UI_STRINGS["SNIFF_NEAREST"].format(name=self._location_name(nearest), rssi=nearest.rssi)
+        else:
+            self.ui.spin()
+            status_msg = f"{UI_STRINGS['SNIFF_LISTENING']} {self.ui.spinner_frame}"
+        self.ui.draw_status_footer(self._get_active_status(status_msg))
+
+        if beacons:
+            items = [
+                UI_STRINGS["SNIFF_ITEM"].format(
+                    name=self._location_name(b),
+                    state="on" if b.location.active else "off",
+                    rssi=b.rssi,
+                    cooldown=b.location.cooldown_s,
+                )
+                for b in beacons
+            ]
+            self.idx = min(self.idx, len(items) - 1)
+            self._render_menu_list(items, self.idx)
+
+        self._set_buttons("BACK")
+        self.ui.draw_buttons()
+
+    def _location_name(self, beacon):
+        return beacon.location.name or f"Location {beacon.location.location_id}"
+
+    def _update_sniff(self):
+        count = len(self.sniffer.nearby())
+        if count:
+            self.idx = self.input.ui_handle_navigation(self.idx, 1, count)
+        if self.input.ui_key("B"):
+            self._reset_to_main()
+
     # ----------------------------------------------------------------------
     # Beacon Menu
     # ----------------------------------------------------------------------
     def _render_beacon(self):
         if not self.beacon_selection:
-            items = ["Location Beacons"] + list(FACTIONS.keys())
+            items = ["Location Beacons"] + list(FACTIONS.keys()) + ["Playlists"]
             header = UI_STRINGS["BEACON_HEADER_MAIN"]
+        elif self.beacon_selection[0] == "Playlists":
+            items = [p.name for p in self.beacon_playlists] or [UI_STRINGS["BEACON_PLAYLISTS_EMPTY"]]
+            header = UI_STRINGS["BEACON_HEADER_PLAYLISTS"]
         elif self.beacon_selection[0] == "Location Beacons":
             items = [v[1] for v in LOCATIONS.values()]
             header = UI_STRINGS["BEACON_HEADER_LOCATIONS"]
@@ -433,12 +621,20 @@ class DroidToolbox:
 
         self.ui.draw_header(header)
         
-        status_msg = UI_STRINGS["BEACON_FOOTER"].format(status=self.beacon_mgr.current_active)
+        interval = self.beacon_mgr.debug_interval
+        if interval:
+            status_msg = UI_STRINGS["BEACON_FOOTER_TUNED"].format(status=self.beacon_mgr.current_active,
+                                                                  interval=interval)
+        else:
+            status_msg = UI_STRINGS["BEACON_FOOTER"].format(status=self.beacon_mgr.current_active)
         status = self._get_active_status(status_msg)
         self.ui.draw_status_footer(status)
             
         self._render_menu_list(items, self.beacon_idx)
-        self._set_buttons("SELECT", "BACK", "STOP")
+        if self.beacon_selection and self.beacon_selection[0] != "Playlists":
+            self._set_buttons("SELECT", "BACK", "STOP", "ADD")
+        else:
+            self._set_buttons("SELECT", "BACK", "STOP")
         self.ui.draw_buttons()
         self._beacon_items_cache = items
 
@@ -459,25 +655,43 @@ class DroidToolbox:
         items = getattr(self, "_beacon_items_cache", [])
         self.beacon_idx = self.input.ui_handle_navigation(self.beacon_idx, 1, len(items))
 
+        adding = self.input.ui_key("Y")
+        if adding and items and self.beacon_selection and self.beacon_selection[0] != "Playlists":
+            self._start_beacon(items[self.beacon_idx], add=True)
+            return
+
         if self.input.ui_key("A") and items:
             selected = items[self.beacon_idx]
             if not self.beacon_selection:
                 self.beacon_selection.append(selected)
                 self.beacon_idx = 0
+                if selected == "Playlists":
+                    self.beacon_playlists = load_playlists()
+            elif self.beacon_selection[0] == "Playlists" and not self.beacon_playlists:
+                return
             else:
                 self._reset_bluetooth_adapter()
                 self._start_beacon(selected)
 
-    def _start_beacon(self, selected_name):
+    def _start_beacon(self, selected_name, add=False):
+        """Starts the selected beacon, or with `add` puts it on air next to the running ones"""
         time.sleep(0.1)
 
-        if self.beacon_selection[0] == "Location Beacons":
+        if self.beacon_selection[0] == "Playlists":
+            self.beacon_mgr.start_playlist(self.beacon_playlists[self.beacon_idx])
+        elif self.beacon_selection[0] == "Location Beacons":
             loc_id = next(k for k, v in LOCATIONS.items() if v[1] == selected_name)
-            self.beacon_mgr.start_location(loc_id, selected_name)
+            if add:
+                self.beacon_mgr.add_location(loc_id, selected_name)
+            else:
+                self.beacon_mgr.start_location(loc_id, selected_name)
         else:
             faction = self.beacon_selection[0]
             droid_id = next(i for i, d in DROIDS[faction].items() if d["name"] == selected_name)
-            self.beacon_mgr.start_droid(faction, droid_id, selected_name)
+            if add:
+                self.beacon_mgr.add_droid(faction, droid_id, selected_name)
+            else:
+                self.beacon_mgr.start_droid(faction, droid_id, selected_name)
 
     # ----------------------------------------------------------------------
     # Connect Menu (Select a Favorite)
@@ -580,23 +794,8 @@ class DroidToolbox:
         print(f"[CONN] Initiating disconnect from: {self.conn_mgr.active_name}")
         self.conn_mgr.is_connecting = False
         
-        if self.conn_mgr.is_connected and self.conn_mgr.conn:
-            def perform_disconnect():
-                try:
-                    loop = self.conn_mgr.conn.loop
-                    if loop and loop.is_running():
-                        future = asyncio.run_coroutine_threadsafe(
-                            self.conn_mgr.conn.disconnect(), 
-                            loop
-                        )
-                        future.result(timeout=2.0)
-                except Exception as e:
-                    print(f"Disconnect error: {e}")
-
-            threading.Thread(target=perform_disconnect, daemon=True).start()
-
-        self.conn_mgr.active_mac = None
-        self.conn_mgr.active_name = None
+        # Runs on the BLE loop; its outcome is logged and lands in the connection stats
+        self.conn_mgr.disconnect_droid()
         self._reset_to_main(UI_STRINGS["CONN_DISCONNECTED"])
 
     # ----------------------------------------------------------------------
@@ -660,7 +859,7 @@ class DroidToolbox:
 
     def _update_remote_menu(self):
         if self.input.ui_key("B"):
-            threading.Thread(target=self.conn_mgr.remote_stop, daemon=True).start()
+            self.conn_mgr.remote_stop()
             self.submenu = None
             return
 
@@ -672,7 +871,7 @@ class DroidToolbox:
             self.remote.process(self.active_profile, self.input)
         except Exception as e:
             print(f"CRITICAL: Remote Logic Crash: {e}")
-            threading.Thread(target=self.conn_mgr.remote_stop, daemon=True).start()
+            self.conn_mgr.remote_stop()
 
     def _draw_controller_telemetry(self):
         self.input.update_smoothing()
@@ -756,6 +955,27 @@ class DroidToolbox:
 
     def cleanup(self) -> None:
         self.running = False
-        self.beacon_mgr.stop()
-        if self.conn_mgr.is_connected:
-            threading.Thread(target=self.conn_mgr.disconnect_droid, daemon=True).start()
\ No newline at end of file
+        self.scan_mgr.stop_presence()
+        self.sniffer.stop()
+        if self.scan_mgr.known is not None:
+            self.scan_mgr.known.save()
+        if self.scan_mgr.sightings is not None:
+            self.scan_mgr.sightings.close()
+        self.radar.close()
+        self.radio.close()
+        for name, s in self.radio.stats().items():
+            print(f"[RADIO] {name}: {s['duty'] * 100:.0f}% duty over {s['active_s']:.1f} s, {s['pauses']} pauses")
+        self.beacon_mgr.close()
+        s = self.beacon_mgr.stats()
+        if s["jobs"]:
+            print(f"[BEACON] {s['jobs']} scheduled jobs, lateness mean {s['mean_ms']:.2f} ms, "
+                  f"p99 {s['p99_ms']:.2f} ms, max {s['max_ms']:.2f} ms; "
+                  f"{s['instances']} advertising instance(s), {s['mux_switches']} time-shared turns")
+        self.conn_mgr.close()
+        s = self.conn_mgr.stats()
+        for name, c in s["commands"].items():
+            print(f"[BLE] {name}: {c['count']} sent, {c['failed']} failed, "
+                  f"mean {c['mean_ms']:.1f} ms (queued {c['queued_ms']:.1f}), p95 {c['p95_ms']:.1f} ms")
+        print(f"[BLE] Loop lag mean {s['lag_mean_ms']:.2f} ms, max {s['lag_max_ms']:.1f} ms, "
+              f"{s['slow_callbacks']} slow callbacks")
+        self.adapters.close()
\ No newline at end of file
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+bench_advertising.py - Payload switch latency and rate of the advertising engine
+
+Compares in-place ManufacturerData updates against unregistering and
+re-registering the advertisement for every switch, using the fake
+LEAdvertisingManager1 in MockBluezBus.
+"""
+
+import argparse
+import asyncio
+import time
+
+from droids import make_population
+from mockbus import MockBluezBus
+
+from advertising import AdvertisingEngine
+
+async def run(strategy, payloads, latency):
+    bus = MockBluezBus(population=[], latency=latency)
+    engine = AdvertisingEngine(bus)
+    await engine.update(0x0183, payloads[0])
+
+    start = time.perf_counter()
+    for data in payloads[1:]:
+        if strategy == "teardown":
+            await engine.stop()
+        await engine.update(0x0183, data)
+    elapsed = time.perf_counter() - start
+    await engine.stop()
+
+    switches = len(payloads) - 1
+    return {
+        "strategy": strategy,
+        "switches": switches,
+        "rate_hz": switches / elapsed,
+        "off_air_ms": bus.off_air_seconds * 1000,
+        "engine": engine.stats(),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--switches", type=int, default=500)
+    parser.add_argument("--bus-latency", type=float, default=0.0005,
+                        help="simulated per-call D-Bus round trip in seconds")
+    args = parser.parse_args()
+
+    population = make_population(args.switches + 1)
+    payloads = [d["mfg_data"] for d in population]
+
+    for strategy in ("in-place", "teardown"):
+        r = asyncio.run(run(strategy, payloads, args.bus_latency))
+        print(f"{r['strategy']:<9} switches={r['switches']:<5} rate={r['rate_hz']:8.1f} Hz   "
+              f"off-air={r['off_air_ms']:8.2f} ms")
+        if r["engine"]["switches"]:
+            print(f"          switch latency mean={r['engine']['mean_ms']:.3f} ms   "
+                  f"p95={r['engine']['p95_ms']:.3f} ms   sustainable={r['engine']['max_rate_hz']:.0f} Hz")
+
+if __name__ == "__main__":
+    main()
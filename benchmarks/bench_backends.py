@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+bench_backends.py - Compares the bluetoothctl and D-Bus controller backends
+
+The bluetoothctl backend drives fake_bluetoothctl.py, the D-Bus backend talks
+to MockBluezBus, so neither needs a radio.
+"""
+
+import argparse
+import os
+import statistics
+import time
+
+from droids import make_population
+from mockbus import MockBluezBus
+
+from bluetoothctl import BluetoothCtl
+from bluez import BluezDBus
+
+FAKE_BLUETOOTHCTL = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fake_bluetoothctl.py")
+
+def _time_calls(fn, args_list):
+    samples = []
+    for args in args_list:
+        start = time.perf_counter()
+        fn(*args)
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+def _summary(samples):
+    return f"mean {statistics.mean(samples):8.2f} ms   max {max(samples):8.2f} ms   n={len(samples)}"
+
+def bench(controller, macs, rounds):
+    return {
+        "power_on": _time_calls(controller.power_on, [()] * rounds),
+        "get_info": _time_calls(controller.get_info, [(mac,) for mac in macs[:rounds]]),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--bus-latency", type=float, default=0.0005,
+                        help="simulated per-call D-Bus round trip in seconds")
+    args = parser.parse_args()
+
+    population = make_population(max(args.rounds, 20))
+    macs = [d["mac"] for d in population]
+
+    results = {}
+    ctl = BluetoothCtl(binary=FAKE_BLUETOOTHCTL)
+    try:
+        results["bluetoothctl"] = bench(ctl, macs, args.rounds)
+    finally:
+        ctl.close()
+
+    dbus = BluezDBus(bus=MockBluezBus(population, latency=args.bus_latency))
+    try:
+        results["dbus"] = bench(dbus, macs, args.rounds)
+    finally:
+        dbus.close()
+
+    for backend, ops in results.items():
+        for op, samples in ops.items():
+            print(f"{backend:<13} {op:<9} {_summary(samples)}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+bench_beacon.py - Beacon scheduler timing jitter against the old polling loop
+
+Plays a rotating playlist on BeaconManager with short dwell times against a
+controller that timestamps every broadcast_mfg call, and reports how late
+each switch went on air relative to its deadline (the scheduler's own
+lateness stats and the spacing seen by the controller). The previous
+DroidBeacon.start_loop, which slept in 0.1 s steps between refreshes, is
+kept here as the baseline with the same refresh period, along with how
+many times each approach woke up.
+"""
+
+import argparse
+import statistics
+import threading
+import time
+
+import droids  # noqa: F401  (puts app/ on sys.path)
+
+from beacon import BeaconManager, Playlist, droid_entry, location_entry
+from dicts import DROIDS, LOCATIONS
+
+class TimingController:
+    def __init__(self):
+        self.calls = []
+
+    def broadcast_mfg(self, mfg_id, mfg_data, interval=None, tx_power=None, instance=0):
+        self.calls.append(time.monotonic())
+
+    def stop_advertising(self, instance=None):
+        pass
+
+def summary(label, late, wakeups, seconds):
+    late = sorted(late)
+    print(f"{label:10} {len(late):5} switches   lateness mean {statistics.mean(late) * 1000:7.2f} ms   "
+          f"p99 {late[int(len(late) * 0.99)] * 1000:7.2f} ms   max {late[-1] * 1000:7.2f} ms   "
+          f"{wakeups / seconds:6.1f} wakeups/s")
+
+def legacy_loop(bt, period, seconds):
+    """The old start_loop: send, then sleep(0.1) until the refresh is due"""
+    stop = threading.Event()
+    wakeups = 0
+    due = []
+
+    def loop():
+        nonlocal wakeups
+        while not stop.is_set():
+            bt.broadcast_mfg("0x0183", "0x03 0x04 0x44 0x81 0x8A 0x03")
+            end_sleep = time.time() + period
+            due.append(time.monotonic() + period)
+            while time.time() < end_sleep and not stop.is_set():
+                time.sleep(0.1)
+                wakeups += 1
+
+    thread = threading.Thread(target=loop, daemon=True)
+    thread.start()
+    time.sleep(seconds)
+    stop.set()
+    thread.join()
+    # Each send after the first is the refresh that was due `period` after the one before it
+    late = [sent - d for sent, d in zip(bt.calls[1:], due)]
+    return late, wakeups
+
+def playlist(dwell):
+    entries = [location_entry(loc_id, dwell, cooldown=0) for loc_id in LOCATIONS]
+    entries += [droid_entry(faction, droid_id, dwell) for faction, ds in DROIDS.items() for droid_id in ds]
+    return Playlist("bench", entries, True)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--dwell", type=float, default=0.25, help="seconds per playlist entry")
+    parser.add_argument("--seconds", type=float, default=10.0)
+    args = parser.parse_args()
+
+    bt = TimingController()
+    mgr = BeaconManager(bt)
+    mgr.start_playlist(playlist(args.dwell))
+    time.sleep(args.seconds)
+    mgr.stop()
+    # The controller's view: each switch should land one dwell after the first
+    first = bt.calls[0]
+    late = [t - (first + i * args.dwell) for i, t in enumerate(bt.calls)]
+    stats = mgr.stats()
+    mgr.close()
+    summary("scheduler", late[1:], stats["jobs"], args.seconds)
+    print(f"{'':10} scheduler's own stats: {stats['jobs']} jobs, mean {stats['mean_ms']:.2f} ms, "
+          f"p99 {stats['p99_ms']:.2f} ms, max {stats['max_ms']:.2f} ms")
+
+    bt = TimingController()
+    late, wakeups = legacy_loop(bt, args.dwell, args.seconds)
+    summary("polling", late, wakeups, args.seconds)
+
+if __name__ == "__main__":
+    main()
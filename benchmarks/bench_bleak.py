@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+bench_bleak.py - Replays advertisement fixtures through the bleak scan source
+
+Compares decoding manufacturer data bytes straight from BleakScanner
+callbacks with formatting and re-parsing the same data as bluetoothctl
+`info` text.
+"""
+
+import argparse
+import functools
+import threading
+import time
+
+from droids import make_population
+from fake_bleak import FakeBleakScanner, advertisement_fixtures
+
+from bleakscan import BleakScanSource
+from btevents import format_info
+from scan import DroidScanner
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--droids", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=250)
+    args = parser.parse_args()
+
+    population = make_population(args.droids)
+    fixtures = advertisement_fixtures(population)
+    decoder = DroidScanner(None)
+
+    # Bytes straight from the detection callback
+    decoded = {}
+    done = threading.Event()
+    total = len(fixtures) * args.repeat
+
+    def on_advert(advert):
+        data = advert.manufacturer_data.get(0x0183)
+        if data is not None:
+            decoded[advert.mac] = decoder._decode_manufacturer_data(data)
+        if source.reports >= total:
+            done.set()
+
+    source = BleakScanSource(
+        scanner_factory=functools.partial(FakeBleakScanner, fixtures, repeat=args.repeat)
+    )
+    start = time.perf_counter()
+    source.scan(30.0, on_advert, stop_event=done)
+    elapsed = time.perf_counter() - start
+    identified = sum(1 for v in decoded.values() if v)
+    print(f"bleak bytes  {source.reports / elapsed:12,.0f} adverts/s   "
+          f"droids={len(decoded)} identified={identified} devices kept={len(source.devices)} "
+          f"mode={'passive' if source.passive else 'active'}")
+
+    # The same payloads as bluetoothctl info text
+    texts = [format_info(d["mac"], {"Name": d["name"], "ManufacturerData": {d["mfg_id"]: d["mfg_data"]}})
+             for d in population]
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        for text in texts:
+            decoder._parse_personality(text)
+    elapsed = time.perf_counter() - start
+    print(f"info text    {len(texts) * args.repeat / elapsed:12,.0f} adverts/s")
+
+if __name__ == "__main__":
+    main()
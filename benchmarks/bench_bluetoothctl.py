@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+bench_bluetoothctl.py - End-to-end BT layer benchmark against the bluetoothctl simulator
+
+Runs BluetoothCtl and ScanManager against fake_bluetoothctl.py with a
+configurable droid population and injected command latency, and reports
+scan-to-results time, get_info throughput and advertisement switch rate.
+Before timing anything it checks that power and discovery results, which
+the simulator prints after later commands as bluetoothctl does, never end
+up in another command's output.
+"""
+
+import argparse
+import os
+import threading
+import time
+
+from droids import make_population
+
+from bluetoothctl import BluetoothCtl
+from scan import ScanManager
+
+FAKE_BLUETOOTHCTL = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fake_bluetoothctl.py")
+
+def bench_scan(duration):
+    ctl = BluetoothCtl(binary=FAKE_BLUETOOTHCTL)
+    try:
+        manager = ScanManager(ctl, threading.Lock(), {}, None)
+        start = time.perf_counter()
+        manager.start_scan(duration)
+        # The scan thread clears `scanning` once results are published
+        time.sleep(0.01)
+        while manager.scanning:
+            time.sleep(0.005)
+        elapsed = time.perf_counter() - start
+        results = manager.get_results()
+        identified = sum(1 for r in results if r["identity"] != "Droid Found")
+        return elapsed, manager.first_result_s, len(results), identified, manager.session.reason
+    finally:
+        ctl.close()
+
+def bench_cancel(duration, after=0.5):
+    """Seconds between stop_scan() and the scan thread exiting"""
+    ctl = BluetoothCtl(binary=FAKE_BLUETOOTHCTL)
+    try:
+        manager = ScanManager(ctl, threading.Lock(), {}, None)
+        manager.start_scan(duration, idle=None)
+        time.sleep(after)
+        start = time.perf_counter()
+        manager.stop_scan()
+        manager._scan_worker.join()
+        return time.perf_counter() - start
+    finally:
+        ctl.close()
+
+def bench_get_info(macs, concurrent):
+    ctl = BluetoothCtl(binary=FAKE_BLUETOOTHCTL)
+    try:
+        ctl.power_on()
+        start = time.perf_counter()
+        if concurrent:
+            # Pipelined: every info command is queued before any reply is read
+            futures = [ctl.send_command(f"info {mac}") for mac in macs]
+            for future in futures:
+                future.result(timeout=30)
+        else:
+            for mac in macs:
+                ctl.get_info(mac)
+        return len(macs) / (time.perf_counter() - start)
+    finally:
+        ctl.close()
+
+def bench_advertising(payloads):
+    ctl = BluetoothCtl(binary=FAKE_BLUETOOTHCTL)
+    try:
+        ctl.power_on()
+        start = time.perf_counter()
+        for data in payloads:
+            done = ctl.broadcast_mfg("0x0183", " ".join(f"{b:02x}" for b in data))
+            if done is not None:
+                done.result(timeout=30)
+        elapsed = time.perf_counter() - start
+        ctl.stop_advertising()
+        return len(payloads) / elapsed
+    finally:
+        ctl.close()
+
+def check_late_replies(macs):
+    """Pipelines info lookups between power and scan changes; returns (commands, misrouted lines)"""
+    ctl = BluetoothCtl(binary=FAKE_BLUETOOTHCTL)
+    try:
+        ctl.power_on()
+        assert ctl._is_powered(), "adapter not reported powered after power on"
+        sent = []
+        for i, mac in enumerate(macs):
+            change = ("scan on", "power on", "scan off", "power off")[i % 4]
+            sent.append((None, ctl.send_command(change)))
+            sent.append((mac, ctl.send_command(f"info {mac}")))
+        misrouted = []
+        for mac, future in sent:
+            for line in future.result(timeout=30):
+                # Power and scan changes print nothing of their own; their results arrive late
+                if mac is None or line.strip().startswith(("Changing", "Discovery")):
+                    misrouted.append(line.strip())
+        return len(sent), misrouted
+    finally:
+        ctl.close()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--droids", type=int, default=300)
+    parser.add_argument("--latency-ms", type=float, default=2.0,
+                        help="simulated delay before bluetoothctl answers each command")
+    parser.add_argument("--jitter-ms", type=float, default=1.0)
+    parser.add_argument("--scan-duration", type=float, default=2.0)
+    parser.add_argument("--info", type=int, default=100, help="info lookups per run")
+    parser.add_argument("--switches", type=int, default=20)
+    args = parser.parse_args()
+
+    # The simulator is spawned by BluetoothCtl and reads its setup from the environment
+    os.environ["FAKE_BT_DROIDS"] = str(args.droids)
+    os.environ["FAKE_BT_LATENCY_MS"] = str(args.latency_ms)
+    os.environ["FAKE_BT_JITTER_MS"] = str(args.jitter_ms)
+
+    population = make_population(args.droids)
+    macs = [d["mac"] for d in population[:args.info]]
+    payloads = [d["mfg_data"] for d in population[:args.switches]]
+
+    print(f"population={args.droids} droids   latency={args.latency_ms} ms (+{args.jitter_ms} ms jitter)")
+
+    commands, misrouted = check_late_replies(macs[:20])
+    print(f"late replies      {commands} commands, {len(misrouted)} misrouted lines")
+    assert not misrouted, misrouted
+
+    elapsed, first, found, identified, reason = bench_scan(args.scan_duration)
+    print(f"first result      {first if first is not None else float('nan'):8.2f} s")
+    print(f"scan-to-results   {elapsed:8.2f} s    {found} droids, {identified} identified "
+          f"(scan window {args.scan_duration} s, stopped: {reason})")
+    print(f"scan cancel       {bench_cancel(args.scan_duration) * 1000:8.1f} ms")
+
+    print(f"get_info serial   {bench_get_info(macs, concurrent=False):8.1f} lookups/s")
+    print(f"get_info pipelined{bench_get_info(macs, concurrent=True):8.1f} lookups/s")
+    print(f"advertise switch  {bench_advertising(payloads):8.1f} switches/s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+bench_connect.py - BLE loop setup cost, command latency and loop-lag flagging
+
+Compares the per-connection event loop the connection manager used to build
+(a thread, a new loop, run and close) with handing work to the persistent
+BleLoop, then connects ConnectionManager to FakeBleakClient and streams
+remote-control commands at a controller rate, reporting the latency every
+command's future recorded. Finally blocks the loop on purpose to check the
+lag probe flags it.
+"""
+
+import argparse
+import asyncio
+import functools
+import statistics
+import threading
+import time
+
+import droids  # noqa: F401  (puts app/ on sys.path)
+from fake_bleak import FakeBleakClient
+
+from bleak.backends.device import BLEDevice
+
+from connect import BleLoop, ConnectionManager, LAG_INTERVAL
+
+async def noop():
+    return True
+
+def per_connection_loop():
+    """The old _connect_thread's setup and teardown around a session that does nothing"""
+    def run():
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        try:
+            loop.run_until_complete(noop())
+        finally:
+            loop.close()
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    thread.join()
+
+def setup_costs(rounds):
+    old = []
+    for _ in range(rounds):
+        t0 = time.perf_counter()
+        per_connection_loop()
+        old.append(time.perf_counter() - t0)
+
+    ble = BleLoop()
+    new = []
+    for _ in range(rounds):
+        t0 = time.perf_counter()
+        ble.submit("noop", noop()).result()
+        new.append(time.perf_counter() - t0)
+    ble.close()
+    print(f"setup      per-connection loop {statistics.mean(old) * 1e6:8.1f} us   "
+          f"persistent loop {statistics.mean(new) * 1e6:8.1f} us")
+
+def commands(rate, seconds, write_latency):
+    device = BLEDevice("AA:BB:CC:DD:EE:01", "DROID", {})
+    mgr = ConnectionManager(client_factory=functools.partial(FakeBleakClient, write_latency=write_latency))
+    mgr.device_lookup = lambda mac: device
+    t0 = time.perf_counter()
+    mgr.connect_droid(device.address, "DROID")
+    while mgr.is_connecting:
+        time.sleep(0.001)
+    connect_s = time.perf_counter() - t0
+    if not mgr.is_connected:
+        raise SystemExit(f"fake connection failed: {mgr.last_error}")
+
+    futures = []
+    period = 1.0 / rate
+    next_tick = time.perf_counter()
+    end = next_tick + seconds
+    i = 0
+    while next_tick < end:
+        # What RemoteControl sends per frame for an R-series with the stick held
+        speed = 0.5 + 0.4 * ((i % 20) / 20)
+        futures.append(mgr.remote_throttle_left(speed))
+        futures.append(mgr.remote_throttle_right(-speed))
+        futures.append(mgr.remote_head(0.3 if i % 2 else -0.3))
+        if i % rate == 0:
+            futures.append(mgr.remote_sound_random())
+        i += 1
+        next_tick += period
+        time.sleep(max(0.0, next_tick - time.perf_counter()))
+    for future in futures:
+        if future is not None:
+            future.result(timeout=5)
+
+    stats = mgr.stats()
+    mgr.close()
+    print(f"connect    {connect_s * 1000:.0f} ms (LOGON handshake and greeting included)")
+    for name, c in stats["commands"].items():
+        print(f"{name:10} {c['count']:6} sent {c['failed']:3} failed   mean {c['mean_ms']:6.2f} ms   "
+              f"queued {c['queued_ms']:6.3f} ms   p95 {c['p95_ms']:6.2f} ms")
+    print(f"loop lag   mean {stats['lag_mean_ms']:.2f} ms   max {stats['lag_max_ms']:.2f} ms   "
+          f"{stats['slow_callbacks']} slow callbacks")
+
+def blocked_loop(block):
+    ble = BleLoop()
+    time.sleep(LAG_INTERVAL * 2)
+    ble.loop.call_soon_threadsafe(time.sleep, block)
+    time.sleep(LAG_INTERVAL * 3 + block)
+    stats = ble.stats()
+    ble.close()
+    print(f"blocked    {block * 1000:.0f} ms callback -> max lag {stats['lag_max_ms']:.0f} ms, "
+          f"{stats['slow_callbacks']} slow callback(s) flagged")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rounds", type=int, default=200)
+    parser.add_argument("--rate", type=int, default=60, help="remote control frames per second")
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--write-latency", type=float, default=0.002, help="fake GATT write time (s)")
+    parser.add_argument("--block", type=float, default=0.2, help="blocking callback for the lag check (s)")
+    args = parser.parse_args()
+
+    setup_costs(args.rounds)
+    commands(args.rate, args.seconds, args.write_latency)
+    blocked_loop(args.block)
+
+if __name__ == "__main__":
+    main()
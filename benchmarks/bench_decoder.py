@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+bench_decoder.py - Beacon decoder throughput against the previous text and byte paths
+
+The previous implementations are kept here, verbatim apart from naming, as
+the baseline: regex-parsing `bluetoothctl info` text, and the linear
+FACTIONS/DROIDS scan on raw bytes.
+"""
+
+import argparse
+import re
+import time
+
+from droids import make_population
+
+from btevents import format_info
+from decoder import decode, decode_batch, identify
+from dicts import BEACON_PROTOCOL, BEACON_TYPE, FACTIONS, DROIDS, LOCATIONS, RSSI_THRESHOLD
+
+def legacy_decode(data):
+    start = data.find(b"\x03\x04")
+    payload = data[start:start + 6] if start >= 0 else b""
+    if len(payload) < 6:
+        return None
+
+    raw_aff_byte = payload[4]
+    raw_pers_val = payload[5]
+    derived_aff_id = (raw_aff_byte - 0x80) // 2
+
+    target_f_key = None
+    for f_key, f_val in FACTIONS.items():
+        if f_val == derived_aff_id:
+            target_f_key = f_key
+            break
+
+    if target_f_key:
+        faction_droids = DROIDS.get(target_f_key, {})
+        for d_info in faction_droids.values():
+            if d_info["id"] == raw_pers_val:
+                return f"{d_info['name']} ({target_f_key})"
+        return f"Unknown ID:{hex(raw_pers_val)} ({target_f_key})"
+    return None
+
+def legacy_parse_personality(info_text):
+    if not info_text or "ManufacturerData" not in info_text:
+        return None
+    try:
+        if "ManufacturerData.Value" in info_text:
+            parts = info_text.split("ManufacturerData.Value:")[1]
+        else:
+            parts = info_text.split("ManufacturerData Value:")[1]
+
+        parts = re.split(r'AdvertisingFlags|RSSI|TxPower|ServiceData', parts)[0]
+        clean_hex = "".join(re.findall(r'[0-9a-fA-F]+', parts)).lower()
+        if len(clean_hex) % 2:
+            clean_hex = clean_hex[:-1]
+        return legacy_decode(bytes.fromhex(clean_hex))
+    except Exception:
+        return None
+
+def location_payloads(count):
+    ids = sorted(LOCATIONS)
+    return [
+        bytes([BEACON_TYPE["LOCATION"], BEACON_PROTOCOL["DATA_LEN"], ids[i % len(ids)],
+               LOCATIONS[ids[i % len(ids)]][2], RSSI_THRESHOLD["MID"], BEACON_PROTOCOL["ACTIVE_FLAG"]])
+        for i in range(count)
+    ]
+
+def rate(fn, items, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        fn(items)
+    return len(items) * rounds / (time.perf_counter() - start)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--droids", type=int, default=1000)
+    parser.add_argument("--locations", type=int, default=100)
+    parser.add_argument("--rounds", type=int, default=50)
+    args = parser.parse_args()
+
+    population = make_population(args.droids)
+    droid_payloads = [d["mfg_data"] for d in population]
+    payloads = droid_payloads + location_payloads(args.locations)
+    texts = [format_info(d["mac"], {"ManufacturerData": {d["mfg_id"]: d["mfg_data"]}}) for d in population]
+
+    # Same answers as the old path before timing anything
+    assert [identify(p) for p in droid_payloads] == [legacy_decode(p) for p in droid_payloads]
+
+    results = {
+        "legacy info text": rate(lambda xs: [legacy_parse_personality(t) for t in xs], texts, args.rounds),
+        "legacy bytes": rate(lambda xs: [legacy_decode(p) for p in xs], droid_payloads, args.rounds),
+        "identify": rate(lambda xs: [identify(p) for p in xs], droid_payloads, args.rounds),
+        "decode (mixed)": rate(lambda xs: [decode(p) for p in xs], payloads, args.rounds),
+        "decode_batch (mixed)": rate(decode_batch, payloads, args.rounds),
+    }
+
+    baseline = results["legacy info text"]
+    for name, value in results.items():
+        print(f"{name:<24} {value:14,.0f} payloads/s   {value / baseline:6.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+bench_hci.py - Feeds recorded LE advertising report events through the HCI scanner
+
+A SOCK_SEQPACKET socketpair stands in for the raw HCI socket, so this runs
+without a controller or CAP_NET_RAW.
+"""
+
+import argparse
+import socket
+import threading
+import time
+
+from droids import hci_adv_report, make_population
+
+from hci import HciScanner
+from scan import DroidScanner
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--droids", type=int, default=200)
+    parser.add_argument("--events", type=int, default=50000)
+    args = parser.parse_args()
+
+    population = make_population(args.droids)
+    recorded = [hci_adv_report(d) for d in population]
+
+    rx, tx = socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+    rx.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 22)
+
+    decoder = DroidScanner(None)
+    decoded = {}
+    done = threading.Event()
+
+    def on_advert(advert):
+        data = advert.manufacturer_data.get(0x0183)
+        if data is not None:
+            decoded[advert.mac] = decoder._decode_manufacturer_data(data)
+        if scanner.reports >= args.events:
+            done.set()
+
+    def feed():
+        for i in range(args.events):
+            tx.send(recorded[i % len(recorded)])
+
+    scanner = HciScanner(sock=rx)
+    start = time.perf_counter()
+    feeder = threading.Thread(target=feed, daemon=True)
+    feeder.start()
+    scanner.scan(30.0, on_advert, stop_event=done)
+    elapsed = time.perf_counter() - start
+
+    identified = sum(1 for v in decoded.values() if v)
+    print(f"events={scanner.events} reports={scanner.reports} droids={len(decoded)} identified={identified}")
+    print(f"throughput {scanner.reports / elapsed:,.0f} reports/s ({elapsed * 1000:.0f} ms)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+bench_instances.py - Beacon air time with 1 to N advertising instances
+
+Runs the same set of beacons (a location and several droids, each its own
+track) on BeaconManager against adapters holding 1, 2 and 4
+advertisements at once, and reports how much air time each beacon got,
+the beacon-seconds on air per second (how many beacons droids can see at
+once) and how many time-shared turns it took. The default adapter is an
+in-process fake controller; --dbus runs BluezDBus over MockBluezBus
+instead (needs dbus-fast). MUX_SLICE is shortened so the turns show up in
+a short run.
+"""
+
+import argparse
+import time
+
+import droids  # noqa: F401  (puts app/ on sys.path)
+
+import beacon
+from beacon import BeaconManager
+from dicts import DROIDS
+
+class FakeAdapter:
+    """Controller stand-in whose adapter holds `instances` advertisements at once"""
+
+    def __init__(self, instances):
+        self.instances = instances
+        self.air_time = {}
+        self._on_air = {}
+
+    def advertising_instances(self):
+        return self.instances
+
+    def _account(self, instance, now):
+        payload, since = self._on_air.pop(instance, (None, None))
+        if payload is not None:
+            self.air_time[payload] = self.air_time.get(payload, 0.0) + now - since
+
+    def broadcast_mfg(self, mfg_id, mfg_data, interval=None, tx_power=None, instance=0):
+        if instance >= self.instances:
+            raise RuntimeError("Maximum advertisements reached")
+        now = time.perf_counter()
+        self._account(instance, now)
+        self._on_air[instance] = (mfg_data, now)
+
+    def stop_advertising(self, instance=None):
+        now = time.perf_counter()
+        for i in list(self._on_air) if instance is None else [instance]:
+            self._account(i, now)
+
+    def flush_air_time(self):
+        for instance in list(self._on_air):
+            payload = self._on_air[instance][0]
+            self._account(instance, time.perf_counter())
+            self._on_air[instance] = (payload, time.perf_counter())
+        return self.air_time
+
+def dbus_adapter(instances):
+    from mockbus import MockBluezBus
+    from bluez import BluezDBus
+
+    bus = MockBluezBus(population=[], instances=instances)
+    controller = BluezDBus(bus=bus)
+
+    def flush_air_time():
+        bus.flush_air_time()
+        return bus.air_time
+
+    controller.flush_air_time = flush_air_time
+    return controller
+
+def run(controller, beacons, seconds):
+    mgr = BeaconManager(controller)
+    mgr.start_location(5, "Droid Depot")
+    for faction, droid_id, name in beacons:
+        mgr.add_droid(faction, droid_id, name)
+    time.sleep(seconds)
+    air = dict(controller.flush_air_time())
+    stats = mgr.stats()
+    mgr.close()
+    return air, stats
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--instances", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--droids", type=int, default=3, help="droid beacons next to the location")
+    parser.add_argument("--seconds", type=float, default=4.0)
+    parser.add_argument("--slice", type=float, default=0.25, help="MUX_SLICE for the run (seconds)")
+    parser.add_argument("--dbus", action="store_true", help="use BluezDBus over MockBluezBus")
+    args = parser.parse_args()
+
+    beacon.MUX_SLICE = args.slice
+    beacons = [(faction, droid_id, d["name"])
+               for faction, ds in DROIDS.items() for droid_id, d in ds.items()][:args.droids]
+    tracks = 1 + len(beacons)
+
+    for instances in args.instances:
+        controller = dbus_adapter(instances) if args.dbus else FakeAdapter(instances)
+        air, stats = run(controller, beacons, args.seconds)
+        shares = [air.get(p, 0.0) / args.seconds for p in air]
+        shares += [0.0] * (tracks - len(shares))
+        print(f"{instances} instance(s)  {tracks} beacons   on air {sum(shares):4.2f} beacons at once   "
+              f"each {min(shares) * 100:5.1f}-{max(shares) * 100:5.1f}% of the time   "
+              f"{stats['mux_switches']} turns   using {stats['instances']}")
+        if hasattr(controller, "close"):
+            controller.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+bench_parser.py - Advertisement parser throughput and allocation suite
+
+Runs every decoder in DECODERS over the generated corpus in corpus.py
+(every personality, every location threshold, malformed payloads and
+`bluetoothctl info` text in each layout) and reports decodes per second,
+allocation per decode and any answers that differ from the corpus.
+
+CPython doesn't count allocations, so allocation is measured with
+tracemalloc as the peak bytes allocated while decoding one record,
+averaged over the corpus. Timing runs with tracemalloc off.
+
+With --json the results are printed as one JSON object; --append adds the
+same object as a line to a file, so runs can be compared over time.
+"""
+
+import argparse
+import datetime
+import json
+import platform
+import subprocess
+import time
+import tracemalloc
+
+from corpus import build_corpus
+
+import decoder
+from scan import DroidScanner
+
+_SCANNER = DroidScanner(None)
+
+# name -> (input field, per-record function, optional whole-batch function)
+DECODERS = {
+    "DroidScanner._parse_personality": ("info_text", _SCANNER._parse_personality, None),
+    "DroidScanner._decode_manufacturer_data": ("data", _SCANNER._decode_manufacturer_data, None),
+    "decoder.identify": ("data", decoder.identify, None),
+    "decoder.identify_batch": ("data", decoder.identify, decoder.identify_batch),
+}
+
+def _rate(fn, items, min_time):
+    """Calls per second, repeating the corpus until at least `min_time` has passed"""
+    rounds = 0
+    start = time.perf_counter()
+    elapsed = 0.0
+    while elapsed < min_time:
+        for item in items:
+            fn(item)
+        rounds += 1
+        elapsed = time.perf_counter() - start
+    return len(items) * rounds / elapsed
+
+def _batch_rate(fn, items, min_time):
+    rounds = 0
+    start = time.perf_counter()
+    elapsed = 0.0
+    while elapsed < min_time:
+        fn(items)
+        rounds += 1
+        elapsed = time.perf_counter() - start
+    return len(items) * rounds / elapsed
+
+def _allocations(fn, items):
+    """Mean bytes allocated at peak while decoding one item"""
+    total = 0
+    tracemalloc.start()
+    try:
+        for item in items:
+            fn(item)  # warm any caches the first call fills
+            tracemalloc.reset_peak()
+            base, _ = tracemalloc.get_traced_memory()
+            fn(item)
+            _, peak = tracemalloc.get_traced_memory()
+            total += peak - base
+    finally:
+        tracemalloc.stop()
+    return total / len(items)
+
+def _mismatches(fn, records, field):
+    return [r.label for r in records if fn(getattr(r, field)) != r.expected]
+
+def _git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+def run(min_time=0.5, alloc=True, only=None):
+    corpus = build_corpus()
+    results = {}
+    for name, (field, fn, batch_fn) in DECODERS.items():
+        if only and only not in name:
+            continue
+        records = [r for r in corpus if getattr(r, field) is not None]
+        items = [getattr(r, field) for r in records]
+        by_kind = {}
+        for kind in ("droid", "location", "malformed"):
+            subset = [getattr(r, field) for r in records if r.kind == kind]
+            if subset:
+                by_kind[kind] = _batch_rate(batch_fn, subset, min_time / 3) if batch_fn \
+                    else _rate(fn, subset, min_time / 3)
+        entry = {
+            "input": field,
+            "records": len(items),
+            "decodes_per_s": _batch_rate(batch_fn, items, min_time) if batch_fn else _rate(fn, items, min_time),
+            "decodes_per_s_by_kind": by_kind,
+            "mismatches": _mismatches(fn, records, field),
+        }
+        if alloc:
+            # A batch decoder's allocation is the whole batch's, spread over its records
+            if batch_fn:
+                peak = _allocations(batch_fn, [items]) / len(items)
+            else:
+                peak = _allocations(fn, items)
+            entry["peak_bytes_per_decode"] = round(peak, 1)
+        results[name] = entry
+
+    return {
+        "benchmark": "parser",
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "revision": _git_revision(),
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "machine": platform.machine(),
+        "corpus": {kind: sum(r.kind == kind for r in corpus) for kind in ("droid", "location", "malformed")},
+        "decoders": results,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--min-time", type=float, default=0.5, help="seconds to time each decoder for")
+    parser.add_argument("--no-alloc", action="store_true", help="skip the tracemalloc pass")
+    parser.add_argument("--only", help="run only decoders whose name contains this")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    parser.add_argument("--append", metavar="FILE", help="append results as a JSON line to FILE")
+    args = parser.parse_args()
+
+    report = run(args.min_time, alloc=not args.no_alloc, only=args.only)
+    if args.append:
+        with open(args.append, "a") as f:
+            f.write(json.dumps(report, sort_keys=True) + "\n")
+    if args.json:
+        print(json.dumps(report, indent=2, sort_keys=True))
+        return
+
+    print(f"corpus     {report['corpus']}")
+    baseline = report["decoders"].get("DroidScanner._parse_personality", {}).get("decodes_per_s")
+    for name, entry in report["decoders"].items():
+        line = f"{name:<40} {entry['decodes_per_s']:12,.0f} decodes/s"
+        if baseline:
+            line += f" {entry['decodes_per_s'] / baseline:6.1f}x"
+        if "peak_bytes_per_decode" in entry:
+            line += f"  {entry['peak_bytes_per_decode']:8.1f} B/decode"
+        if entry["mismatches"]:
+            line += f"  MISMATCH: {', '.join(entry['mismatches'])}"
+        print(line)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+bench_payloads.py - Beacon activation cost with the precompiled payload table
+
+The previous implementation is kept here as the baseline: an f-string
+payload per activation, then stripped and re-formatted byte by byte into
+the mfg_id/mfg_data strings. Both paths drive DroidBeacon against a
+controller that only records broadcast_mfg calls, so the numbers are the
+Python cost of an activation.
+"""
+
+import argparse
+import time
+
+import droids  # noqa: F401  (puts app/ on sys.path)
+
+from beacon import PAYLOADS, DroidBeacon
+from dicts import BEACON_PROTOCOL, BEACON_TYPE, FACTIONS, DROIDS, LOCATIONS, RSSI_THRESHOLD
+
+class RecordingController:
+    def __init__(self):
+        self.calls = []
+
+    def broadcast_mfg(self, mfg_id, mfg_data, interval=None, tx_power=None, instance=0):
+        self.calls.append((mfg_id, mfg_data))
+
+    def stop_advertising(self, instance=None):
+        pass
+
+def legacy_send(bt, payload):
+    raw = payload.replace("0x", "").replace(" ", "").replace(",", "")
+    mfg_id = f"0x{raw[:4]}"
+    mfg_data = " ".join(f"0x{raw[i:i+2]}" for i in range(4, len(raw), 2))
+    bt.broadcast_mfg(mfg_id, mfg_data)
+
+def legacy_location(bt, loc_id, name, cooldown_byte):
+    legacy_send(bt, (
+        f"0x{BEACON_PROTOCOL['MFG_ID']:04X} "
+        f"0x{BEACON_TYPE['LOCATION']:02X} "
+        f"0x{BEACON_PROTOCOL['DATA_LEN']:02X} "
+        f"0x{loc_id:02X} "
+        f"0x{cooldown_byte:02X} "
+        f"0x{RSSI_THRESHOLD['MID']:02X} "
+        f"0x{BEACON_PROTOCOL['ACTIVE_FLAG']:02X} "
+    ))
+
+def legacy_droid(bt, p_id, p_name, faction_name):
+    aff_byte = 0x80 + (FACTIONS.get(faction_name, 0x01) * 2)
+    legacy_send(bt, (
+        f"0x{BEACON_PROTOCOL['MFG_ID']:04X} "
+        f"0x{BEACON_TYPE['DROID']:02X} "
+        f"0x{BEACON_PROTOCOL['DATA_LEN']:02X} "
+        f"0x{BEACON_PROTOCOL['DROID_HEADER']:02X} "
+        f"0x{BEACON_PROTOCOL['STATUS_FLAG']:02X} "
+        f"0x{aff_byte:02X} "
+        f"0x{p_id:02X}"
+    ))
+
+def targets():
+    """Every stock location and droid personality, as the beacon menu offers them"""
+    out = [("location", loc_id, data[1], data[2]) for loc_id, data in LOCATIONS.items()]
+    out += [("droid", d["id"], d["name"], faction) for faction, ds in DROIDS.items() for d in ds.values()]
+    return out
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rounds", type=int, default=5000)
+    args = parser.parse_args()
+
+    items = targets()
+
+    # Same bytes on air as the old path before timing anything
+    old, new = RecordingController(), RecordingController()
+    beacon = DroidBeacon(new)
+    for kind, a, b, c in items:
+        if kind == "location":
+            legacy_location(old, a, b, c)
+            beacon.activate_location(a, b, c)
+        else:
+            legacy_droid(old, a, b, c)
+            beacon.activate_droid(a, b, c)
+    assert old.calls == new.calls
+
+    bt = RecordingController()
+    start = time.perf_counter()
+    for _ in range(args.rounds):
+        for kind, a, b, c in items:
+            if kind == "location":
+                legacy_location(bt, a, b, c)
+            else:
+                legacy_droid(bt, a, b, c)
+    legacy_rate = len(items) * args.rounds / (time.perf_counter() - start)
+
+    bt = RecordingController()
+    beacon = DroidBeacon(bt)
+    start = time.perf_counter()
+    for _ in range(args.rounds):
+        for kind, a, b, c in items:
+            if kind == "location":
+                beacon.activate_location(a, b, c)
+            else:
+                beacon.activate_droid(a, b, c)
+    table_rate = len(items) * args.rounds / (time.perf_counter() - start)
+
+    print(f"table      {len(PAYLOADS)} precompiled payloads")
+    print(f"legacy     {legacy_rate:12,.0f} activations/s   {1e6 / legacy_rate:6.2f} us each")
+    print(f"table      {table_rate:12,.0f} activations/s   {1e6 / table_rate:6.2f} us each   "
+          f"{table_rate / legacy_rate:.1f}x (includes DroidBeacon's lock and bookkeeping)")
+
+if __name__ == "__main__":
+    main()
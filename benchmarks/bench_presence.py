@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+bench_presence.py - Presence mode under advertisement load with a 60 Hz reader
+
+Replays drifting advertisements through ScanManager's presence mode via the
+fake bleak scanner while a second thread polls get_presence() the way the
+scan view does every frame, and reports how long those reads take.
+"""
+
+import argparse
+import functools
+import os
+import random
+import statistics
+import threading
+import time
+
+from droids import make_population
+from fake_bleak import FakeBleakScanner, advertisement_fixtures
+
+from bleakscan import BleakScanSource
+from bluetoothctl import BluetoothCtl
+from scan import ScanManager
+
+FAKE_BLUETOOTHCTL = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fake_bluetoothctl.py")
+
+def drifting_fixtures(population, rounds, seed=1):
+    """`rounds` passes over the population with each droid's RSSI wandering"""
+    rng = random.Random(seed)
+    fixtures = []
+    for _ in range(rounds):
+        for droid in population:
+            droid["rssi"] = max(-100, min(-30, droid["rssi"] + rng.randint(-4, 4)))
+        fixtures.extend(advertisement_fixtures(population))
+    return fixtures
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--droids", type=int, default=300)
+    parser.add_argument("--rounds", type=int, default=200)
+    parser.add_argument("--fps", type=float, default=60.0)
+    args = parser.parse_args()
+
+    fixtures = drifting_fixtures(make_population(args.droids), args.rounds)
+    # Yield to the loop often so adverts arrive in small bursts, like a radio
+    factory = functools.partial(FakeBleakScanner, fixtures, batch=20)
+
+    ctl = BluetoothCtl(binary=FAKE_BLUETOOTHCTL)
+    manager = ScanManager(ctl, source=BleakScanSource(scanner_factory=factory))
+    reads = []
+    done = threading.Event()
+
+    def reader():
+        while not done.is_set():
+            start = time.perf_counter()
+            rows = manager.get_presence()
+            reads.append((time.perf_counter() - start, len(rows)))
+            time.sleep(1.0 / args.fps)
+
+    try:
+        ui = threading.Thread(target=reader, daemon=True)
+        ui.start()
+        start = time.perf_counter()
+        manager.start_presence()
+        while manager.source.reports < len(fixtures) and manager.tracking:
+            time.sleep(0.01)
+        elapsed = time.perf_counter() - start
+        done.set()
+        ui.join()
+        rows = manager.get_presence()
+        manager.stop_presence()
+    finally:
+        ctl.close()
+
+    times = sorted(t for t, _ in reads)
+    ordered = all(a["rssi"] >= b["rssi"] for a, b in zip(rows, rows[1:]))
+    print(f"adverts    {manager.source.reports:,} in {elapsed:.2f} s = {manager.source.reports / elapsed:,.0f}/s")
+    print(f"presence   {len(rows)} droids, nearest first: {ordered}, {manager.presence.stats()}")
+    print(f"UI reads   n={len(times)} mean {statistics.mean(times) * 1e6:.1f} us   "
+          f"p99 {times[int(len(times) * 0.99)] * 1e6:.1f} us   max {times[-1] * 1e6:.1f} us")
+
+if __name__ == "__main__":
+    main()
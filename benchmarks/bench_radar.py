@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+bench_radar.py - Radar view frame time with synthetic droid populations
+
+Draws the radar for populations of increasing size and reports the mean and
+p99 frame time for the batched RenderGeometry path, the per-blip
+RenderCopy fallback, and UserInterface.draw_circle per blip (the 2r+1
+line approach the radar avoids). Frames are flushed with SDL_RenderFlush so
+the renderer's work is included. Runs headless with SDL's dummy video driver
+unless SDL_VIDEODRIVER is already set.
+"""
+
+import argparse
+import os
+import random
+import statistics
+import time
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import sdl2
+
+from droids import make_population
+
+from decoder import identify
+from radar import RadarView, BLIP_SIZE, faction_of
+from dicts import RADAR_COLORS
+from ui import UserInterface
+
+class HeadlessUI(UserInterface):
+    """UserInterface that falls back to the software renderer (the dummy driver has no accelerated one)"""
+
+    def _create_renderer(self):
+        try:
+            return super()._create_renderer()
+        except RuntimeError:
+            renderer = sdl2.SDL_CreateRenderer(self.window, -1, sdl2.SDL_RENDERER_SOFTWARE)
+            if not renderer:
+                raise
+            return renderer
+
+def presence_rows(count, seed=1):
+    """Presence snapshot rows like ScanManager.get_presence, nearest first"""
+    rng = random.Random(seed)
+    rows = []
+    for droid in make_population(count, seed):
+        rows.append({
+            "mac": droid["mac"],
+            "identity": identify(droid["mfg_data"]),
+            "rssi": droid["rssi"],
+            "age": rng.uniform(0, 30),
+        })
+    rows.sort(key=lambda r: -r["rssi"])
+    return rows
+
+def circles(ui, radar, rows, selected_mac, ttl):
+    """The straightforward version: one draw_circle per blip"""
+    for row in rows:
+        x, y = radar.position(row)
+        rgb = RADAR_COLORS.get(faction_of(row.get("identity")), RADAR_COLORS[None])
+        ui.draw_circle((int(x), int(y)), BLIP_SIZE // 2, fill=sdl2.SDL_Color(*rgb, 255))
+
+def frame_times(ui, draw, rows, frames):
+    times = []
+    for i in range(frames):
+        # Drift the RSSI a little so every frame moves blips
+        for row in rows[i % 7::7]:
+            row["rssi"] = max(-100, min(-35, row["rssi"] + (1 if i % 2 else -1)))
+        start = time.perf_counter()
+        ui.draw_start()
+        draw(rows, rows[0]["mac"], 30.0)
+        sdl2.SDL_RenderFlush(ui.renderer)
+        times.append(time.perf_counter() - start)
+        sdl2.SDL_SetRenderTarget(ui.renderer, None)
+    times.sort()
+    return statistics.mean(times), times[int(len(times) * 0.99)]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--droids", type=int, nargs="+", default=[10, 100, 300, 1000])
+    parser.add_argument("--frames", type=int, default=300)
+    args = parser.parse_args()
+
+    if sdl2.SDL_Init(sdl2.SDL_INIT_VIDEO) < 0:
+        raise SystemExit(f"SDL_Init failed: {sdl2.SDL_GetError().decode()}")
+    ui = HeadlessUI()
+    try:
+        radius = 187
+        geometry = RadarView(ui, (20 + radius, 35 + radius), radius)
+        copies = RadarView(ui, (20 + radius, 35 + radius), radius)
+        copies.use_geometry = False
+        renderer = sdl2.SDL_RendererInfo()
+        sdl2.SDL_GetRendererInfo(ui.renderer, renderer)
+        print(f"renderer   {renderer.name.decode()}, RenderGeometry {'yes' if geometry.use_geometry else 'no'}, "
+              f"budget {1000 / 60:.1f} ms/frame at 60 fps")
+
+        modes = [("circles", lambda rows, mac, ttl: (geometry.draw([], mac, ttl),
+                                                     circles(ui, geometry, rows, mac, ttl)))]
+        if geometry.use_geometry:
+            modes.append(("geometry", geometry.draw))
+        modes.append(("copies", copies.draw))
+
+        for count in args.droids:
+            rows = presence_rows(count)
+            line = f"{count:5} droids"
+            for name, draw in modes:
+                mean, p99 = frame_times(ui, draw, rows, args.frames)
+                line += f"   {name} {mean * 1000:6.2f} ms (p99 {p99 * 1000:6.2f})"
+            print(line)
+
+        geometry.close()
+        copies.close()
+    finally:
+        ui.cleanup()
+        sdl2.SDL_Quit()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+bench_replay.py - Replays a btsnoop capture through the scan pipeline
+
+Pass a capture recorded with `btmon -w capture.btsnoop`, or leave it out to
+generate a synthetic one: a busy park for --minutes with droids advertising
+several times a second, plus location beacons, phones and unrelated HCI
+traffic. The capture is decoded three ways and each reports throughput:
+the reader alone (walk and parse), the reader plus droid decoding, and
+ScanManager presence mode fed by CaptureSource as fast as possible.
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from droids import hci_adv_report, make_population, write_btsnoop
+
+from bluetoothctl import BluetoothCtl
+from btsnoop import BtsnoopReader, CaptureSource
+from decoder import decode
+from dicts import BEACON_PROTOCOL, BEACON_TYPE, LOCATIONS, RSSI_THRESHOLD
+from hci import parse_le_meta_event
+from scan import ScanManager
+
+FAKE_BLUETOOTHCTL = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fake_bluetoothctl.py")
+
+def synthetic_capture(path, minutes, droids, rate, seed=1):
+    """Writes a capture with about `rate` LE advertising reports per second"""
+    rng = random.Random(seed)
+    population = make_population(droids, seed)
+    for i, loc_id in enumerate(sorted(LOCATIONS)):
+        population.append({
+            "mac": "0C:A7:10:00:00:%02X" % i, "name": "", "rssi": rng.randint(-90, -50),
+            "mfg_id": BEACON_PROTOCOL["MFG_ID"],
+            "mfg_data": bytes([BEACON_TYPE["LOCATION"], BEACON_PROTOCOL["DATA_LEN"], loc_id,
+                               LOCATIONS[loc_id][2], RSSI_THRESHOLD["MID"], BEACON_PROTOCOL["ACTIVE_FLAG"]]),
+        })
+    # Phones and headphones: Apple manufacturer data, no droid name
+    for i in range(droids):
+        population.append({"mac": "5A:00:00:00:%02X:%02X" % (i >> 8 & 0xFF, i & 0xFF), "name": "",
+                           "rssi": -80, "mfg_id": 0x004C, "mfg_data": bytes([0x10, 0x05, 0x01, 0x18, 0x44, 0x00])})
+
+    noise = bytes([0x04, 0x0E, 0x04, 0x01, 0x0C, 0x20, 0x00])  # Command Complete
+    start = time.time() - minutes * 60
+    count = int(minutes * 60 * rate)
+
+    def packets():
+        for i in range(count):
+            when = start + i / rate
+            if i % 50 == 0:
+                yield when, noise
+            adv = population[rng.randrange(len(population))]
+            adv["rssi"] = max(-100, min(-30, adv["rssi"] + rng.randint(-3, 3)))
+            yield when, hci_adv_report(adv)
+
+    write_btsnoop(path, packets())
+    return count
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("capture", nargs="?", help="btsnoop file (default: generate one)")
+    parser.add_argument("--minutes", type=float, default=30.0)
+    parser.add_argument("--droids", type=int, default=150)
+    parser.add_argument("--rate", type=float, default=300.0, help="synthetic reports per second")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = args.capture
+        if path is None:
+            path = os.path.join(tmp, "park.btsnoop")
+            t0 = time.perf_counter()
+            count = synthetic_capture(path, args.minutes, args.droids, args.rate)
+            print(f"capture    {count:,} reports over {args.minutes:.0f} min, {os.path.getsize(path) / 1e6:.1f} MB "
+                  f"(generated in {time.perf_counter() - t0:.1f} s)")
+
+        with BtsnoopReader(path) as reader:
+            t0 = time.perf_counter()
+            events = reports = 0
+            first = last = None
+            for item in reader.events():
+                events += 1
+                reports += len(parse_le_meta_event(item.event))
+                first = item.timestamp if first is None else first
+                last = item.timestamp
+            parse_s = time.perf_counter() - t0
+            records = reader.records
+        span = (last - first) if first is not None else 0.0
+        print(f"parse      {records:,} records, {events:,} LE events, {reports:,} reports in {parse_s:.2f} s "
+              f"= {reports / parse_s:,.0f} reports/s ({span / parse_s:,.0f}x real time)")
+
+        with BtsnoopReader(path) as reader:
+            t0 = time.perf_counter()
+            droids = set()
+            for item in reader.events():
+                for advert in parse_le_meta_event(item.event):
+                    data = advert.manufacturer_data.get(BEACON_PROTOCOL["MFG_ID"])
+                    if data is not None and decode(data) is not None:
+                        droids.add(advert.mac)
+            decode_s = time.perf_counter() - t0
+        print(f"decode     {reports / decode_s:,.0f} reports/s, {len(droids)} Disney beacons heard")
+
+        ctl = BluetoothCtl(binary=FAKE_BLUETOOTHCTL)
+        source = CaptureSource(path)
+        manager = ScanManager(ctl, source=source)
+        try:
+            t0 = time.perf_counter()
+            manager.start_presence(ttl=span + 60)
+            source.finished.wait()
+            elapsed = time.perf_counter() - t0
+            rows = manager.get_presence()
+            manager.stop_presence()
+        finally:
+            ctl.close()
+        print(f"pipeline   {source.reports:,} reports through presence mode in {elapsed:.2f} s "
+              f"= {source.reports / elapsed:,.0f} reports/s, {len(rows)} droids tracked")
+
+if __name__ == "__main__":
+    main()
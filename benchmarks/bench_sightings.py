@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+bench_sightings.py - Sighting log write cost and reader downsampling speed
+
+Logs a synthetic event day (droids wandering in and out with drifting RSSI)
+through SightingLog, timing record() as the scan thread sees it, then maps
+the log back with SightingReader and downsamples it into per-minute series
+with NumPy (if installed) and with the pure Python fallback.
+"""
+
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from droids import make_population
+
+import sightings
+from sightings import SightingLog, SightingReader
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--droids", type=int, default=400)
+    parser.add_argument("--rows", type=int, default=2000000)
+    parser.add_argument("--hours", type=float, default=12.0)
+    parser.add_argument("--max-mb", type=float, default=8.0, help="rotation size")
+    parser.add_argument("--python-rows", type=int, default=200000,
+                        help="rows for the pure Python downsample (it is much slower)")
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    population = make_population(args.droids)
+    start = time.time() - args.hours * 3600
+    step = args.hours * 3600 / args.rows
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "sightings.bin")
+        log = SightingLog(path, min_interval=0, max_bytes=int(args.max_mb * 1024 * 1024), keep=1000)
+
+        calls = []
+        wall = time.perf_counter()
+        for i in range(args.rows):
+            droid = population[rng.randrange(len(population))]
+            droid["rssi"] = max(-100, min(-30, droid["rssi"] + rng.randint(-3, 3)))
+            t0 = time.perf_counter()
+            log.record(droid["mac"], droid["mfg_data"], droid["rssi"], when=start + i * step)
+            calls.append(time.perf_counter() - t0)
+        queued = time.perf_counter() - wall
+        log.close()
+        written = time.perf_counter() - wall
+
+        files = sightings.log_files(path)
+        size = sum(os.path.getsize(f) for f in files)
+        calls.sort()
+        print(f"record()   {args.rows:,} calls in {queued:.2f} s   mean {statistics.mean(calls) * 1e6:.2f} us   "
+              f"p99 {calls[int(len(calls) * 0.99)] * 1e6:.2f} us   max {calls[-1] * 1e6:.0f} us")
+        print(f"written    {log.stats()} in {written:.2f} s   {size / 1e6:.1f} MB over {len(files)} files "
+              f"({size / args.rows:.1f} B/row)")
+
+        reader = SightingReader(path)
+        t0 = time.perf_counter()
+        result = reader.downsample(60)
+        elapsed = time.perf_counter() - t0
+        backend = "numpy" if sightings.np is not None else "python"
+        present = [sum(1 for row in result.sightings if row[j]) for j in range(len(result.sightings[0]))]
+        print(f"downsample ({backend}) {len(reader):,} rows -> {len(result.macs)} droids x {len(present)} minutes "
+              f"in {elapsed:.2f} s = {len(reader) / elapsed:,.0f} rows/s   peak {max(present)} droids/minute")
+
+        if sightings.np is not None and args.python_rows:
+            rows = [tuple(int(v) for v in r) for r in reader.records()[:args.python_rows]]
+            t0 = time.perf_counter()
+            reader._downsample_py(rows, 60, None, None)
+            elapsed = time.perf_counter() - t0
+            print(f"downsample (python) {len(rows):,} rows in {elapsed:.2f} s = {len(rows) / elapsed:,.0f} rows/s")
+
+if __name__ == "__main__":
+    main()
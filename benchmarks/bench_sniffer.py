@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+bench_sniffer.py - Location sniffer ingest rate in a dense advertising environment
+
+Park location beacons advertise continuously, so a sniffer mostly sees the
+same few payloads over and over among a crowd of droids. This replays that
+mix through the fake bleak scanner into LocationSniffer and reports the
+sustained ingest rate, then times the batch decode on its own against
+decoding every report individually.
+"""
+
+import argparse
+import functools
+import os
+import random
+import time
+
+from droids import make_population
+from fake_bleak import FakeBleakScanner, advertisement_fixtures
+
+from bleakscan import BleakScanSource
+from bluetoothctl import BluetoothCtl
+from decoder import decode
+from dicts import BEACON_PROTOCOL, BEACON_TYPE, LOCATIONS, RSSI_THRESHOLD
+from sniffer import LocationSniffer
+
+FAKE_BLUETOOTHCTL = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fake_bluetoothctl.py")
+
+def location_beacons(count, seed=1):
+    """`count` park beacons in the same dict shape as droids.make_population"""
+    rng = random.Random(seed)
+    ids = sorted(LOCATIONS)
+    beacons = []
+    for i in range(count):
+        loc_id = ids[i % len(ids)]
+        beacons.append({
+            "mac": "0C:A7:10:00:%02X:%02X" % (i >> 8 & 0xFF, i & 0xFF),
+            "name": None,
+            "rssi": rng.randint(-90, -45),
+            "mfg_id": BEACON_PROTOCOL["MFG_ID"],
+            "mfg_data": bytes([
+                BEACON_TYPE["LOCATION"], BEACON_PROTOCOL["DATA_LEN"], loc_id,
+                LOCATIONS[loc_id][2], RSSI_THRESHOLD["MID"],
+                BEACON_PROTOCOL["ACTIVE_FLAG"] if rng.random() < 0.8 else 0x00,
+            ]),
+        })
+    return beacons
+
+def dense_fixtures(droids, locations, rounds):
+    """Each location beacon advertises `rounds` times for every droid advert"""
+    droid_fixtures = advertisement_fixtures(make_population(droids))
+    location_fixtures = advertisement_fixtures(location_beacons(locations))
+    fixtures = list(droid_fixtures)
+    for _ in range(rounds):
+        fixtures.extend(location_fixtures)
+    random.Random(2).shuffle(fixtures)
+    return fixtures
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--droids", type=int, default=200)
+    parser.add_argument("--locations", type=int, default=12)
+    parser.add_argument("--rounds", type=int, default=2000)
+    args = parser.parse_args()
+
+    fixtures = dense_fixtures(args.droids, args.locations, args.rounds)
+    factory = functools.partial(FakeBleakScanner, fixtures, batch=50)
+
+    ctl = BluetoothCtl(binary=FAKE_BLUETOOTHCTL)
+    source = BleakScanSource(scanner_factory=factory)
+    sniffer = LocationSniffer(ctl, source=source)
+    try:
+        start = time.perf_counter()
+        sniffer.start()
+        # reports only counts batches that are already decoded and published
+        while sniffer.stats()["reports"] < len(fixtures) and sniffer.running:
+            time.sleep(0.01)
+        elapsed = time.perf_counter() - start
+        sniffer.stop()
+        stats = sniffer.stats()
+        nearest = sniffer.nearest_active()
+    finally:
+        ctl.close()
+
+    print(f"reports    {stats['reports']:,} in {elapsed:.2f} s = {stats['reports'] / elapsed:,.0f}/s end to end")
+    print(f"dedupe     {stats['duplicates']:,} duplicates, {stats['decoded']:,} decoded in {stats['batches']} batches")
+    print(f"beacons    {len(sniffer.nearby())} locations heard, nearest active: "
+          f"{nearest.location.name if nearest else None} ({nearest.rssi if nearest else '-'} dBm)")
+
+    # Decode stage alone: one batch of every report versus decoding each one
+    reports = [(d.address, d_adv.manufacturer_data[BEACON_PROTOCOL["MFG_ID"]], d_adv.rssi) for d, d_adv in fixtures]
+    stage = LocationSniffer(None)
+    for mac, data, rssi in reports:
+        stage.feed(mac, data, rssi)
+    start = time.perf_counter()
+    stage.process_pending()
+    batched = len(reports) / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for _, data, _ in reports:
+        decode(data)
+    naive = len(reports) / (time.perf_counter() - start)
+    print(f"decode     batched+deduped {batched:,.0f}/s   per report {naive:,.0f}/s   {batched / naive:.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+corpus.py - Generated advertisement corpus for the parser benchmarks
+
+Every record is built from FACTIONS/DROIDS/LOCATIONS, so the corpus follows
+dicts.py as personalities are added. Each record carries the raw
+manufacturer data, the `bluetoothctl info` text a droid with that data
+would produce, and the identity the decoder is expected to return.
+"""
+
+import collections
+import random
+
+from droids import droid_payload
+
+from dicts import BEACON_PROTOCOL, BEACON_TYPE, FACTIONS, DROIDS, LOCATIONS, RSSI_THRESHOLD
+
+# kind is "droid", "location" or "malformed"; expected is None when nothing should be identified
+Record = collections.namedtuple("Record", ["kind", "label", "data", "info_text", "expected"])
+
+def _hex_dump(data: bytes) -> list:
+    """bluetoothctl's hex dump: 16 bytes a line, padded, with an ASCII column"""
+    lines = []
+    for i in range(0, len(data), 16):
+        chunk = data[i:i + 16]
+        hex_part = " ".join(f"{b:02x}" for b in chunk)
+        ascii_part = "".join(chr(b) if 0x20 <= b < 0x7F else "." for b in chunk)
+        lines.append(f"  {hex_part:<48} {ascii_part}")
+    return lines
+
+def info_text(mac: str, data, rssi: int = -60, style: str = "bluez5.6x", company: int = None) -> str:
+    """
+    `bluetoothctl info` output for a droid advertising `data`. `style` picks
+    the layout: "bluez5.6x" (dotted keys, hex dump with an ASCII column,
+    RSSI and AdvertisingFlags after the data), "bluez5.5x" (spaced keys, bare
+    hex) or "rssi-first" (RSSI and TxPower before the data).
+    """
+    company = BEACON_PROTOCOL["MFG_ID"] if company is None else company
+    lines = [
+        f"Device {mac} (random)",
+        "\tName: DROID",
+        "\tAlias: DROID",
+        "\tPaired: no",
+        "\tBonded: no",
+        "\tTrusted: no",
+        "\tBlocked: no",
+        "\tConnected: no",
+        "\tLegacyPairing: no",
+    ]
+    if style == "rssi-first":
+        lines += [f"\tRSSI: {rssi}", "\tTxPower: 0"]
+    if data is not None:
+        if style == "bluez5.5x":
+            lines.append(f"\tManufacturerData Key: 0x{company:04x}")
+            lines.append("\tManufacturerData Value:")
+            lines.append("  " + " ".join(f"{b:02x}" for b in data))
+        else:
+            lines.append(f"\tManufacturerData.Key: 0x{company:04x} ({company})")
+            lines.append("\tManufacturerData.Value:")
+            lines += _hex_dump(data)
+    if style != "rssi-first":
+        lines += [f"\tRSSI: 0x{rssi & 0xFFFFFFFF:08x} ({rssi})", "\tAdvertisingFlags:", "  06"]
+    return "\n".join(lines) + "\n"
+
+def _droid_records():
+    records = []
+    for faction, droids in DROIDS.items():
+        # Duplicate personality IDs resolve to the first entry, like decoder.py
+        names = {}
+        for d in droids.values():
+            names.setdefault(d["id"], d["name"])
+        for p_id, name in names.items():
+            for paired in (True, False):
+                data = droid_payload(faction, p_id, paired)
+                label = f"{faction}/{name}/{'paired' if paired else 'unpaired'}"
+                records.append(Record("droid", label, data, None, f"{name} ({faction})"))
+    return records
+
+def _location_records():
+    records = []
+    for loc_id, (_, name, cooldown) in sorted(LOCATIONS.items()):
+        for threshold_name, threshold in RSSI_THRESHOLD.items():
+            data = bytes([BEACON_TYPE["LOCATION"], BEACON_PROTOCOL["DATA_LEN"], loc_id,
+                          cooldown, threshold, BEACON_PROTOCOL["ACTIVE_FLAG"]])
+            records.append(Record("location", f"{name}/{threshold_name}", data, None, None))
+    return records
+
+def _random_payload(rng, length):
+    """Random bytes that don't happen to contain a droid or location marker"""
+    while True:
+        data = bytes(rng.randrange(256) for _ in range(length))
+        if bytes([BEACON_TYPE["DROID"], BEACON_PROTOCOL["DATA_LEN"]]) not in data \
+                and bytes([BEACON_TYPE["LOCATION"], BEACON_PROTOCOL["DATA_LEN"]]) not in data:
+            return data
+
+def _malformed_records(rng):
+    faction = next(iter(FACTIONS))
+    first = next(iter(DROIDS[faction].values()))
+    good = droid_payload(faction, first["id"])
+    identity = f"{first['name']} ({faction})"
+    unused_faction = next(f for f in range(128) if f not in FACTIONS.values())
+    used_ids = {d["id"] for d in DROIDS[faction].values()}
+    unused_id = next(i for i in range(256) if i not in used_ids)
+    cases = [
+        ("empty", b"", None),
+        ("truncated", good[:4], None),
+        ("header only", good[:2], None),
+        ("wrong type", bytes([0x07]) + good[1:], None),
+        ("wrong length", good[:1] + bytes([0x05]) + good[2:], None),
+        ("unknown faction", good[:4] + bytes([0x80 + unused_faction * 2]) + good[5:], None),
+        ("unknown personality", good[:5] + bytes([unused_id]), f"Unknown ID:{hex(unused_id)} ({faction})"),
+        # A droid marker further in is still found, as it always was
+        ("leading bytes", bytes([0xFF, 0x00]) + good, identity),
+        ("trailing bytes", good + bytes([0x00, 0x00]), identity),
+        ("random", _random_payload(rng, 6), None),
+        ("long random", _random_payload(rng, 31), None),
+    ]
+    records = [Record("malformed", label, data, None, expected) for label, data, expected in cases]
+
+    # Text-only damage: the bytes are fine but the info output isn't
+    mac = "D0:1D:00:00:FF:FF"
+    full = info_text(mac, good, style="bluez5.5x")
+    value = "ManufacturerData Value:\n  "
+    texts = [
+        ("no manufacturer data", info_text(mac, None), None),
+        ("other company", info_text(mac, bytes([0x4C, 0x00, 0x02, 0x15]), company=0x004C), None),
+        ("odd hex digit", full.replace(f"{good[-1]:02x}\n", f"{good[-1]:02x}f\n"), identity),
+        ("cut off", full[:full.index(value) + len(value) + 8], None),
+        ("no value", full[:full.index(value)], None),
+        ("empty", "", None),
+    ]
+    records += [Record("malformed", f"text: {label}", None, text, expected) for label, text, expected in texts]
+    return records
+
+def build_corpus(seed: int = 1) -> list:
+    """
+    Every droid personality (paired and unpaired), every location at each
+    RSSI threshold, and a set of malformed payloads and info texts. Records
+    with data get info text in each bluetoothctl layout in turn.
+    """
+    rng = random.Random(seed)
+    records = _droid_records() + _location_records() + _malformed_records(rng)
+    styles = ("bluez5.6x", "bluez5.5x", "rssi-first")
+    corpus = []
+    for i, record in enumerate(records):
+        if record.data is not None and record.info_text is None:
+            mac = "D0:1D:00:00:%02X:%02X" % (i >> 8 & 0xFF, i & 0xFF)
+            text = info_text(mac, record.data, rssi=rng.randint(-95, -40), style=styles[i % len(styles)])
+            record = record._replace(info_text=text)
+        corpus.append(record)
+    return corpus
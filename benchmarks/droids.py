@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+droids.py - Synthetic droid populations shared by the benchmarks
+"""
+
+import os
+import random
+import sys
+
+# Benchmarks import the application modules directly, like main.py does
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+
+from dicts import BEACON_PROTOCOL, BEACON_TYPE, FACTIONS, DROIDS
+
+def droid_payload(faction: str, personality_id: int, paired: bool = True) -> bytes:
+    """Manufacturer data (without the company ID) a droid of this personality advertises"""
+    status = BEACON_PROTOCOL["STATUS_FLAG"] if paired else 0x01
+    return bytes([
+        BEACON_TYPE["DROID"],
+        BEACON_PROTOCOL["DATA_LEN"],
+        BEACON_PROTOCOL["DROID_HEADER"],
+        status,
+        0x80 + FACTIONS[faction] * 2,
+        personality_id,
+    ])
+
+def make_population(count: int, seed: int = 1) -> list:
+    """Returns `count` droids as dicts with mac, name, rssi and manufacturer data"""
+    rng = random.Random(seed)
+    personalities = [(f, d["id"]) for f, droids in DROIDS.items() for d in droids.values()]
+    population = []
+    for i in range(count):
+        faction, p_id = rng.choice(personalities)
+        population.append({
+            "mac": "D0:1D:%02X:%02X:%02X:%02X" % (i >> 24 & 0xFF, i >> 16 & 0xFF, i >> 8 & 0xFF, i & 0xFF),
+            "name": "DROID",
+            "rssi": rng.randint(-95, -40),
+            "mfg_id": BEACON_PROTOCOL["MFG_ID"],
+            "mfg_data": droid_payload(faction, p_id, paired=rng.random() < 0.7),
+        })
+    return population
+
+def hci_adv_report(droid: dict) -> bytes:
+    """Legacy LE Advertising Report event (as read from an HCI socket) for one droid"""
+    name = droid["name"].encode()
+    mfg = droid["mfg_id"].to_bytes(2, "little") + droid["mfg_data"]
+    data = (
+        bytes([2, 0x01, 0x06])
+        + bytes([len(name) + 1, 0x09]) + name
+        + bytes([len(mfg) + 1, 0xFF]) + mfg
+    )
+    addr = bytes(int(b, 16) for b in reversed(droid["mac"].split(":")))
+    report = bytes([0x00, 0x01]) + addr + bytes([len(data)]) + data + (droid["rssi"] & 0xFF).to_bytes(1, "little")
+    params = bytes([0x02, 0x01]) + report
+    return bytes([0x04, 0x3E, len(params)]) + params
+
+def write_btsnoop(path: str, packets, datalink: int = 2001, index: int = 0):
+    """
+    Writes (unix time, H4 packet) pairs as a btsnoop file, like `btmon -w`
+    (Linux monitor datalink) or an H4 capture (datalink 1002)
+    """
+    import struct
+    with open(path, "wb") as f:
+        f.write(struct.pack(">8sII", b"btsnoop\0", 1, datalink))
+        for when, packet in packets:
+            ts = int((when - 946684800) * 1e6) + 0x00E03AB44A676000
+            if datalink == 2001:
+                # Monitor opcodes: 2 command, 3 event
+                opcode = 3 if packet[0] == 0x04 else 2
+                data, flags = packet[1:], index << 16 | opcode
+            else:
+                data, flags = packet, 1 if packet[0] == 0x04 else 0
+            f.write(struct.pack(">IIIIq", len(data), len(data), flags, 0, ts))
+            f.write(data)
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+fake_bleak.py - BleakScanner stand-in that replays advertisement fixtures, and a BleakClient stand-in
+"""
+
+import asyncio
+
+from bleak.backends.device import BLEDevice
+from bleak.backends.scanner import AdvertisementData
+
+def advertisement_fixtures(population) -> list:
+    """(BLEDevice, AdvertisementData) pairs for droids from droids.make_population"""
+    fixtures = []
+    for droid in population:
+        device = BLEDevice(droid["mac"], droid["name"], {})
+        data = AdvertisementData(
+            local_name=droid["name"],
+            manufacturer_data={droid["mfg_id"]: droid["mfg_data"]},
+            service_data={},
+            service_uuids=[],
+            tx_power=None,
+            rssi=droid["rssi"],
+            platform_data=(),
+        )
+        fixtures.append((device, data))
+    return fixtures
+
+class FakeBleakScanner:
+    """
+    Accepts BleakScanner's constructor arguments and, once started, feeds the
+    fixtures to detection_callback `repeat` times, yielding to the loop every
+    `batch` advertisements. Use functools.partial(FakeBleakScanner, fixtures)
+    as BleakScanSource's scanner_factory.
+    """
+
+    def __init__(self, fixtures, detection_callback=None, scanning_mode="active",
+                 repeat=1, batch=100, **kwargs):
+        self.fixtures = fixtures
+        self.callback = detection_callback
+        self.scanning_mode = scanning_mode
+        self.kwargs = kwargs
+        self.repeat = repeat
+        self.batch = batch
+        self.replayed = 0
+        self._task = None
+
+    async def _replay(self):
+        for _ in range(self.repeat):
+            for device, data in self.fixtures:
+                self.callback(device, data)
+                self.replayed += 1
+                if self.replayed % self.batch == 0:
+                    await asyncio.sleep(0)
+
+    async def start(self):
+        self._task = asyncio.get_running_loop().create_task(self._replay())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+class FakeBleakClient:
+    """
+    BleakClient stand-in for DroidConnection: connects instantly (or after
+    `connect_latency`), takes `write_latency` seconds per GATT write and
+    keeps what was written. Use functools.partial(FakeBleakClient, ...) as
+    DroidConnection's client_factory.
+    """
+
+    def __init__(self, device, timeout=10.0, disconnected_callback=None,
+                 write_latency=0.0, connect_latency=0.0, **kwargs):
+        self.device = device
+        self.disconnected_callback = disconnected_callback
+        self.write_latency = write_latency
+        self.connect_latency = connect_latency
+        self.kwargs = kwargs
+        self.writes = []
+        self._connected = False
+
+    @property
+    def is_connected(self):
+        return self._connected
+
+    async def connect(self):
+        await asyncio.sleep(self.connect_latency)
+        self._connected = True
+
+    async def write_gatt_char(self, uuid, data, response=False):
+        if not self._connected:
+            raise RuntimeError("Not connected")
+        await asyncio.sleep(self.write_latency)
+        self.writes.append(bytes(data))
+
+    async def disconnect(self):
+        if self._connected:
+            self._connected = False
+            if self.disconnected_callback:
+                self.disconnected_callback(self)
@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+fake_bluetoothctl.py - bluetoothctl simulator for benchmarking the BT layer offline
+
+Speaks the parts of the interactive protocol BluetoothCtl relies on (info,
+devices, scan on/off, select, the `menu advertise` flow) plus the one-shot
+`--timeout N scan on` form, for a simulated population of DROID devices.
+As in the real tool, the results of power and discovery changes arrive
+from D-Bus after bluetoothctl has read the next command, so they are
+printed after that command's output rather than before it.
+
+Configured through the environment, since BluetoothCtl spawns it without
+arguments:
+    FAKE_BT_DROIDS      number of simulated droids (default 20)
+    FAKE_BT_SEED        population seed (default 1)
+    FAKE_BT_LATENCY_MS  delay before each command is answered (default 0)
+    FAKE_BT_JITTER_MS   random extra delay on top of the latency (default 0)
+    FAKE_BT_DRIFT       RSSI random-walk step in dBm while scanning (default 3)
+    FAKE_BT_DISCOVERY_S mean time for a droid to be discovered (default 0.5)
+"""
+
+import os
+import random
+import sys
+import threading
+import time
+
+from droids import make_population
+
+DROID_COUNT = int(os.environ.get("FAKE_BT_DROIDS", "20"))
+SEED = int(os.environ.get("FAKE_BT_SEED", "1"))
+LATENCY = float(os.environ.get("FAKE_BT_LATENCY_MS", "0")) / 1000
+JITTER = float(os.environ.get("FAKE_BT_JITTER_MS", "0")) / 1000
+DRIFT = int(os.environ.get("FAKE_BT_DRIFT", "3"))
+DISCOVERY_MEAN = float(os.environ.get("FAKE_BT_DISCOVERY_S", "0.5"))
+
+CONTROLLER = "00:1A:7D:DA:71:13"
+
+class Simulator:
+    def __init__(self, out=sys.stdout):
+        self.out = out
+        self.rng = random.Random(SEED)
+        self.population = {d["mac"]: d for d in make_population(DROID_COUNT, SEED)}
+        self.discovered = {}
+        self.powered = False
+        self.menu = "main"
+        self.advertising = False
+        self.adv_mfg = None
+        self.adv_interval = (100, 150)
+        self.adv_tx_power = None
+        self.adv_switches = 0
+        # Async D-Bus replies, printed once the next command has been answered
+        self.deferred = []
+        self._write_lock = threading.Lock()
+        self._scanning = threading.Event()
+        self._scan_thread = None
+
+    def write(self, text):
+        with self._write_lock:
+            self.out.write(text + "\n")
+            self.out.flush()
+
+    # ------------------------------------------------------------------
+    # Discovery
+    # ------------------------------------------------------------------
+    def start_scan(self):
+        if self._scanning.is_set():
+            return
+        self._scanning.set()
+        self._scan_thread = threading.Thread(target=self._scan_loop, daemon=True)
+        self._scan_thread.start()
+
+    def stop_scan(self):
+        self._scanning.clear()
+
+    def _scan_loop(self):
+        started = time.monotonic()
+        arrivals = sorted(
+            (self.rng.expovariate(1 / DISCOVERY_MEAN), mac) for mac in self.population
+        )
+        while self._scanning.is_set():
+            now = time.monotonic() - started
+            while arrivals and arrivals[0][0] <= now:
+                _, mac = arrivals.pop(0)
+                self._discover(mac)
+
+            # RSSI drift on something already discovered
+            if self.discovered:
+                mac = self.rng.choice(list(self.discovered))
+                droid = self.population[mac]
+                droid["rssi"] = max(-100, min(-30, droid["rssi"] + self.rng.randint(-DRIFT, DRIFT)))
+                self.write(f"[CHG] Device {mac} RSSI: 0x{droid['rssi'] & 0xFFFFFFFF:08x} ({droid['rssi']})")
+            time.sleep(0.01)
+
+    def _discover(self, mac):
+        droid = self.population[mac]
+        self.discovered[mac] = True
+        hex_bytes = " ".join(f"{b:02x}" for b in droid["mfg_data"])
+        # One write so RSSI drift can't land inside the hex block
+        self.write(
+            f"[NEW] Device {mac} {droid['name']}\n"
+            f"[CHG] Device {mac} ManufacturerData Key: 0x{droid['mfg_id']:04x}\n"
+            f"[CHG] Device {mac} ManufacturerData Value:\n"
+            f"  {hex_bytes:<48} {'.' * len(droid['mfg_data'])}"
+        )
+
+    # ------------------------------------------------------------------
+    # Commands
+    # ------------------------------------------------------------------
+    def device_info(self, mac):
+        droid = self.population.get(mac)
+        if not droid:
+            return f"Device {mac} not available"
+        hex_bytes = " ".join(f"{b:02x}" for b in droid["mfg_data"])
+        return (
+            f"Device {mac} (random)\n"
+            f"\tName: {droid['name']}\n"
+            f"\tAlias: {droid['name']}\n"
+            f"\tPaired: no\n"
+            f"\tConnected: no\n"
+            f"\tRSSI: 0x{droid['rssi'] & 0xFFFFFFFF:08x} ({droid['rssi']})\n"
+            f"\tManufacturerData Key: 0x{droid['mfg_id']:04x}\n"
+            f"\tManufacturerData Value:\n"
+            f"  {hex_bytes:<48} {'.' * len(droid['mfg_data'])}"
+        )
+
+    def controller_info(self):
+        return (
+            f"Controller {CONTROLLER} (public)\n"
+            f"\tName: handheld\n"
+            f"\tPowered: {'yes' if self.powered else 'no'}\n"
+            f"\tDiscovering: {'yes' if self._scanning.is_set() else 'no'}"
+        )
+
+    def handle(self, line):
+        args = line.split()
+        if not args:
+            return None
+        cmd = args[0]
+
+        if self.menu == "advertise":
+            return self._handle_advertise(cmd, args[1:])
+
+        if cmd == "power":
+            self.powered = args[1:] == ["on"]
+            self.deferred.append(f"Changing power {args[1] if len(args) > 1 else ''} succeeded")
+            self.deferred.append(f"[CHG] Controller {CONTROLLER} Powered: {'yes' if self.powered else 'no'}")
+            return None
+        if cmd == "show":
+            return self.controller_info()
+        if cmd == "info":
+            if len(args) == 1:
+                return "Missing device address argument"
+            return self.device_info(args[1].upper())
+        if cmd == "devices":
+            return "\n".join(f"Device {mac} {self.population[mac]['name']}" for mac in self.discovered)
+        if cmd == "scan":
+            if args[1:] == ["on"]:
+                self.start_scan()
+                self.deferred.append("Discovery started")
+                self.deferred.append(f"[CHG] Controller {CONTROLLER} Discovering: yes")
+            else:
+                self.stop_scan()
+                self.deferred.append("Discovery stopped")
+                self.deferred.append(f"[CHG] Controller {CONTROLLER} Discovering: no")
+            return None
+        if cmd == "menu" and args[1:] == ["advertise"]:
+            self.menu = "advertise"
+            return None
+        if cmd == "advertise":
+            on = args[1:] == ["on"]
+            if on and self.advertising:
+                return "Failed to register advertisement: org.bluez.Error.AlreadyExists"
+            self.advertising = on
+            if on:
+                self.adv_switches += 1
+            return "Advertising object registered" if on else "Advertising object unregistered"
+        if cmd in ("select", "agent", "default-agent", "pairable", "discoverable", "quit", "back"):
+            return None
+        return self._invalid(cmd)
+
+    def _handle_advertise(self, cmd, args):
+        if cmd == "back":
+            self.menu = "main"
+            return None
+        if cmd == "clear":
+            self.adv_mfg = None
+            return None
+        if cmd == "manufacturer":
+            self.adv_mfg = (args[0], args[1:])
+            return None
+        if cmd == "interval":
+            self.adv_interval = tuple(int(a) for a in args[:2])
+            return f"Interval: {self.adv_interval[0]} msec"
+        if cmd == "tx-power":
+            self.adv_tx_power = args
+            return None
+        return self._invalid(cmd)
+
+    def _invalid(self, cmd):
+        return (
+            f"Invalid command in menu {self.menu}: {cmd}\n\n"
+            'Use "help" for a list of available commands in a menu.\n'
+            'Use "menu <submenu>" if you want to enter any submenu.\n'
+            'Use "back" if you want to return to menu main.'
+        )
+
+    def respond(self, line):
+        if LATENCY or JITTER:
+            time.sleep(LATENCY + self.rng.random() * JITTER)
+        deferred, self.deferred = self.deferred, []
+        out = self.handle(line)
+        if out:
+            self.write(out)
+        for text in deferred:
+            self.write(text)
+
+def main():
+    sim = Simulator()
+    argv = sys.argv[1:]
+
+    if argv[:1] == ["--timeout"]:
+        timeout = float(argv[1])
+        if argv[2:] == ["scan", "on"]:
+            sim.start_scan()
+            time.sleep(timeout)
+            sim.stop_scan()
+        return
+    if argv:
+        sim.respond(" ".join(argv))
+        for text in sim.deferred:
+            sim.write(text)
+        return
+
+    for line in sys.stdin:
+        # Interactive bluetoothctl echoes each command after its prompt
+        sim.write(f"[bluetooth]# {line.strip()}")
+        if line.strip() == "quit":
+            break
+        sim.respond(line.strip())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+mockbus.py - In-process stand-in for the system bus exposing a fake BlueZ adapter
+"""
+
+import asyncio
+import time
+
+from dbus_fast import Message, MessageType, Variant
+
+from droids import make_population
+
+class MockBluezBus:
+    """
+    Answers the org.bluez calls BluezDBus makes without a dbus-daemon or
+    radio. `instances` is how many advertisements the fake adapter holds at
+    once (its LEAdvertisingManager1 SupportedInstances when idle).
+    """
+
+    def __init__(self, population=None, latency: float = 0.0, adapter="hci0", instances=1):
+        self.latency = latency
+        self.instances = instances
+        self.adapter_path = f"/org/bluez/{adapter}"
+        self.adapter = {
+            "Address": Variant("s", "00:1A:7D:DA:71:13"),
+            "Powered": Variant("b", False),
+            "Pairable": Variant("b", True),
+            "Discoverable": Variant("b", True),
+            "Discovering": Variant("b", False),
+        }
+        self.devices = {}
+        for droid in population if population is not None else make_population(20):
+            path = f"{self.adapter_path}/dev_{droid['mac'].replace(':', '_')}"
+            self.devices[path] = {
+                "Address": Variant("s", droid["mac"]),
+                "Name": Variant("s", droid["name"]),
+                "Alias": Variant("s", droid["name"]),
+                "Paired": Variant("b", False),
+                "Connected": Variant("b", False),
+                "RSSI": Variant("n", droid["rssi"]),
+                "ManufacturerData": Variant("a{qv}", {droid["mfg_id"]: Variant("ay", droid["mfg_data"])}),
+            }
+        self.exported = {}
+        self.calls = 0
+        self.handlers = []
+        self.matches = []
+
+        # Fake LEAdvertisingManager1 state: what each registered advertisement
+        # has on air, how long each payload was on air and how long nothing was
+        self.advertising = {}
+        self.payload_changes = 0
+        self.off_air_seconds = 0.0
+        self.air_time = {}
+        self._off_air_since = None
+        self._on_air_since = {}
+
+    def export(self, path, interface):
+        self.exported[path] = interface
+
+    def unexport(self, path, interface=None):
+        self.exported.pop(path, None)
+
+    def disconnect(self):
+        pass
+
+    def add_message_handler(self, handler):
+        self.handlers.append(handler)
+
+    def _emit(self, path, interface, member, signature, body):
+        """Delivers a BlueZ signal to the message handlers, as the bus would after AddMatch"""
+        if not self.matches:
+            return
+        msg = Message.new_signal(path, interface, member, signature, body)
+        msg.sender = "org.bluez"
+        for handler in self.handlers:
+            asyncio.get_running_loop().call_soon(handler, msg)
+
+    def send(self, msg: Message):
+        """Signals from exported objects; PropertiesChanged refreshes the on-air payload"""
+        future = asyncio.get_running_loop().create_future()
+        if (msg.message_type == MessageType.SIGNAL and msg.member == "PropertiesChanged"
+                and msg.path in self.advertising):
+            self._go_on_air(msg.path)
+        if self.latency:
+            asyncio.get_running_loop().call_later(self.latency, future.set_result, None)
+        else:
+            future.set_result(None)
+        return future
+
+    async def call(self, msg: Message) -> Message:
+        self.calls += 1
+        # The real bus assigns serials on send; replies need one to refer to
+        msg.serial = self.calls
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        handler = getattr(self, f"_{msg.member}", None)
+        if handler is None:
+            return Message.new_error(msg, "org.freedesktop.DBus.Error.UnknownMethod", msg.member)
+        return handler(msg)
+
+    # ------------------------------------------------------------------
+    # org.freedesktop.DBus
+    # ------------------------------------------------------------------
+    def _AddMatch(self, msg):
+        self.matches.append(msg.body[0])
+        return Message.new_method_return(msg)
+
+    # ------------------------------------------------------------------
+    # org.freedesktop.DBus.Properties / ObjectManager
+    # ------------------------------------------------------------------
+    def _props_for(self, path):
+        if path == self.adapter_path:
+            return self.adapter
+        return self.devices.get(path)
+
+    def _GetAll(self, msg):
+        if msg.path == self.adapter_path and msg.body[0] == "org.bluez.LEAdvertisingManager1":
+            active = len(self.advertising)
+            return Message.new_method_return(msg, "a{sv}", [{
+                "ActiveInstances": Variant("y", active),
+                "SupportedInstances": Variant("y", self.instances - active),
+            }])
+        props = self._props_for(msg.path)
+        if props is None:
+            return Message.new_error(msg, "org.freedesktop.DBus.Error.UnknownObject", msg.path)
+        return Message.new_method_return(msg, "a{sv}", [dict(props)])
+
+    def _Set(self, msg):
+        _, prop, value = msg.body
+        self._props_for(msg.path)[prop] = value
+        return Message.new_method_return(msg)
+
+    def _GetManagedObjects(self, msg):
+        objects = {self.adapter_path: {"org.bluez.Adapter1": dict(self.adapter)}}
+        for path, props in self.devices.items():
+            objects[path] = {"org.bluez.Device1": dict(props)}
+        return Message.new_method_return(msg, "a{oa{sa{sv}}}", [objects])
+
+    # ------------------------------------------------------------------
+    # org.bluez.Adapter1 / LEAdvertisingManager1
+    # ------------------------------------------------------------------
+    def _SetDiscoveryFilter(self, msg):
+        return Message.new_method_return(msg)
+
+    def _StartDiscovery(self, msg):
+        self.adapter["Discovering"] = Variant("b", True)
+        # Every known device is heard again, as BlueZ reports with DuplicateData
+        for path, props in self.devices.items():
+            self._emit(path, "org.freedesktop.DBus.Properties", "PropertiesChanged", "sa{sv}as",
+                       ["org.bluez.Device1", {"RSSI": props["RSSI"],
+                                              "ManufacturerData": props["ManufacturerData"]}, []])
+        return Message.new_method_return(msg)
+
+    def _StopDiscovery(self, msg):
+        self.adapter["Discovering"] = Variant("b", False)
+        return Message.new_method_return(msg)
+
+    @property
+    def on_air(self):
+        """Manufacturer data of the first registered advertisement, None if none is"""
+        return next(iter(self.advertising.values()), None)
+
+    def _account(self, path, now):
+        payload, since = self._on_air_since.pop(path, (None, None))
+        if payload is not None:
+            self.air_time[payload] = self.air_time.get(payload, 0.0) + now - since
+
+    def _go_on_air(self, path):
+        now = time.perf_counter()
+        if self._off_air_since is not None:
+            self.off_air_seconds += now - self._off_air_since
+            self._off_air_since = None
+        self._account(path, now)
+        data = {k: bytes(v.value) for k, v in self.exported[path].ManufacturerData.items()}
+        self.advertising[path] = data
+        self._on_air_since[path] = (tuple(sorted(data.items())), now)
+        self.payload_changes += 1
+
+    def _RegisterAdvertisement(self, msg):
+        if msg.body[0] not in self.exported:
+            return Message.new_error(msg, "org.bluez.Error.InvalidArguments", "object not exported")
+        if msg.body[0] in self.advertising:
+            return Message.new_error(msg, "org.bluez.Error.AlreadyExists", msg.body[0])
+        if len(self.advertising) >= self.instances:
+            return Message.new_error(msg, "org.bluez.Error.NotPermitted", "Maximum advertisements reached")
+        self._go_on_air(msg.body[0])
+        return Message.new_method_return(msg)
+
+    def _UnregisterAdvertisement(self, msg):
+        if msg.body[0] not in self.advertising:
+            return Message.new_error(msg, "org.bluez.Error.DoesNotExist", msg.body[0])
+        del self.advertising[msg.body[0]]
+        self._account(msg.body[0], time.perf_counter())
+        if not self.advertising:
+            self._off_air_since = time.perf_counter()
+        return Message.new_method_return(msg)
+
+    def flush_air_time(self):
+        """Counts the payloads still on air into air_time"""
+        now = time.perf_counter()
+        for path in list(self._on_air_since):
+            payload = self._on_air_since[path][0]
+            self._account(path, now)
+            self._on_air_since[path] = (payload, now)
@@ -49,6 +49,7 @@ pyinstaller \
     --collect-all bleak \
     --collect-all dbus_fast \
     --add-data "res:res" \
+    --add-data "playlists:playlists" \
     --distpath ../dist \
     main.py
 